@@ -0,0 +1,178 @@
+"""
+Token and cost accounting.
+A run-wide ledger of the usage each LLM call reports, with optional soft and
+hard budgets in tokens and dollars.
+"""
+
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+import tracing
+
+# model -> (input, cached input, output) in USD per million tokens
+PRICES: Dict[str, Tuple[float, float, float]] = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-5-mini-2025-08-07': (0.25, 0.025, 2.00),
+    'gemini-2.5-flash': (0.30, 0.075, 2.50),
+    'gemini-2.0-flash-lite-001': (0.075, 0.01875, 0.30),
+}
+
+OK = 'ok'
+SOFT = 'soft'
+HARD = 'hard'
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def load_prices(path: str) -> Dict[str, Tuple[float, float, float]]:
+    # {"model": [input, cached_input, output], ...} in USD per million tokens, merged over the defaults
+    with open(path, "r") as f:
+        overrides = json.load(f)
+    prices = dict(PRICES)
+    prices.update({model: tuple(float(p) for p in values) for model, values in overrides.items()})
+    return prices
+
+
+class Budget:
+    def __init__(self, soft_tokens: Optional[int] = None, hard_tokens: Optional[int] = None,
+                 soft_dollars: Optional[float] = None, hard_dollars: Optional[float] = None):
+        self.soft_tokens = soft_tokens
+        self.hard_tokens = hard_tokens
+        self.soft_dollars = soft_dollars
+        self.hard_dollars = hard_dollars
+
+    def state(self, tokens: int, dollars: float) -> str:
+        def over(value, limit):
+            return limit is not None and value >= limit
+
+        if over(tokens, self.hard_tokens) or over(dollars, self.hard_dollars):
+            return HARD
+        if over(tokens, self.soft_tokens) or over(dollars, self.soft_dollars):
+            return SOFT
+        return OK
+
+
+class Usage:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, input_tokens: int, cached_tokens: int, output_tokens: int, cost: float):
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.cached_tokens += cached_tokens
+        self.output_tokens += output_tokens
+        self.cost += cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "input_tokens": self.input_tokens, "cached_tokens": self.cached_tokens,
+                "cached_share": round(self.cached_tokens / self.input_tokens, 4) if self.input_tokens else 0.0,
+                "output_tokens": self.output_tokens, "cost_usd": round(self.cost, 6)}
+
+
+class Ledger:
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float, float]]] = None,
+                 budget: Optional[Budget] = None):
+        self.prices = prices or dict(PRICES)
+        self.budget = budget or Budget()
+        self.total = Usage()
+        self.by_question: Dict[Any, Usage] = defaultdict(Usage)
+        self.by_phase: Dict[str, Usage] = defaultdict(Usage)
+        self.by_model: Dict[str, Usage] = defaultdict(Usage)
+        self.unpriced = set()
+        self._state = OK
+        self._lock = threading.Lock()
+
+    def cost(self, model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+        if model not in self.prices:
+            self.unpriced.add(model)
+            return 0.0
+        input_price, cached_price, output_price = self.prices[model]
+        return ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+                + output_tokens * output_price) / 1_000_000
+
+    def record(self, model: str, input_tokens: int, output_tokens: int, cached_tokens: Optional[int] = None):
+        cached_tokens = min(cached_tokens or 0, input_tokens)
+        cost = self.cost(model, input_tokens, cached_tokens, output_tokens)
+        question_id = tracing.current_question()
+        with self._lock:
+            for usage in (self.total, self.by_question[question_id],
+                          self.by_phase[tracing.current_phase() or 'other'], self.by_model[model]):
+                usage.add(input_tokens, cached_tokens, output_tokens, cost)
+            state = self.budget.state(self.total.total_tokens, self.total.cost)
+            crossed, self._state = state != self._state, state
+        if crossed:
+            print(f"Budget: {state} limit reached after {self.total.total_tokens} tokens (${self.total.cost:.4f})")
+
+    def question_usage(self, question_id: Any) -> Dict[str, Any]:
+        with self._lock:
+            return self.by_question[question_id].to_dict()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def check(self):
+        # Called before every live call, so a hard budget stops spend mid-question
+        if self._state == HARD:
+            raise BudgetExceeded(f"Hard budget reached: {self.total.total_tokens} tokens, ${self.total.cost:.4f}")
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            questions = [usage for question_id, usage in self.by_question.items() if question_id is not None]
+            return {
+                "total": self.total.to_dict(),
+                "budget_state": self._state,
+                "per_question_avg_cost_usd": (sum(u.cost for u in questions) / len(questions)) if questions else None,
+                "by_model": {model: usage.to_dict() for model, usage in sorted(self.by_model.items())},
+                "by_phase": {phase: usage.to_dict() for phase, usage in sorted(self.by_phase.items())},
+                "by_question": {str(q): usage.to_dict() for q, usage in self.by_question.items()},
+                "unpriced_models": sorted(self.unpriced),
+            }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = []
+        for kind in ("by_model", "by_phase"):
+            lines.append(f"{kind[3:]:<26}{'calls':>7}{'input':>11}{'cached':>10}{'cached %':>9}{'output':>10}{'cost $':>11}")
+            for name, usage in report[kind].items():
+                lines.append(f"{name:<26}{usage['calls']:>7}{usage['input_tokens']:>11}{usage['cached_tokens']:>10}"
+                             f"{usage['cached_share'] * 100:>9.1f}{usage['output_tokens']:>10}{usage['cost_usd']:>11.4f}")
+            lines.append("")
+        total = report['total']
+        lines.append(f"Total: {total['calls']} calls, {total['input_tokens'] + total['output_tokens']} tokens "
+                     f"({total['cached_share'] * 100:.1f}% of input served from provider prompt caches), "
+                     f"${total['cost_usd']:.4f}")
+        if report['per_question_avg_cost_usd'] is not None:
+            lines.append(f"Average per question: ${report['per_question_avg_cost_usd']:.4f}")
+        if report['unpriced_models']:
+            lines.append(f"No price for: {', '.join(report['unpriced_models'])} (counted as $0)")
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+_ledger = Ledger()
+
+
+def configure(prices: Optional[Dict[str, Tuple[float, float, float]]] = None,
+              budget: Optional[Budget] = None) -> Ledger:
+    global _ledger
+    _ledger = Ledger(prices, budget)
+    return _ledger
+
+
+def get_ledger() -> Ledger:
+    return _ledger
@@ -1,7 +1,8 @@
-from typing import List, Dict, Any
-from conversation import CustomConversation
+from typing import List, Dict, Any, Union
+from conversation import CustomConversation, AsyncCustomConversation
 from message import (
     get_solver_prompt,
+    get_solver_with_roles_prompt,
     get_feedback_prompt,
     get_refinement_prompt,
     get_judge_prompt,
@@ -10,30 +11,61 @@ from message import (
 from schemas import (
     RolePreference,
     SolverResponse,
+    SolverResponseWithRoles,
     PeerFeedbackList,
     RefinedSolution,
     FinalDecision
 )
 
 class Agent:
-    def __init__(self, model_name: str, conversation: CustomConversation):
+    def __init__(self, model_name: str, conversation: Union[CustomConversation, AsyncCustomConversation]):
         self.model_name = model_name
         self.conversation = conversation
 
     def get_role_preferences(self) -> Dict[str, Any]:
         response = self.conversation.send_message(ROLE_SELECTION_PROMPT, RolePreference)
+        return self._role_preferences_result(response)
+
+    async def get_role_preferences_async(self) -> Dict[str, Any]:
+        response = await self.conversation.send_message(ROLE_SELECTION_PROMPT, RolePreference)
+        return self._role_preferences_result(response)
+
+    def _role_preferences_result(self, response: RolePreference) -> Dict[str, Any]:
         return {
             "model": self.model_name,
             "confidences": [entry.model_dump() for entry in response.confidence_by_role]
         }
 
+    def solve_with_roles(self, question: str) -> Dict[str, Any]:
+        response = self.conversation.send_message(get_solver_with_roles_prompt(question), SolverResponseWithRoles)
+        return self._solve_with_roles_result(response)
+
+    async def solve_with_roles_async(self, question: str) -> Dict[str, Any]:
+        response = await self.conversation.send_message(get_solver_with_roles_prompt(question), SolverResponseWithRoles)
+        return self._solve_with_roles_result(response)
+
+    def _solve_with_roles_result(self, response: SolverResponseWithRoles) -> Dict[str, Any]:
+        # Shaped like a role-selection result, plus the answer as a plain SolverResponse
+        return {
+            "model": self.model_name,
+            "confidences": [entry.model_dump() for entry in response.confidence_by_role],
+            "response": SolverResponse(**response.model_dump(exclude={'confidence_by_role'}))
+        }
+
 class Solver(Agent):
-    def __init__(self, model_name: str, conversation: CustomConversation, solver_id: str):
+    def __init__(self, model_name: str, conversation: Union[CustomConversation, AsyncCustomConversation], solver_id: str):
         super().__init__(model_name, conversation)
         self.solver_id = solver_id
 
     def initial_solve(self, question: str) -> Dict[str, Any]:
         response = self.conversation.send_message(get_solver_prompt(question), SolverResponse)
+        return self._initial_solve_result(response)
+
+    async def initial_solve_async(self, question: str) -> Dict[str, Any]:
+        response = await self.conversation.send_message(get_solver_prompt(question), SolverResponse)
+        return self._initial_solve_result(response)
+
+    def _initial_solve_result(self, response: SolverResponse) -> Dict[str, Any]:
         return {
             "solver_id": self.solver_id,
             "model": self.model_name,
@@ -41,15 +73,35 @@ class Solver(Agent):
         }
 
     def peer_review(self, all_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
-        other_answers = [ans for ans in all_answers if ans['solver_id'] != self.solver_id]
-        prompt = get_feedback_prompt(other_answers)
+        prompt = get_feedback_prompt(self._other_answers(all_answers))
         feedback_response = self.conversation.send_message(prompt, PeerFeedbackList)
+        return self._peer_review_result(feedback_response)
+
+    async def peer_review_async(self, all_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        prompt = get_feedback_prompt(self._other_answers(all_answers))
+        feedback_response = await self.conversation.send_message(prompt, PeerFeedbackList)
+        return self._peer_review_result(feedback_response)
+
+    def _other_answers(self, all_answers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [ans for ans in all_answers if ans['solver_id'] != self.solver_id]
+
+    def _peer_review_result(self, feedback_response: PeerFeedbackList) -> Dict[str, Any]:
         return {
             "reviewer_id": self.solver_id,
             "feedbacks": feedback_response
         }
 
     def refine_solution(self, all_feedbacks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        prompt = get_refinement_prompt(self._relevant_feedbacks(all_feedbacks))
+        refinement_response = self.conversation.send_message(prompt, RefinedSolution)
+        return self._refine_solution_result(refinement_response)
+
+    async def refine_solution_async(self, all_feedbacks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        prompt = get_refinement_prompt(self._relevant_feedbacks(all_feedbacks))
+        refinement_response = await self.conversation.send_message(prompt, RefinedSolution)
+        return self._refine_solution_result(refinement_response)
+
+    def _relevant_feedbacks(self, all_feedbacks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # Filter feedbacks for this solver
         relevant_feedbacks = []
         for pf in all_feedbacks:
@@ -59,18 +111,23 @@ class Solver(Agent):
                         'reviewer_id': pf['reviewer_id'],
                         'feedbacks': fb
                     })
-        
-        prompt = get_refinement_prompt(relevant_feedbacks)
-        refinement_response = self.conversation.send_message(prompt, RefinedSolution)
-        
+        return relevant_feedbacks
+
+    def _refine_solution_result(self, refinement_response: RefinedSolution) -> Dict[str, Any]:
         return {
             "solver_id": self.solver_id,
             "refined_response": refinement_response
         }
 
 class Judge(Agent):
-    def decide(self, question: str, original_answers: List[Dict[str, Any]], 
+    def decide(self, question: str, original_answers: List[Dict[str, Any]],
                peer_feedbacks: List[Dict[str, Any]], refined_solutions: List[Dict[str, Any]]) -> FinalDecision:
         prompt = get_judge_prompt(question, original_answers, peer_feedbacks, refined_solutions)
         final_verdict = self.conversation.send_message(prompt, FinalDecision)
         return final_verdict
+
+    async def decide_async(self, question: str, original_answers: List[Dict[str, Any]],
+                           peer_feedbacks: List[Dict[str, Any]], refined_solutions: List[Dict[str, Any]]) -> FinalDecision:
+        prompt = get_judge_prompt(question, original_answers, peer_feedbacks, refined_solutions)
+        final_verdict = await self.conversation.send_message(prompt, FinalDecision)
+        return final_verdict
@@ -0,0 +1,345 @@
+"""
+Columnar analytics over debate runs.
+Result and evaluation files are streamed record by record into flat NumPy
+columns, so memory grows with the number of answers, not with the file size.
+"""
+
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from answer_matcher import normalize
+
+INITIAL = 0
+REFINED = 1
+CASCADE = 2
+PHASES = ('initial', 'refined', 'cascade')
+
+UNKNOWN_MODEL = -1
+CHUNK_SIZE = 1 << 20
+CASCADE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+# Column name -> array typecode, numpy dtype
+QUESTION_COLUMNS = {
+    'id': ('q', np.int64),
+    'evaluated': ('b', np.bool_),
+    'correct': ('b', np.bool_),        # The judge's winning answer
+    'early_exit': ('b', np.bool_),
+    'cascade_tier': ('b', np.int8),    # 0 when the cascade was off
+    'cascade_confidence': ('d', np.float64),
+    'cost': ('d', np.float64),
+    'input_tokens': ('q', np.int64),
+    'output_tokens': ('q', np.int64),
+}
+ANSWER_COLUMNS = {
+    'question': ('l', np.int64),       # Row in the question columns
+    'solver': ('h', np.int16),
+    'model': ('h', np.int16),
+    'phase': ('b', np.int8),
+    'correct': ('b', np.bool_),
+    'answer': ('l', np.int64),         # Code of the normalized answer text
+}
+
+
+def iter_records(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    # JSONL (results.jsonl) or a JSON array (results.json, final_evaluation.json), without loading the file
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is neither JSONL nor a JSON array")
+        position = 1
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The next element is incomplete: read on, at least doubling the buffer so large records stay linear
+                more = f.read(max(chunk_size, len(buffer) - position))
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield record
+            position = end
+            if position > chunk_size:
+                buffer, position = buffer[position:], 0
+
+
+class _Columns:
+    # Typed append-only buffers, turned into NumPy arrays once the stream is exhausted
+    def __init__(self, spec: Dict[str, Tuple[str, Any]]):
+        self._spec = spec
+        self._data = {name: array(typecode) for name, (typecode, _) in spec.items()}
+        self.rows = 0
+
+    def append(self, **values: Any) -> int:
+        for name, column in self._data.items():
+            column.append(values.get(name, 0))
+        self.rows += 1
+        return self.rows - 1
+
+    def set(self, row: int, **values: Any):
+        for name, value in values.items():
+            self._data[name][row] = value
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        return {name: np.asarray(self._data[name], dtype=dtype) for name, (_, dtype) in self._spec.items()}
+
+
+class _Codes:
+    # Interns strings as small integer codes
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __call__(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class Run:
+    def __init__(self, name: str, questions: Dict[str, np.ndarray], answers: Dict[str, np.ndarray],
+                 solvers: List[str], models: List[str], answer_count: int):
+        self.name = name
+        self.questions = questions
+        self.answers = answers
+        self.solvers = solvers
+        self.models = models
+        self.answer_count = answer_count  # Distinct normalized answers
+
+    def __len__(self) -> int:
+        return len(self.questions['id'])
+
+
+def load_run(results_path: str, evaluation_path: str, name: Optional[str] = None) -> Run:
+    questions = _Columns(QUESTION_COLUMNS)
+    rows: Dict[Any, int] = {}
+    solver_models: Dict[Tuple[Any, str], int] = {}
+    models = _Codes()
+
+    for record in iter_records(results_path):
+        output = record.get('process_output') or {}
+        cascade = output.get('cascade') or {}
+        usage = record.get('usage') or {}
+        values = {
+            'id': record.get('id', 0),
+            'early_exit': bool(output.get('early_exit')),
+            'cascade_tier': cascade.get('tier', 0),
+            'cascade_confidence': cascade.get('confidence', np.nan),
+            'cost': usage.get('cost_usd', 0.0),
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+        }
+        # A re-appended question (results.jsonl) replaces the earlier record
+        if values['id'] in rows:
+            questions.set(rows[values['id']], **values)
+        else:
+            rows[values['id']] = questions.append(**values)
+        for solution in output.get('initial_solutions') or []:
+            solver_models[(values['id'], solution['solver_id'])] = models(solution['model'])
+        if cascade:
+            solver_models[(values['id'], 'cascade')] = models(cascade['model'])
+
+    answers = _Columns(ANSWER_COLUMNS)
+    solvers = _Codes()
+    texts = _Codes()
+    for entry in iter_records(evaluation_path):
+        question_id = entry['question_number']
+        row = rows.get(question_id)
+        if row is None:
+            continue
+        questions.set(row, evaluated=True, correct=bool(entry.get('is_correct', False)))
+        for detail in entry.get('solver_details', []):
+            if detail['type'] not in PHASES:
+                continue
+            answers.append(question=row, solver=solvers(detail['solver_id']),
+                           model=solver_models.get((question_id, detail['solver_id']), UNKNOWN_MODEL),
+                           phase=PHASES.index(detail['type']), correct=bool(detail['is_correct']),
+                           answer=texts(normalize(detail['answer'])))
+
+    return Run(name or os.path.splitext(os.path.basename(results_path))[0], questions.to_numpy(),
+               answers.to_numpy(), solvers.names, models.names, len(texts.names))
+
+
+def percent(count: Any, total: Any) -> float:
+    return float(count) / float(total) * 100 if total else 0.0
+
+
+def metrics(run: Run) -> Dict[str, Any]:
+    q, a = run.questions, run.answers
+    total = len(run) or 1
+    correct = q['correct'] & q['evaluated']
+
+    initial = a['phase'] == INITIAL
+    refined = a['phase'] == REFINED
+
+    # Improvement / regression: pair each solver's initial and refined answer to the same question
+    key = a['question'] * max(len(run.solvers), 1) + a['solver']
+    _, initial_rows, refined_rows = np.intersect1d(key[initial], key[refined], return_indices=True)
+    initial_correct = a['correct'][initial][initial_rows]
+    refined_correct = a['correct'][refined][refined_rows]
+    improved = int(np.count_nonzero(~initial_correct & refined_correct))
+    regressed = int(np.count_nonzero(initial_correct & ~refined_correct))
+
+    # Group the initial answers by (question, normalized answer)
+    question_rows = a['question'][initial]
+    groups, first, inverse, counts = np.unique(question_rows * max(run.answer_count, 1) + a['answer'][initial],
+                                               return_index=True, return_inverse=True, return_counts=True)
+    group_question = groups // max(run.answer_count, 1)
+    group_correct = np.bincount(inverse, weights=a['correct'][initial], minlength=len(groups)) > 0
+
+    # Voting: the most common initial answer per question, ties going to the first one given
+    order = np.lexsort((first, -counts, group_question))
+    leaders = order[np.r_[True, group_question[order][1:] != group_question[order][:-1]]] if len(order) else order
+    voting_correct = int(np.count_nonzero(group_correct[leaders]))
+
+    # Consensus: at least two initial answers, all the same; a cascade answered alone has nothing to agree with
+    answered = np.bincount(question_rows, minlength=len(run)) >= 2
+    distinct = np.bincount(group_question, minlength=len(run))
+    consensus = answered & (distinct == 1)
+    disagreement = answered & (distinct > 1)
+    judge_correct = int(np.count_nonzero(disagreement & correct))
+
+    return {
+        "questions": len(run),
+        "system_correct": int(np.count_nonzero(correct)),
+        "system_accuracy": percent(np.count_nonzero(correct), total),
+        "initial_accuracy": percent(np.count_nonzero(a['correct'][initial]), np.count_nonzero(initial)),
+        "refined_accuracy": percent(np.count_nonzero(a['correct'][refined]), np.count_nonzero(refined)),
+        "voting_correct": voting_correct,
+        "voting_accuracy": percent(voting_correct, total),
+        "consensus": int(np.count_nonzero(consensus)),
+        "consensus_rate": percent(np.count_nonzero(consensus), total),
+        "early_exits": int(np.count_nonzero(q['early_exit'] & q['evaluated'])),
+        "disagreements": int(np.count_nonzero(disagreement)),
+        "judge_correct_disagreement": judge_correct,
+        "judge_efficacy": percent(judge_correct, np.count_nonzero(disagreement)),
+        "solver_pairs": len(initial_rows),
+        "improved": improved,
+        "regressed": regressed,
+        "improvement_rate": percent(improved, len(initial_rows)),
+        "regression_rate": percent(regressed, len(initial_rows)),
+        "cost_usd": float(q['cost'].sum()),
+    }
+
+
+def cascade_tiers(run: Run) -> Dict[int, List[Any]]:
+    # {tier: [questions, correct, cost]} over the evaluated questions
+    q = run.questions
+    tiers = {}
+    for tier in (1, 2):
+        rows = (q['cascade_tier'] == tier) & q['evaluated']
+        tiers[tier] = [int(np.count_nonzero(rows)), int(np.count_nonzero(rows & q['correct'])), float(q['cost'][rows].sum())]
+    return tiers
+
+
+def cascade_answers(run: Run) -> Tuple[np.ndarray, np.ndarray]:
+    # (self-reported confidence, fast answer correct) per graded cascade answer
+    rows = run.answers['phase'] == CASCADE
+    return run.questions['cascade_confidence'][run.answers['question'][rows]], run.answers['correct'][rows]
+
+
+def threshold_table(confidence: np.ndarray, correct: np.ndarray,
+                    thresholds: Tuple[float, ...] = CASCADE_THRESHOLDS) -> List[Tuple[float, int, Optional[float]]]:
+    # What each threshold would have accepted, judged by the fast answer alone: (threshold, accepted, accuracy)
+    accepted = confidence[None, :] >= np.asarray(thresholds)[:, None]
+    counts = accepted.sum(axis=1)
+    hits = (accepted & correct[None, :]).sum(axis=1)
+    return [(threshold, int(count), percent(hit, count) if count else None)
+            for threshold, count, hit in zip(thresholds, counts, hits)]
+
+
+def breakdown(run: Run, by: str = 'model') -> Dict[str, Dict[str, Tuple[int, int]]]:
+    # {model or solver: {phase: (correct, answers)}}
+    names = run.models if by == 'model' else run.solvers
+    a = run.answers
+    codes = a[by].astype(np.int64)
+    known = codes >= 0
+    key = codes[known] * len(PHASES) + a['phase'][known]
+    size = len(names) * len(PHASES)
+    totals = np.bincount(key, minlength=size).reshape(-1, len(PHASES))
+    hits = np.bincount(key, weights=a['correct'][known], minlength=size).reshape(-1, len(PHASES))
+    return {name: {phase: (int(hits[i, j]), int(totals[i, j])) for j, phase in enumerate(PHASES) if totals[i, j]}
+            for i, name in enumerate(names)}
+
+
+def format_breakdown(rows: Dict[str, Dict[str, Tuple[int, int]]], by: str = 'model') -> str:
+    lines = [f"{by:<28}" + "".join(f"{phase:>18}" for phase in PHASES)]
+    for name, phases in rows.items():
+        cells = []
+        for phase in PHASES:
+            hit, count = phases.get(phase, (0, 0))
+            cells.append(f"{hit:>5}/{count:<4}{percent(hit, count):>6.1f}%  " if count else f"{'-':>18}")
+        lines.append(f"{name:<28}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def flips(baseline: Run, run: Run) -> Dict[str, int]:
+    # Questions evaluated in both runs whose final verdict changed
+    base_ids = baseline.questions['id'][baseline.questions['evaluated']]
+    run_ids = run.questions['id'][run.questions['evaluated']]
+    common, base_rows, run_rows = np.intersect1d(base_ids, run_ids, return_indices=True)
+    before = baseline.questions['correct'][baseline.questions['evaluated']][base_rows]
+    after = run.questions['correct'][run.questions['evaluated']][run_rows]
+    return {"common": len(common), "fixed": int(np.count_nonzero(~before & after)),
+            "broken": int(np.count_nonzero(before & ~after))}
+
+
+COMPARED_METRICS = [
+    ("questions", "Questions", "{:d}"),
+    ("system_accuracy", "System accuracy %", "{:.1f}"),
+    ("voting_accuracy", "Voting accuracy %", "{:.1f}"),
+    ("initial_accuracy", "Initial accuracy %", "{:.1f}"),
+    ("refined_accuracy", "Refined accuracy %", "{:.1f}"),
+    ("improvement_rate", "Improvement %", "{:.1f}"),
+    ("regression_rate", "Regression %", "{:.1f}"),
+    ("consensus_rate", "Consensus %", "{:.1f}"),
+    ("judge_efficacy", "Judge efficacy %", "{:.1f}"),
+    ("early_exits", "Early exits", "{:d}"),
+    ("cost_usd", "Cost $", "{:.4f}"),
+]
+
+
+def compare(runs: List[Run]) -> str:
+    return format_comparison([run.name for run in runs], [metrics(run) for run in runs],
+                             [flips(runs[0], run) for run in runs[1:]])
+
+
+def format_comparison(names: List[str], results: List[Dict[str, Any]], changes: List[Dict[str, int]]) -> str:
+    # Metrics side by side; every run after the first also shows the verdicts it fixed and broke
+    width = max(12, *(len(name) + 2 for name in names))
+    lines = [f"{'':<22}" + "".join(f"{name:>{width}}" for name in names)]
+    for key, label, fmt in COMPARED_METRICS:
+        lines.append(f"{label:<22}" + "".join(f"{fmt.format(result[key]):>{width}}" for result in results))
+    if changes:
+        lines.append(f"{'Fixed / broken':<22}{'-':>{width}}"
+                     + "".join(f"{change['fixed']} / {change['broken']}".rjust(width) for change in changes))
+    return "\n".join(lines)
+
+
+def run_paths(spec: str) -> Tuple[str, str, str]:
+    # [NAME=]PATH: a run directory (results.jsonl or results.json, final_evaluation.json) or RESULTS,EVALUATION
+    name, _, path = spec.rpartition('=')
+    if ',' in path:
+        results_path, evaluation_path = path.split(',', 1)
+    else:
+        results_path = os.path.join(path, "results.jsonl")
+        if not os.path.exists(results_path):
+            results_path = os.path.join(path, "results.json")
+        evaluation_path = os.path.join(path, "final_evaluation.json")
+    return name or os.path.basename(os.path.normpath(path.split(',', 1)[0])), results_path, evaluation_path
@@ -0,0 +1,78 @@
+"""
+Local answer matching: decides the trivially decidable grading cases without an
+LLM and reports "uncertain" for everything else.
+"""
+
+import re
+import unicodedata
+from typing import List, Sequence, Union
+
+CORRECT = 'correct'
+INCORRECT = 'incorrect'
+UNCERTAIN = 'uncertain'
+
+ARTICLES = {'a', 'an', 'the'}
+NO_ANSWER = {'', 'no answer provided', 'none', 'n/a', 'unknown'}
+MAX_TYPO_EDITS = 1     # A near miss with more edits than this goes to the LLM grader
+MIN_TYPO_LENGTH = 12   # Shorter answers, and answers with digits, must match exactly ("Columbia" vs "Colombia")
+
+
+def tokens(answer: str) -> List[str]:
+    text = unicodedata.normalize('NFKD', str(answer))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    words = re.findall(r"[\w]+", text.replace("'", ""))
+    while words and words[0] in ARTICLES:
+        words = words[1:]
+    return words
+
+
+def normalize(answer: str) -> str:
+    # Case, accents, punctuation and leading articles are ignored; this is also the grading dedup key
+    return " ".join(tokens(answer))
+
+
+def edit_distance(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        for j, ch_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ch_a != ch_b)))
+        previous = current
+    return previous[-1]
+
+
+def _match_one(answer: str, reference: str) -> str:
+    answer_tokens = tokens(answer)
+    reference_tokens = tokens(reference)
+    if not answer_tokens or " ".join(answer_tokens) in NO_ANSWER:
+        return INCORRECT
+    if answer_tokens == reference_tokens:
+        return CORRECT
+
+    # Same words in a different order, or written with/without spaces ("Match makers")
+    if sorted(answer_tokens) == sorted(reference_tokens) or "".join(answer_tokens) == "".join(reference_tokens):
+        return CORRECT
+
+    # Different plain numbers cannot be semantically equal
+    if len(answer_tokens) == len(reference_tokens) == 1 and answer_tokens[0].isdigit() and reference_tokens[0].isdigit():
+        return INCORRECT
+
+    # A single typo in a long, non-numeric answer; any other near miss goes to the LLM grader
+    joined_answer, joined_reference = "".join(answer_tokens), "".join(reference_tokens)
+    if (len(joined_reference) >= MIN_TYPO_LENGTH and joined_answer.isalpha() and joined_reference.isalpha()
+            and edit_distance(joined_answer, joined_reference) <= MAX_TYPO_EDITS):
+        return CORRECT
+    return UNCERTAIN
+
+
+def match(answer: str, reference: Union[str, Sequence[str]]) -> str:
+    # A reference may list several accepted answers; any correct match wins
+    references = [reference] if isinstance(reference, str) else list(reference)
+    verdicts = [_match_one(answer, ref) for ref in references]
+    if CORRECT in verdicts:
+        return CORRECT
+    if verdicts and all(v == INCORRECT for v in verdicts):
+        return INCORRECT
+    return UNCERTAIN
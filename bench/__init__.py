@@ -0,0 +1,9 @@
+"""
+End-to-end throughput and latency benchmark for the debate pipeline,
+run against the offline Simulated provider.
+
+Run from the repository root: python -m bench --help
+"""
+
+from bench.runner import BenchConfig, run_benchmark
+from bench.report import summarize, format_summary, compare
@@ -0,0 +1,120 @@
+import argparse
+import json
+import sys
+from collaboration import Cascade
+import simulated_provider
+import response_cache
+from bench.imports import check
+from bench.report import compare, format_summary, summarize
+from bench.runner import PER_QUESTION, STARTUP, BenchConfig, run_benchmark
+from bench.workloads import load_questions, synthetic_questions
+
+
+def parse_latency(value):
+    # DIST:PARAM[:PARAM], e.g. lognormal:1.5:0.4 or constant:0.2
+    kind, *params = value.split(':')
+    return (kind, *(float(p) for p in params))
+
+
+def parse_model_latency(values):
+    latencies = {}
+    for value in values or []:
+        model, _, spec = value.partition('=')
+        latencies[model] = parse_latency(spec)
+    return latencies
+
+
+def run(args):
+    if args.synthetic:
+        questions = synthetic_questions(args.synthetic, seed=args.seed)
+    else:
+        questions = load_questions(args.questions, limit=args.limit, repeat=args.repeat)
+
+    simulation = simulated_provider.SimulationConfig(
+        latency=parse_latency(args.latency), model_latency=parse_model_latency(args.model_latency),
+        rate_limit_rate=args.rate_limit_rate, failure_rate=args.failure_rate,
+        correct_rate=args.correct_rate, seed=args.seed, replay_path=args.replay, time_scale=args.time_scale
+    )
+    config = BenchConfig(
+        questions, driver=args.driver, max_questions=args.max_questions, max_requests=args.max_requests,
+        model_limits=args.model_limit, rate_limits=args.rate_limit, history=args.history,
+        grading_concurrency=args.grading_concurrency, evaluate=not args.skip_evaluation, early_exit=args.early_exit,
+        cascade=Cascade(args.cascade, args.cascade_confidence) if args.cascade else None, roles=args.roles,
+        dataflow=args.dataflow, cache_path=args.cache, cache_mode=args.cache_mode, simulation=simulation
+    )
+    summary = summarize(run_benchmark(config, verbose=args.verbose))
+    print(format_summary(summary))
+
+    with open(args.output, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\nSaved to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Debate pipeline benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run a benchmark against the simulated provider")
+    workload = run_parser.add_mutually_exclusive_group()
+    workload.add_argument("--questions", default="questions.json",
+                          help="questions.json-style workload (default)")
+    workload.add_argument("--synthetic", type=int, metavar="N",
+                          help="Use N generated questions instead of a questions file")
+    run_parser.add_argument("--limit", type=int, default=None, help="Only use the first N questions of the file")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Repeat the questions file N times")
+    run_parser.add_argument("--driver", choices=["async", "sync"], default="async",
+                            help="async: concurrent scheduler as in main.py; sync: blocking, one question at a time")
+    run_parser.add_argument("--max-questions", type=int, default=4)
+    run_parser.add_argument("--max-requests", type=int, default=16)
+    run_parser.add_argument("--model-limit", action="append", metavar="MODEL=N")
+    run_parser.add_argument("--rate-limit", action="append", metavar="Simulated[:MODEL]=RPM,TPM",
+                            help="Quota applied to the simulated models (default: unlimited)")
+    run_parser.add_argument("--history", default="current_question")
+    run_parser.add_argument("--grading-concurrency", type=int, default=16)
+    run_parser.add_argument("--skip-evaluation", action="store_true")
+    run_parser.add_argument("--early-exit", type=float, metavar="CONFIDENCE", default=None,
+                            help="Consensus early exit threshold, as in main.py")
+    run_parser.add_argument("--roles", choices=[STARTUP, PER_QUESTION], default=STARTUP,
+                            help="Role selection mode, as in main.py")
+    run_parser.add_argument("--dataflow", action="store_true", help="Dependency-graph debate, as in main.py")
+    run_parser.add_argument("--cascade", metavar="MODEL", default=None,
+                            help="Confidence-gated cascade model, as in main.py")
+    run_parser.add_argument("--cascade-confidence", type=float, default=0.8)
+    run_parser.add_argument("--cache", default=None,
+                            help="Response cache file; without it the cache is bypassed")
+    run_parser.add_argument("--cache-mode", default=response_cache.WRITE_THROUGH,
+                            choices=[response_cache.WRITE_THROUGH, response_cache.READ_ONLY, response_cache.BYPASS])
+    run_parser.add_argument("--latency", default="lognormal:1.5:0.4", metavar="DIST:PARAMS",
+                            help="Simulated latency: constant:S, uniform:LO:HI, normal:MEAN:STD, "
+                                 "lognormal:MEDIAN:SIGMA or exponential:MEAN")
+    run_parser.add_argument("--model-latency", action="append", metavar="MODEL=DIST:PARAMS",
+                            help="Per-model latency override (repeatable)")
+    run_parser.add_argument("--time-scale", type=float, default=1.0,
+                            help="Multiply every simulated latency, e.g. 0.01 for a quick run")
+    run_parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                            help="Fraction of calls failing with an injected 429 (retry backoff is real time)")
+    run_parser.add_argument("--failure-rate", type=float, default=0.0)
+    run_parser.add_argument("--correct-rate", type=float, default=0.5)
+    run_parser.add_argument("--replay", default=None, help="Replay recorded answers from a results.json")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default="bench_result.json")
+    run_parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved benchmark results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    imports_parser = commands.add_parser("imports", help="Check that entry points import fast and without provider SDKs")
+    imports_parser.add_argument("modules", nargs="*", help="Modules to import (default: the entry points)")
+    imports_parser.add_argument("--max-ms", type=float, default=None, help="Also fail above this import time")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "imports":
+        problems = check(args.modules, args.max_ms)
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        sys.exit(1 if problems else 0)
+    else:
+        print(compare(args.baseline, args.candidate))
@@ -0,0 +1,45 @@
+"""
+Import-time regression check.
+Imports each entry point in a fresh interpreter and reports whether any
+provider SDK was loaded on the way.
+"""
+
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+MODULES = ['evaluate', 'utils', 'scheduler', 'main', 'bench']
+SDK_MODULES = ['google.genai', 'openai', 'dotenv']
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000.0, "sdks": [m for m in {sdks!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int = 3) -> Dict[str, Any]:
+    # Best of a few fresh interpreters, since the first one also warms the file cache
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, sdks=SDK_MODULES)],
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(samples, key=lambda sample: sample['ms'])
+    return {"module": module, "ms": best['ms'], "sdks": best['sdks']}
+
+
+def check(modules: Optional[List[str]] = None, max_ms: Optional[float] = None) -> List[str]:
+    # Returns the problems found; empty when every module imports without an SDK and within max_ms
+    problems = []
+    for module in modules or MODULES:
+        result = measure(module)
+        print(f"{module:<12}{result['ms']:>9.1f} ms" + (f"  imports {', '.join(result['sdks'])}" if result['sdks'] else ""))
+        if result['sdks']:
+            problems.append(f"{module} imports {', '.join(result['sdks'])} at import time")
+        if max_ms is not None and result['ms'] > max_ms:
+            problems.append(f"{module} took {result['ms']:.1f} ms to import (limit {max_ms:.0f} ms)")
+    return problems
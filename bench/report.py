@@ -0,0 +1,144 @@
+"""
+Turns raw benchmark measurements into the machine-readable summary, prints it,
+and compares two saved summaries.
+"""
+
+import datetime
+import json
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence
+
+PERCENTILES = (50, 95, 99)
+
+# (label, path in the summary, True if higher is better) for the comparison table
+HEADLINE = [
+    ("questions/min", ("questions_per_minute",), True),
+    ("question p50 s", ("phases", "question", "p50"), False),
+    ("question p95 s", ("phases", "question", "p95"), False),
+    ("question p99 s", ("phases", "question", "p99"), False),
+    ("evaluation s", ("wall_seconds", "evaluation"), False),
+    ("calls/question", ("calls_per_question",), False),
+    ("attempts/question", ("attempts_per_question",), False),
+    ("local CPU ms/question", ("local_cpu_ms_per_question",), False),
+    ("peak RSS MB", ("peak_rss_mb",), False),
+]
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    # Linear interpolation between the closest ranks
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _distribution(values: List[float]) -> Dict[str, Any]:
+    stats = {"count": len(values), "mean": sum(values) / len(values) if values else None,
+             "max": max(values) if values else None}
+    stats.update({f"p{q}": percentile(values, q) for q in PERCENTILES})
+    return stats
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    completed = raw['completed']
+    debate_minutes = raw['wall_seconds']['debate'] / 60.0
+    calls = sum(raw['calls'].values())
+    attempts = sum(raw['attempts'].values())
+    local_cpu = raw['cpu_seconds'] - raw['simulator_cpu_seconds']
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "git_commit": _git_commit(),
+        "config": raw['config'],
+        "completed": completed,
+        "failed_ids": raw['failed_ids'],
+        "questions_per_minute": completed / debate_minutes if debate_minutes else None,
+        "wall_seconds": raw['wall_seconds'],
+        "phases": {phase: _distribution(values) for phase, values in sorted(raw['durations'].items())},
+        "calls_by_phase": raw['calls'],
+        "attempts_by_phase": raw['attempts'],
+        "calls_per_question": calls / completed if completed else None,
+        "attempts_per_question": attempts / completed if completed else None,
+        "cpu_seconds": raw['cpu_seconds'],
+        "simulator_cpu_seconds": raw['simulator_cpu_seconds'],
+        # CPU spent in our own code (scheduling, prompts, parsing, bookkeeping), without the simulated provider
+        "local_cpu_ms_per_question": 1000.0 * local_cpu / completed if completed else None,
+        "peak_rss_mb": raw['peak_rss_mb'],
+        "peak_rss_before_mb": raw['peak_rss_before_mb'],
+        "correct_winners": raw['correct_winners'],
+        "early_exits": raw['early_exits'],
+        "cascade_accepted": raw['cascade_accepted'],
+    }
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    config = summary['config']
+    lines = [
+        f"{summary['completed']}/{config['questions']} questions ({config['driver']} driver), "
+        f"failed: {summary['failed_ids'] or 'none'}",
+        f"Questions/min: {_fmt(summary['questions_per_minute'])}",
+        "Wall time (s): " + ", ".join(f"{k} {_fmt(v)}" for k, v in summary['wall_seconds'].items()),
+        "",
+        f"{'phase':<16}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'max s':>10}",
+    ]
+    for phase, stats in summary['phases'].items():
+        lines.append(f"{phase:<16}{stats['count']:>7}{_fmt(stats['p50']):>10}{_fmt(stats['p95']):>10}"
+                     f"{_fmt(stats['p99']):>10}{_fmt(stats['max']):>10}")
+    lines += [
+        "",
+        f"Calls/question: {_fmt(summary['calls_per_question'])} "
+        f"(provider attempts incl. retries: {_fmt(summary['attempts_per_question'])})",
+        "Calls by phase: " + ", ".join(f"{k} {v}" for k, v in sorted(summary['calls_by_phase'].items())),
+        f"CPU: {_fmt(summary['cpu_seconds'])} s total, {_fmt(summary['simulator_cpu_seconds'])} s in the simulator, "
+        f"{_fmt(summary['local_cpu_ms_per_question'])} ms/question local",
+        f"Peak RSS: {_fmt(summary['peak_rss_mb'])} MB (before run: {_fmt(summary['peak_rss_before_mb'])} MB)",
+        f"Correct winners: {summary['correct_winners']}, early exits: {summary.get('early_exits', 0)}, "
+        f"accepted by the cascade: {summary.get('cascade_accepted', 0)}",
+    ]
+    return "\n".join(lines)
+
+
+def _lookup(summary: Dict[str, Any], path: Sequence[str]) -> Optional[float]:
+    value: Any = summary
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(baseline_path: str, candidate_path: str) -> str:
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    with open(candidate_path, "r") as f:
+        candidate = json.load(f)
+
+    lines = [f"{'metric':<24}{'baseline':>12}{'candidate':>12}{'change':>10}"]
+    for label, path, higher_is_better in HEADLINE:
+        old, new = _lookup(baseline, path), _lookup(candidate, path)
+        change = ""
+        if old and new is not None:
+            delta = (new - old) / old * 100.0
+            better = delta > 0 if higher_is_better else delta < 0
+            change = f"{delta:+.1f}%" + (" *" if better and abs(delta) >= 5 else "")
+        lines.append(f"{label:<24}{_fmt(old):>12}{_fmt(new):>12}{change:>10}")
+    if baseline.get('config') != candidate.get('config'):
+        lines.append("\nNote: the two runs used different configurations.")
+    lines.append("(* = improvement of 5% or more)")
+    return "\n".join(lines)
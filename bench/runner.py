@@ -0,0 +1,339 @@
+"""
+Drives the debate pipeline end to end against the Simulated provider and records
+wall time per phase, provider calls, CPU time and peak memory.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import io
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import response_cache
+import scheduler
+import simulated_provider
+from agents import Agent, Solver, Judge
+from collaboration import Cascade, assign_roles, assign_roles_async, run_collaborative_solving, select_roles
+from conversation import CustomConversation, AsyncCustomConversation
+from history import HistoryPolicy
+from main import configure_rate_limits, parse_model_limits
+from utils import run_final_evaluation
+
+MODELS = ['gpt-4o', 'gpt-5-mini-2025-08-07', 'gemini-2.5-flash', 'gemini-2.0-flash-lite-001']
+
+ROLE_SELECTION = 'role_selection'
+INITIAL_SOLVE = 'initial_solve'
+PEER_REVIEW = 'peer_review'
+REFINE = 'refine'
+JUDGE = 'judge'
+EVALUATION = 'evaluation'
+QUESTION = 'question'  # One whole debate, from initial solve to verdict
+
+STARTUP = 'startup'
+PER_QUESTION = 'per_question'
+
+# (class, method, phase) pairs timed on every call
+PHASE_METHODS = [
+    (Agent, 'get_role_preferences', ROLE_SELECTION),
+    (Agent, 'solve_with_roles', INITIAL_SOLVE),
+    (Solver, 'initial_solve', INITIAL_SOLVE),
+    (Solver, 'peer_review', PEER_REVIEW),
+    (Solver, 'refine_solution', REFINE),
+    (Judge, 'decide', JUDGE),
+]
+
+_phase = contextvars.ContextVar('bench_phase', default=None)
+
+
+class BenchConfig:
+    def __init__(self, questions: List[Dict[str, Any]], driver: str = 'async',
+                 max_questions: int = 4, max_requests: int = 16, model_limits: Optional[List[str]] = None,
+                 rate_limits: Optional[List[str]] = None, history: str = 'current_question',
+                 grading_concurrency: int = 16, evaluate: bool = True, early_exit: Optional[float] = None,
+                 cascade: Optional[Cascade] = None, roles: str = STARTUP, dataflow: bool = False,
+                 cache_path: Optional[str] = None, cache_mode: str = response_cache.BYPASS,
+                 simulation: Optional[simulated_provider.SimulationConfig] = None):
+        self.questions = questions
+        self.driver = driver                # 'async' (scheduler, as main.py runs) or 'sync' (one question at a time)
+        self.max_questions = max_questions
+        self.max_requests = max_requests
+        self.model_limits = model_limits
+        self.rate_limits = rate_limits
+        self.history = history
+        self.grading_concurrency = grading_concurrency
+        self.evaluate = evaluate
+        self.early_exit = early_exit        # Consensus confidence for skipping the rest of the debate
+        self.cascade = cascade
+        self.roles = roles                  # STARTUP (one role-selection round) or PER_QUESTION (fused into the solve)
+        self.dataflow = dataflow            # Dependency graph instead of barriered phases after the initial solve
+        self.cache_path = cache_path
+        self.cache_mode = cache_mode
+        self.simulation = simulation or simulated_provider.SimulationConfig()
+
+    def describe(self) -> Dict[str, Any]:
+        sim = self.simulation
+        return {
+            "questions": len(self.questions),
+            "driver": self.driver,
+            "max_questions": self.max_questions,
+            "max_requests": self.max_requests,
+            "model_limits": self.model_limits or [],
+            "rate_limits": self.rate_limits or [],
+            "history": self.history,
+            "grading_concurrency": self.grading_concurrency,
+            "evaluate": self.evaluate,
+            "early_exit": self.early_exit,
+            "cascade": vars(self.cascade) if self.cascade else None,
+            "roles": self.roles,
+            "dataflow": self.dataflow,
+            "cache_mode": self.cache_mode if self.cache_path else response_cache.BYPASS,
+            "simulation": {
+                "latency": list(sim.latency),
+                "model_latency": {model: list(spec) for model, spec in sim.model_latency.items()},
+                "rate_limit_rate": sim.rate_limit_rate,
+                "failure_rate": sim.failure_rate,
+                "correct_rate": sim.correct_rate,
+                "seed": sim.seed,
+                "time_scale": sim.time_scale,
+            },
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.calls: Dict[str, int] = defaultdict(int)      # send_message calls, including cache hits
+        self.attempts: Dict[str, int] = defaultdict(int)   # Provider attempts, including retries
+        self.simulator_cpu = 0.0
+        self._lock = threading.Lock()
+
+    def add_duration(self, phase: str, seconds: float):
+        with self._lock:
+            self.durations[phase].append(seconds)
+
+    def count(self, counter: Dict[str, int]):
+        with self._lock:
+            counter[_phase.get() or 'other'] += 1
+
+    def add_simulator_cpu(self, seconds: float):
+        with self._lock:
+            self.simulator_cpu += seconds
+
+
+def _timed(recorder: Recorder, phase: str, method: Any) -> Any:
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed_async(*args, **kwargs):
+            token = _phase.set(phase)
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                recorder.add_duration(phase, time.perf_counter() - start)
+                _phase.reset(token)
+        return timed_async
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        token = _phase.set(phase)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            recorder.add_duration(phase, time.perf_counter() - start)
+            _phase.reset(token)
+    return timed
+
+
+def _counted(recorder: Recorder, counter: Dict[str, int], method: Any) -> Any:
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def counted_async(*args, **kwargs):
+            recorder.count(counter)
+            return await method(*args, **kwargs)
+        return counted_async
+
+    @functools.wraps(method)
+    def counted(*args, **kwargs):
+        recorder.count(counter)
+        return method(*args, **kwargs)
+    return counted
+
+
+def _cpu_metered(recorder: Recorder, method: Any) -> Any:
+    # thread_time, so simulator work on other threads is not attributed to this call
+    @functools.wraps(method)
+    def metered(*args, **kwargs):
+        start = time.thread_time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            recorder.add_simulator_cpu(time.thread_time() - start)
+    return metered
+
+
+@contextlib.contextmanager
+def instrument(recorder: Recorder):
+    patches: List[Tuple[Any, str, Any]] = []
+    for cls, name, phase in PHASE_METHODS:
+        for method_name in (name, f"{name}_async"):
+            patches.append((cls, method_name, _timed(recorder, phase, getattr(cls, method_name))))
+    patches.append((scheduler, 'run_collaborative_solving_async',
+                    _timed(recorder, QUESTION, scheduler.run_collaborative_solving_async)))
+    for cls in (CustomConversation, AsyncCustomConversation):
+        patches.append((cls, 'send_message', _counted(recorder, recorder.calls, cls.send_message)))
+        patches.append((cls, '_send_once', _counted(recorder, recorder.attempts, cls._send_once)))
+    for name in ('plan_call', 'respond'):
+        method = getattr(simulated_provider.SimulatedBackend, name)
+        patches.append((simulated_provider.SimulatedBackend, name, _cpu_metered(recorder, method)))
+
+    originals = [(cls, name, cls.__dict__[name]) for cls, name, _ in patches]
+    try:
+        for cls, name, wrapper in patches:
+            setattr(cls, name, wrapper)
+        yield recorder
+    finally:
+        for cls, name, original in originals:
+            setattr(cls, name, original)
+
+
+def _models(conversation_cls: Any, history_policy: HistoryPolicy) -> List[Tuple[str, Any]]:
+    return [(model, conversation_cls('Simulated', model, history_policy)) for model in MODELS]
+
+
+async def _run_async(config: BenchConfig, recorder: Recorder, results: List[Dict[str, Any]]) -> Tuple[float, List[int]]:
+    AsyncCustomConversation.set_concurrency_limit(config.max_requests, parse_model_limits(config.model_limits))
+    models = _models(AsyncCustomConversation, HistoryPolicy.parse(config.history))
+    start = time.perf_counter()
+    judge, solvers = (None, []) if config.roles == PER_QUESTION else await assign_roles_async(models)
+    role_seconds = time.perf_counter() - start
+
+    failed_ids = await scheduler.run_questions(config.questions, judge, solvers, set(), results.append,
+                                     max_in_flight=config.max_questions, early_exit_confidence=config.early_exit,
+                                     cascade=config.cascade, models=models if config.roles == PER_QUESTION else None,
+                                     dataflow=config.dataflow)
+    return role_seconds, failed_ids
+
+
+def _run_sync(config: BenchConfig, recorder: Recorder, results: List[Dict[str, Any]]) -> Tuple[float, List[int]]:
+    models = _models(CustomConversation, HistoryPolicy.parse(config.history))
+    start = time.perf_counter()
+    judge, solvers = (None, []) if config.roles == PER_QUESTION else assign_roles(models)
+    role_seconds = time.perf_counter() - start
+
+    failed_ids = []
+    for i, item in enumerate(config.questions, 1):
+        start = time.perf_counter()
+        try:
+            initial_answers = None
+            if config.roles == PER_QUESTION:
+                forks = [(name, conv.fork()) for name, conv in models]
+                lines = [(conv, fork) for (_, conv), (_, fork) in zip(models, forks)]
+                q_judge, q_solvers, initial_answers = select_roles(item['question'], forks)
+            else:
+                q_judge, q_solvers = scheduler.fork_roles(judge, solvers)
+                lines = list(zip(scheduler.agent_conversations(judge, solvers),
+                                 scheduler.agent_conversations(q_judge, q_solvers)))
+            process_output = run_collaborative_solving(item['question'], q_judge, q_solvers, config.early_exit,
+                                                       config.cascade, initial_answers, config.dataflow)
+            for parent, fork in lines:
+                parent.absorb(fork)
+        except Exception as e:
+            print(f"Question {i} failed: {e}")
+            failed_ids.append(i)
+            continue
+        finally:
+            recorder.add_duration(QUESTION, time.perf_counter() - start)
+        results.append({"id": i, "question": item['question'], "correct_answer": item['answer'],
+                        "process_output": process_output})
+    return role_seconds, failed_ids
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+def run_benchmark(config: BenchConfig, verbose: bool = False) -> Dict[str, Any]:
+    # Returns the raw measurements; bench.report turns them into the summary
+    recorder = Recorder()
+    results: List[Dict[str, Any]] = []
+    evaluation: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        # The simulator reads reference answers from the workload, so solvers can be right
+        questions_path = os.path.join(workdir, "questions.json")
+        with open(questions_path, "w") as f:
+            json.dump(config.questions, f)
+        sim = config.simulation
+        if not sim.replay_path:
+            sim.replay_path = questions_path
+        simulated_provider.configure(sim)
+        configure_rate_limits(config.rate_limits)
+        cache = response_cache.configure(config.cache_path, config.cache_mode) if config.cache_path else \
+            response_cache.configure(os.path.join(workdir, "cache.sqlite"), response_cache.BYPASS)
+
+        rss_before = _peak_rss_mb()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        output = io.StringIO() if not verbose else None
+        with instrument(recorder), contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            if config.driver == 'sync':
+                role_seconds, failed_ids = _run_sync(config, recorder, results)
+            else:
+                role_seconds, failed_ids = asyncio.run(_run_async(config, recorder, results))
+            debate_seconds = time.perf_counter() - wall_start - role_seconds
+
+            evaluation_seconds = 0.0
+            if config.evaluate and results:
+                results_path = os.path.join(workdir, "results.json")
+                evaluation_path = os.path.join(workdir, "final_evaluation.json")
+                with open(results_path, "w") as f:
+                    json.dump(sorted(results, key=lambda r: r['id']), f)
+                token = _phase.set(EVALUATION)
+                eval_start = time.perf_counter()
+                try:
+                    run_final_evaluation(results_path, evaluation_path, max_concurrency=config.grading_concurrency,
+                                         api_provider='Simulated')
+                finally:
+                    _phase.reset(token)
+                evaluation_seconds = time.perf_counter() - eval_start
+                recorder.add_duration(EVALUATION, evaluation_seconds)
+                with open(evaluation_path, "r") as f:
+                    evaluation = json.load(f)
+
+        cpu_seconds = time.process_time() - cpu_start
+        wall_seconds = time.perf_counter() - wall_start
+        if cache is not None:
+            cache.close()
+
+    return {
+        "config": config.describe(),
+        "completed": len(results),
+        "failed_ids": failed_ids,
+        "wall_seconds": {
+            "role_selection": role_seconds,
+            "debate": debate_seconds,
+            "evaluation": evaluation_seconds,
+            "total": wall_seconds,
+        },
+        "durations": dict(recorder.durations),
+        "calls": dict(recorder.calls),
+        "attempts": dict(recorder.attempts),
+        "cpu_seconds": cpu_seconds,
+        "simulator_cpu_seconds": recorder.simulator_cpu,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_before_mb": rss_before,
+        "correct_winners": sum(1 for entry in evaluation if entry.get('is_correct')),
+        "early_exits": sum(1 for r in results if r['process_output'].get('early_exit')),
+        "cascade_accepted": sum(1 for r in results if (r['process_output'].get('cascade') or {}).get('tier') == 1),
+    }
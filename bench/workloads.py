@@ -0,0 +1,31 @@
+"""
+Benchmark workloads: lists of {"question", "answer"} items in the questions.json format.
+"""
+
+import json
+import random
+from typing import Any, Dict, List, Optional
+from simulated_provider import ANSWER_POOL
+
+SYNTHETIC_TEMPLATE = (
+    "Synthetic benchmark question {n}. In one famous story, \"X\" appears at midnight "
+    "and disappears before dawn, and clue number {n} hints at its hidden nature.\n"
+    "Question: Name X in one word."
+)
+
+
+def load_questions(path: str = "questions.json", limit: Optional[int] = None, repeat: int = 1) -> List[Dict[str, Any]]:
+    with open(path, "r") as f:
+        questions = json.load(f)[:limit]
+    workload = []
+    for copy in range(repeat):
+        for item in questions:
+            # Copies get distinct text, so they are separate questions for caching and replay
+            text = item['question'] if copy == 0 else f"{item['question']}\n[benchmark copy {copy}]"
+            workload.append({"question": text, "answer": item['answer']})
+    return workload
+
+
+def synthetic_questions(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [{"question": SYNTHETIC_TEMPLATE.format(n=n), "answer": rng.choice(ANSWER_POOL)} for n in range(1, count + 1)]
@@ -0,0 +1,100 @@
+"""
+Per-phase checkpoints for questions in progress.
+A failed question restores its agents' transcripts and continues from the last
+saved phase instead of paying for the earlier calls again.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+from schemas import FinalDecision, PeerFeedbackList, RefinedSolution, SolverResponse
+
+INITIAL = 'initial_solutions'
+PEER_FEEDBACK = 'peer_feedbacks'
+REFINED = 'refined_solutions'
+VERDICT = 'final_verdict'
+PHASES = [INITIAL, PEER_FEEDBACK, REFINED, VERDICT]
+
+
+class QuestionCheckpoint:
+    def __init__(self, path: str, question: str):
+        self.path = path
+        self.question = question
+        self.state = self._read()
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Ignoring corrupt checkpoint {self.path}")
+            return None
+        if state.get('question') != self.question:
+            print(f"Ignoring {self.path}: it is for another question")
+            return None
+        return state
+
+    @property
+    def phase(self) -> Optional[str]:
+        # The last completed phase
+        return self.state['phase'] if self.state else None
+
+    @property
+    def roles(self) -> Optional[Dict[str, Any]]:
+        return self.state['roles'] if self.state else None
+
+    def transcripts(self) -> Dict[str, List[List[str]]]:
+        return self.state['transcripts'] if self.state else {}
+
+    def results(self) -> Dict[str, Any]:
+        # The completed phases' results, shaped as the debate functions produce them. 'reviews' and
+        # 'refinements' also hold those of an unfinished phase, which a dataflow debate saves one at a time.
+        if not self.state:
+            return {}
+        output = self.state['output']
+        done = PHASES[:PHASES.index(self.state['phase']) + 1]
+        peer_feedbacks = [{"reviewer_id": pf['reviewer_id'], "feedbacks": PeerFeedbackList.model_validate(pf['feedbacks'])}
+                          for pf in output['peer_feedbacks']]
+        refined_results = [{"solver_id": res['solver_id'],
+                            "refined_response": RefinedSolution.model_validate(res['refined_response'])}
+                           for res in output['refined_solutions']]
+        results = {
+            'cascade': output.get('cascade'),
+            INITIAL: [{"solver_id": ans['solver_id'], "model": ans['model'],
+                       "response": SolverResponse.model_validate(ans['response'])}
+                      for ans in output['initial_solutions']],
+            'reviews': {pf['reviewer_id']: pf for pf in peer_feedbacks},
+            'refinements': {res['solver_id']: res for res in refined_results}
+        }
+        if PEER_FEEDBACK in done:
+            results[PEER_FEEDBACK] = peer_feedbacks
+        if REFINED in done:
+            results[REFINED] = refined_results
+        if VERDICT in done:
+            verdict = output['final_verdict']
+            results[VERDICT] = FinalDecision.model_validate(verdict) if verdict else None
+        return results
+
+    def save(self, phase: str, roles: Dict[str, Any], output: Dict[str, Any], transcripts: Dict[str, List[Any]]):
+        self.state = {"question": self.question, "phase": phase, "roles": roles, "output": output,
+                      "transcripts": transcripts}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        self.state = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Checkpoints:
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def question(self, question_id: int, question: str) -> QuestionCheckpoint:
+        return QuestionCheckpoint(os.path.join(self.directory, f"question-{question_id}.json"), question)
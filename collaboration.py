@@ -1,16 +1,121 @@
+import json
+import os
+import threading
 from agents import Agent, Solver, Judge
-from utils import distribute_roles, run_parallel_task
-from typing import List, Tuple, Optional, Any, Dict
-from conversation import CustomConversation
+from utils import distribute_roles, run_parallel_task, run_parallel_task_async
+from typing import List, Tuple, Optional, Any, Dict, Generator
+from conversation import CustomConversation, AsyncCustomConversation
+from dataflow import Graph
+from history import HistoryPolicy
+from message import get_verification_prompt
+from schemas import FinalDecision, RefinedSolution, VerificationResult
+from checkpoint import INITIAL, PEER_FEEDBACK, REFINED, VERDICT, QuestionCheckpoint
+import answer_matcher
+import tracing
+
+CASCADE_SOLVER_ID = 'cascade'
+
+class Cascade:
+    # A single fast model answers first; the full debate runs only when it is unsure or the verifier disagrees
+    def __init__(self, model: str, min_confidence: float = 0.8, verifier_model: Optional[str] = None,
+                 verify: bool = True):
+        self.model = model
+        self.min_confidence = min_confidence
+        self.verifier_model = verifier_model  # Defaults to the judge's model
+        self.verify = verify
 
 def assign_roles(models: List[Tuple[str, CustomConversation]]) -> Tuple[Optional[Judge], List[Solver]]:
     print("Selecting Roles...")
     agents = [Agent(m[0], m[1]) for m in models]
-    model_confidences = run_parallel_task(
-        lambda a: a.get_role_preferences(), 
-        agents
-    )
+    with tracing.phase(tracing.ROLE_SELECTION):
+        model_confidences = run_parallel_task(
+            lambda a: a.get_role_preferences(),
+            agents
+        )
+
+    return _build_roles(model_confidences, models)
+
+async def assign_roles_async(models: List[Tuple[str, AsyncCustomConversation]]) -> Tuple[Optional[Judge], List[Solver]]:
+    print("Selecting Roles...")
+    agents = [Agent(m[0], m[1]) for m in models]
+    with tracing.phase(tracing.ROLE_SELECTION):
+        model_confidences = await run_parallel_task_async(
+            lambda a: a.get_role_preferences_async(),
+            agents
+        )
+
+    return _build_roles(model_confidences, models)
+
+def select_roles(question: str, models: List[Tuple[str, CustomConversation]]) -> Tuple[Optional[Judge], List[Solver], List[Dict[str, Any]]]:
+    # Per-question roles: every model solves and reports its role confidence in the same call
+    agents = [Agent(m[0], m[1]) for m in models]
+    _begin_question(None, agents)
+    with tracing.phase(tracing.INITIAL_SOLVE):
+        results = run_parallel_task(
+            lambda a: a.solve_with_roles(question),
+            agents
+        )
+
+    judge, solvers = _build_roles(results, models)
+    return judge, solvers, _role_answers(results, solvers)
+
+async def select_roles_async(question: str, models: List[Tuple[str, AsyncCustomConversation]]) -> Tuple[Optional[Judge], List[Solver], List[Dict[str, Any]]]:
+    agents = [Agent(m[0], m[1]) for m in models]
+    _begin_question(None, agents)
+    with tracing.phase(tracing.INITIAL_SOLVE):
+        results = await run_parallel_task_async(
+            lambda a: a.solve_with_roles_async(question),
+            agents
+        )
+
+    judge, solvers = _build_roles(results, models)
+    return judge, solvers, _role_answers(results, solvers)
+
+def _role_answers(results: List[Dict[str, Any]], solvers: List[Solver]) -> List[Dict[str, Any]]:
+    # The solvers' initial answers; the judge's answer is dropped so it judges like any other judge
+    by_model = {r['model']: r['response'] for r in results}
+    return [{"solver_id": s.solver_id, "model": s.model_name, "response": by_model[s.model_name]} for s in solvers]
+
+def describe_roles(judge: Optional[Judge], solvers: List[Solver]) -> Dict[str, Any]:
+    return {
+        "judge": judge.model_name if judge else None,
+        "solvers": [{"solver_id": s.solver_id, "model": s.model_name} for s in solvers]
+    }
+
+def save_roles(path: str, judge: Optional[Judge], solvers: List[Solver]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(describe_roles(judge, solvers), f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_roles(path: str, models: List[Tuple[str, Any]]) -> Optional[Tuple[Optional[Judge], List[Solver]]]:
+    # Roles saved by an earlier run, bound to this run's conversations; None if missing or for other models
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        roles = json.load(f)
+    bound = bind_roles(roles, models)
+    if bound is None:
+        print(f"Ignoring {path}: it assigns roles to other models ({_role_models(roles)})")
+        return None
+
+    print(f"\nReusing roles from {path}")
+    _print_roles(*bound)
+    return bound
+
+def bind_roles(roles: Dict[str, Any], models: List[Tuple[str, Any]]) -> Optional[Tuple[Optional[Judge], List[Solver]]]:
+    # Roles in the describe_roles format, bound to the given conversations; None if they name other models
+    conversations = dict(models)
+    if sorted(_role_models(roles)) != sorted(conversations):
+        return None
+    judge = Judge(roles['judge'], conversations[roles['judge']]) if roles['judge'] else None
+    solvers = [Solver(s['model'], conversations[s['model']], s['solver_id']) for s in roles['solvers']]
+    return judge, solvers
+
+def _role_models(roles: Dict[str, Any]) -> List[str]:
+    return ([roles['judge']] if roles['judge'] else []) + [s['model'] for s in roles['solvers']]
 
+def _build_roles(model_confidences: List[Dict[str, Any]], models: List[Tuple[str, Any]]) -> Tuple[Optional[Judge], List[Solver]]:
     assignments = distribute_roles(model_confidences, models)
 
     judge = None
@@ -24,75 +129,430 @@ def assign_roles(models: List[Tuple[str, CustomConversation]]) -> Tuple[Optional
             solvers.append(Solver(model_name, data['conversation'], f'solver_{solver_id_counter}'))
             solver_id_counter += 1
 
+    _print_roles(judge, solvers)
+    return judge, solvers
+
+def _print_roles(judge: Optional[Judge], solvers: List[Solver]):
     if judge:
         print(f"\nJudge: {judge.model_name}")
     else:
         print("\nNo Judge assigned!")
 
     print(f"Solvers: {[s.solver_id + ' (' + s.model_name + ')' for s in solvers]}")
-    
-    return judge, solvers
 
-def run_collaborative_solving(question: str, judge: Optional[Judge], solvers: List[Solver]) -> Optional[Any]:
+def run_collaborative_solving(question: str, judge: Optional[Judge], solvers: List[Solver],
+                              early_exit_confidence: Optional[float] = None,
+                              cascade: Optional[Cascade] = None,
+                              initial_answers: Optional[List[Dict[str, Any]]] = None,
+                              dataflow: bool = False,
+                              checkpoint: Optional[QuestionCheckpoint] = None) -> Optional[Any]:
+    return _run_steps(_debate(question, judge, solvers, early_exit_confidence, cascade, initial_answers, dataflow,
+                              checkpoint, asynchronous=False))
+
+async def run_collaborative_solving_async(question: str, judge: Optional[Judge], solvers: List[Solver],
+                                          early_exit_confidence: Optional[float] = None,
+                                          cascade: Optional[Cascade] = None,
+                                          initial_answers: Optional[List[Dict[str, Any]]] = None,
+                                          dataflow: bool = False,
+                                          checkpoint: Optional[QuestionCheckpoint] = None) -> Optional[Any]:
+    return await _run_steps_async(_debate(question, judge, solvers, early_exit_confidence, cascade, initial_answers,
+                                          dataflow, checkpoint, asynchronous=True))
+
+class _Step:
+    # One round of debate calls: `method` on every target in parallel, within a tracing phase.
+    # The async driver calls the method's _async twin where the target has one.
+    def __init__(self, phase: str, targets: List[Any], method: str, *args: Any):
+        self.phase = phase
+        self.targets = targets
+        self.method = method
+        self.args = args
+
+def _run_steps(steps: Generator[Any, Any, Any]) -> Any:
+    reply = None
+    while True:
+        try:
+            step = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+        if isinstance(step, Graph):
+            reply = step.run()
+            continue
+        with tracing.phase(step.phase):
+            reply = run_parallel_task(lambda t: getattr(t, step.method)(*step.args), step.targets)
+
+async def _run_steps_async(steps: Generator[Any, Any, Any]) -> Any:
+    reply = None
+    while True:
+        try:
+            step = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+        if isinstance(step, Graph):
+            reply = await step.run_async()
+            continue
+        with tracing.phase(step.phase):
+            reply = await run_parallel_task_async(lambda t: _async_method(t, step.method)(*step.args), step.targets)
+
+def _async_method(target: Any, method: str) -> Any:
+    return getattr(target, method + '_async', None) or getattr(target, method)
+
+def _debate(question: str, judge: Optional[Judge], solvers: List[Solver], early_exit_confidence: Optional[float],
+            cascade: Optional[Cascade], initial_answers: Optional[List[Dict[str, Any]]], dataflow: bool,
+            checkpoint: Optional[QuestionCheckpoint], asynchronous: bool) -> Generator[Any, Any, Optional[Any]]:
+    # The phase sequence of one question. Yields a _Step (or the dataflow Graph) per round of calls, receives
+    # its results, and returns the process output.
     print(f"\nProcessing Question: {question}")
-    
+    if initial_answers is None:
+        _begin_question(judge, solvers)
+    # Phases completed by an earlier attempt, with the transcripts the later phases continue from
+    resumed = _resume(checkpoint, judge, solvers)
+    cascade_info = resumed.get('cascade')
+
+    # 1. Cascade: a single fast model answers first
+    # Initial answers given by the caller (select_roles) are reused instead of solving again
+    reused = {ans['solver_id']: ans for ans in initial_answers or []}
+    if cascade and INITIAL not in resumed:
+        fast, verifier = _cascade_agents(cascade, judge, solvers)
+        fast_answer = reused.get(fast.solver_id)
+        if fast_answer is None:
+            fast_answer = (yield _Step(tracing.CASCADE, [fast], 'initial_solve', question))[0]
+        verification = None
+        if verifier and fast_answer['response'].confidence >= cascade.min_confidence:
+            verification = (yield _Step(tracing.CASCADE, [verifier], 'send_message',
+                                        _verification_prompt(question, fast_answer), VerificationResult))[0]
+        cascade_info = _cascade_info(cascade, fast_answer, verification, verifier)
+        if cascade_info['tier'] == 1:
+            return _build_process_output([fast_answer], [], *_accept_answers([fast_answer], "Cascade"),
+                                         early_exit=False, cascade=cascade_info)
+        if fast in solvers:
+            reused[fast.solver_id] = fast_answer
+
     # 2. Initial Solutions
-    solver_answers = run_parallel_task(
-        lambda s: s.initial_solve(question),
-        solvers
-    )
+    if INITIAL in resumed:
+        solver_answers = resumed[INITIAL]
+    else:
+        new_answers = yield _Step(tracing.INITIAL_SOLVE, [s for s in solvers if s.solver_id not in reused],
+                                  'initial_solve', question)
+        solver_answers = _merge_answers(solvers, new_answers, reused)
+        _checkpoint(checkpoint, INITIAL, judge, solvers, solver_answers, cascade=cascade_info)
+    _print_initial_answers(solver_answers)
 
-    print("\n--- Initial Answers ---")
-    for ans in solver_answers:
-        print(f"{ans['solver_id']} ({ans['model']}): {ans['response'].answer}")
+    if _is_consensus(solver_answers, early_exit_confidence):
+        print("\nConsensus after the initial solutions; skipping peer review, refinement and the judge.")
+        return _build_process_output(solver_answers, [], *_accept_answers(solver_answers, "Consensus"),
+                                     early_exit=True, cascade=cascade_info)
+
+    if dataflow:
+        progress = _GraphProgress(checkpoint, judge, solvers, solver_answers, cascade_info, resumed) if checkpoint else None
+        graph, reviews, refinements = _debate_graph(question, judge, solvers, solver_answers, asynchronous, progress)
+        results = yield graph
+        return _build_process_output(solver_answers, *_dataflow_outcome(results, reviews, refinements),
+                                     early_exit=False, cascade=cascade_info)
 
     # 3. Peer Feedback Phase
-    print("\nGenerating Peer Feedbacks...")
+    if PEER_FEEDBACK in resumed:
+        peer_feedbacks = resumed[PEER_FEEDBACK]
+    else:
+        print("\nGenerating Peer Feedbacks...")
+        peer_feedbacks = yield _Step(tracing.PEER_REVIEW, solvers, 'peer_review', solver_answers)
+        _checkpoint(checkpoint, PEER_FEEDBACK, judge, solvers, solver_answers, peer_feedbacks, cascade=cascade_info)
+    _print_peer_feedbacks(peer_feedbacks)
 
-    peer_feedbacks = run_parallel_task(
-        lambda s: s.peer_review(solver_answers),
-        solvers
+    # 4. Refinement Phase
+    if REFINED in resumed:
+        refined_results = resumed[REFINED]
+    else:
+        print("\nRefining Solutions...")
+        refined_results = yield _Step(tracing.REFINEMENT, solvers, 'refine_solution', peer_feedbacks)
+        _checkpoint(checkpoint, REFINED, judge, solvers, solver_answers, peer_feedbacks, refined_results,
+                    cascade=cascade_info)
+    _print_refined_solutions(refined_results)
+
+    # 5. Judge Decision Phase
+    final_verdict = resumed.get(VERDICT)
+    if VERDICT in resumed:
+        if final_verdict:
+            _print_verdict(final_verdict)
+    elif judge:
+        print("\nJudge is deciding...")
+        final_verdict = (yield _Step(tracing.JUDGE, [judge], 'decide', question, solver_answers, peer_feedbacks,
+                                     refined_results))[0]
+        _checkpoint(checkpoint, VERDICT, judge, solvers, solver_answers, peer_feedbacks, refined_results,
+                    final_verdict, cascade=cascade_info)
+        _print_verdict(final_verdict)
+    else:
+        print("\nJudge decision skipped due to missing judge.")
+
+    return _build_process_output(solver_answers, peer_feedbacks, refined_results, final_verdict,
+                                 early_exit=False, cascade=cascade_info)
+
+def _debate_graph(question: str, judge: Optional[Judge], solvers: List[Solver], solver_answers: List[Dict[str, Any]],
+                  asynchronous: bool, progress: Optional['_GraphProgress'] = None) -> Tuple[Graph, List[Any], List[Any]]:
+    # Peer review, refinement and the judge as a dependency graph. Reviews run on a branch of each solver's
+    # conversation, so a solver refines as soon as the feedback targeting it (the other solvers' reviews)
+    # exists instead of also waiting for its own review of them; the judge waits for everything.
+    # With progress, nodes finished by an earlier attempt return their checkpointed result.
+    suffix = '_async' if asynchronous else ''
+    graph = Graph()
+    reviews = []
+    for s in solvers:
+        reviewer = Solver(s.model_name, s.conversation.branch(), s.solver_id)
+        key = (tracing.PEER_REVIEW, s.solver_id)
+        reviews.append(graph.add(key, _node(
+            tracing.PEER_REVIEW, lambda inputs, r=reviewer: getattr(r, 'peer_review' + suffix)(solver_answers),
+            asynchronous, key, progress
+        )))
+
+    refinements = []
+    for s in solvers:
+        key = (tracing.REFINEMENT, s.solver_id)
+        refinements.append(graph.add(key, _node(
+            tracing.REFINEMENT, lambda inputs, s=s: getattr(s, 'refine_solution' + suffix)(list(inputs.values())),
+            asynchronous, key, progress
+        ), [review for review in reviews if review[1] != s.solver_id]))
+
+    if judge:
+        graph.add(tracing.JUDGE, _node(tracing.JUDGE, lambda inputs: getattr(judge, 'decide' + suffix)(
+            question, solver_answers, [inputs[k] for k in reviews], [inputs[k] for k in refinements]
+        ), asynchronous, tracing.JUDGE, progress), reviews + refinements)
+    calls = len(graph) - (progress.finished() if progress else 0)
+    print(f"\nRunning peer review, refinement and the judge as a dependency graph ({calls} calls)...")
+    return graph, reviews, refinements
+
+def _node(phase: str, call: Any, asynchronous: bool, key: Any = None, progress: Optional['_GraphProgress'] = None) -> Any:
+    if asynchronous:
+        async def run_async(inputs):
+            if progress and progress.has(key):
+                return progress.get(key)
+            with tracing.phase(phase):
+                result = await call(inputs)
+            if progress:
+                progress.done(key, result)
+            return result
+        return run_async
+
+    def run(inputs):
+        if progress and progress.has(key):
+            return progress.get(key)
+        with tracing.phase(phase):
+            result = call(inputs)
+        if progress:
+            progress.done(key, result)
+        return result
+    return run
+
+class _GraphProgress:
+    # Node results of a dataflow debate, checkpointed as each node finishes. Reviews run on branches, so a
+    # solver's saved transcript is updated when its refinement finishes and always matches the saved results.
+    def __init__(self, checkpoint: QuestionCheckpoint, judge: Optional[Judge], solvers: List[Solver],
+                 solver_answers: List[Dict[str, Any]], cascade_info: Optional[Dict[str, Any]], resumed: Dict[str, Any]):
+        self.checkpoint = checkpoint
+        self.judge = judge
+        self.solvers = solvers
+        self.solver_answers = solver_answers
+        self.cascade_info = cascade_info
+        self.results: Dict[Any, Any] = {(tracing.PEER_REVIEW, sid): pf for sid, pf in resumed.get('reviews', {}).items()}
+        self.results.update({(tracing.REFINEMENT, sid): res for sid, res in resumed.get('refinements', {}).items()})
+        if resumed.get(VERDICT):
+            self.results[tracing.JUDGE] = resumed[VERDICT]
+        self.agents = _agents_by_key(judge, solvers)
+        self.transcripts = {key: list(agent.conversation.turns) for key, agent in self.agents.items()}
+        self._lock = threading.Lock()  # Graph.run finishes nodes on several threads
+
+    def has(self, key: Any) -> bool:
+        return key in self.results
+
+    def get(self, key: Any) -> Any:
+        return self.results[key]
+
+    def finished(self) -> int:
+        return len(self.results)
+
+    def done(self, key: Any, result: Any):
+        with self._lock:
+            self.results[key] = result
+            agent_key = 'judge' if key == tracing.JUDGE else key[1]
+            if key == tracing.JUDGE or key[0] == tracing.REFINEMENT:
+                self.transcripts[agent_key] = list(self.agents[agent_key].conversation.turns)
+
+            ids = [s.solver_id for s in self.solvers]
+            peer_feedbacks = [self.results[(tracing.PEER_REVIEW, sid)] for sid in ids
+                              if (tracing.PEER_REVIEW, sid) in self.results]
+            refined_results = [self.results[(tracing.REFINEMENT, sid)] for sid in ids
+                               if (tracing.REFINEMENT, sid) in self.results]
+            phase = INITIAL
+            if len(peer_feedbacks) == len(ids):
+                phase = PEER_FEEDBACK
+                if len(refined_results) == len(ids):
+                    phase = VERDICT if tracing.JUDGE in self.results else REFINED
+            _checkpoint(self.checkpoint, phase, self.judge, self.solvers, self.solver_answers, peer_feedbacks,
+                        refined_results, self.results.get(tracing.JUDGE), self.cascade_info, self.transcripts)
+
+def _dataflow_outcome(results: Dict[Any, Any], reviews: List[Any], refinements: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Optional[FinalDecision]]:
+    peer_feedbacks = [results[key] for key in reviews]
+    refined_results = [results[key] for key in refinements]
+    final_verdict = results.get(tracing.JUDGE)
+    _print_peer_feedbacks(peer_feedbacks)
+    _print_refined_solutions(refined_results)
+    if final_verdict:
+        _print_verdict(final_verdict)
+    else:
+        print("\nJudge decision skipped due to missing judge.")
+    return peer_feedbacks, refined_results, final_verdict
+
+def _resume(checkpoint: Optional[QuestionCheckpoint], judge: Optional[Judge], solvers: List[Solver]) -> Dict[str, Any]:
+    if checkpoint is None or checkpoint.phase is None:
+        return {}
+    if checkpoint.roles != describe_roles(judge, solvers):
+        print(f"Ignoring {checkpoint.path}: it was made with other roles")
+        return {}
+    transcripts = checkpoint.transcripts()
+    for key, agent in _agents_by_key(judge, solvers).items():
+        if key in transcripts:
+            agent.conversation.restore_turns(transcripts[key])
+    print(f"\nResuming from the checkpoint after {checkpoint.phase}")
+    return checkpoint.results()
+
+def _checkpoint(checkpoint: Optional[QuestionCheckpoint], phase: str, judge: Optional[Judge], solvers: List[Solver],
+                solver_answers: List[Dict[str, Any]], peer_feedbacks: Optional[List[Dict[str, Any]]] = None,
+                refined_results: Optional[List[Dict[str, Any]]] = None, final_verdict: Any = None,
+                cascade: Optional[Dict[str, Any]] = None, transcripts: Optional[Dict[str, List[Any]]] = None):
+    if checkpoint is None:
+        return
+    output = _build_process_output(solver_answers, peer_feedbacks or [], refined_results or [], final_verdict,
+                                   cascade=cascade)
+    if transcripts is None:
+        transcripts = {key: agent.conversation.turns for key, agent in _agents_by_key(judge, solvers).items()}
+    checkpoint.save(phase, describe_roles(judge, solvers), output, transcripts)
+
+def _agents_by_key(judge: Optional[Judge], solvers: List[Solver]) -> Dict[str, Agent]:
+    agents: Dict[str, Agent] = {s.solver_id: s for s in solvers}
+    if judge:
+        agents['judge'] = judge
+    return agents
+
+def _cascade_agents(cascade: Cascade, judge: Optional[Judge], solvers: List[Solver]) -> Tuple[Solver, Optional[Any]]:
+    # The fast model answers as its own solver when it is one; otherwise from a fork of the judge's
+    # conversation, so the judge's own transcript stays untouched
+    agents = ([judge] if judge else []) + solvers
+    fast = next((s for s in solvers if s.model_name == cascade.model), None)
+    if fast is None:
+        owner = next((a for a in agents if a.model_name == cascade.model), None)
+        if owner is None:
+            raise ValueError(f"Cascade model {cascade.model} is not one of the debate models")
+        fast = Solver(owner.model_name, owner.conversation.fork(), CASCADE_SOLVER_ID)
+
+    verifier = None
+    verifier_model = cascade.verifier_model or (judge.model_name if judge else None)
+    if cascade.verify and verifier_model:
+        source = next((a.conversation for a in agents if a.model_name == verifier_model), None)
+        if source is None:
+            raise ValueError(f"Cascade verifier {verifier_model} is not one of the debate models")
+        verifier = type(source)(source.api_provider, source.model, HistoryPolicy.stateless())
+    return fast, verifier
+
+def _verification_prompt(question: str, fast_answer: Dict[str, Any]) -> str:
+    return get_verification_prompt(question, fast_answer['response'].answer, fast_answer['response'].explanation)
+
+def _cascade_info(cascade: Cascade, fast_answer: Dict[str, Any], verification: Optional[VerificationResult],
+                  verifier: Optional[Any]) -> Dict[str, Any]:
+    confidence = fast_answer['response'].confidence
+    if confidence < cascade.min_confidence:
+        escalation = "low_confidence"
+    elif verification is not None and not verification.agrees:
+        escalation = "verifier_disagreed"
+    else:
+        escalation = None
+    print(f"\nCascade {fast_answer['model']}: {fast_answer['response'].answer} (confidence {confidence})"
+          + (f", verifier {'agrees' if verification.agrees else 'disagrees'}" if verification else "")
+          + (f" -> full debate ({escalation})" if escalation else " -> accepted"))
+    return {
+        "tier": 2 if escalation else 1,
+        "model": fast_answer['model'],
+        "answer": fast_answer['response'].answer,
+        "confidence": confidence,
+        "verifier": verifier.model if verifier else None,
+        "verifier_agrees": verification.agrees if verification else None,
+        "escalation": escalation
+    }
+
+def _merge_answers(solvers: List[Solver], new_answers: List[Dict[str, Any]],
+                   reused: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Initial answers in solver order, whether just computed or reused from the cascade
+    by_id = dict(reused)
+    by_id.update({ans['solver_id']: ans for ans in new_answers})
+    return [by_id[s.solver_id] for s in solvers]
+
+def _is_consensus(solver_answers: List[Dict[str, Any]], min_confidence: Optional[float]) -> bool:
+    # When every solver independently gives the same answer with enough confidence, peer review,
+    # refinement and the judge cannot change the outcome
+    if min_confidence is None or len(solver_answers) < 2:
+        return False
+    answers = {answer_matcher.normalize(ans['response'].answer) for ans in solver_answers}
+    if len(answers) != 1 or answers.pop() in answer_matcher.NO_ANSWER:
+        return False
+    return all(ans['response'].confidence >= min_confidence for ans in solver_answers)
+
+def _accept_answers(solver_answers: List[Dict[str, Any]], reason: str) -> Tuple[List[Dict[str, Any]], FinalDecision]:
+    # Carry the initial answers forward as the refined ones and let the most confident solver win
+    refined_results = [{
+        "solver_id": ans['solver_id'],
+        "refined_response": RefinedSolution(
+            changes_made=[],
+            refined_solution=ans['response'].explanation,
+            refined_answer=ans['response'].answer,
+            confidence=ans['response'].confidence
+        )
+    } for ans in solver_answers]
+    best = max(solver_answers, key=lambda ans: ans['response'].confidence)
+    final_verdict = FinalDecision(
+        winner=best['solver_id'],
+        winning_answer=best['response'].answer,
+        confidence=min(ans['response'].confidence for ans in solver_answers),
+        reasoning=f"{reason}: accepted '{best['response'].answer}' from {len(solver_answers)} solver(s) "
+                  f"without peer review, refinement or judging."
     )
+    _print_verdict(final_verdict)
+    return refined_results, final_verdict
+
+def _begin_question(judge: Optional[Judge], solvers: List[Agent]):
+    # Let each conversation's history policy drop context from earlier questions
+    for agent in ([judge] if judge else []) + solvers:
+        agent.conversation.begin_question()
+
+def _print_initial_answers(solver_answers: List[Dict[str, Any]]):
+    print("\n--- Initial Answers ---")
+    for ans in solver_answers:
+        print(f"{ans['solver_id']} ({ans['model']}): {ans['response'].answer}")
 
+def _print_peer_feedbacks(peer_feedbacks: List[Dict[str, Any]]):
     print("\n--- Peer Feedback Summaries ---")
     for pf in peer_feedbacks:
         for feedback in pf['feedbacks'].feedbacks:
             print(f"{pf['reviewer_id']} -> {feedback.solution_id} | Assessment: {feedback.overall_assessment}")
 
-    # 4. Refinement Phase
-    print("\nRefining Solutions...")
-
-    refined_results = run_parallel_task(
-        lambda s: s.refine_solution(peer_feedbacks),
-        solvers
-    )
-
+def _print_refined_solutions(refined_results: List[Dict[str, Any]]):
     print("\n--- Refined Solutions ---")
     for res in refined_results:
         rr = res['refined_response']
         print(f"{res['solver_id']} | Confidence: {rr.confidence} | Answer: {rr.refined_answer}")
         print(f"Accepted Changes: {sum(1 for c in rr.changes_made if c.accepted)}/{len(rr.changes_made)}")
 
-    # 5. Judge Decision Phase
-    # 5. Judge Decision Phase
-    final_verdict = None
-    if judge:
-        print("\nJudge is deciding...")
-        final_verdict = judge.decide(question, solver_answers, peer_feedbacks, refined_results)
-
-        print("\n" + "="*40)
-        print("FINAL VERDICT")
-        print("="*40)
-        print(f"Winner: {final_verdict.winner}")
-        print(f"Winning Answer: {final_verdict.winning_answer}")
-        print(f"Confidence: {final_verdict.confidence}")
-        print(f"Reasoning: {final_verdict.reasoning}")
-        print("="*40)
-    else:
-        print("\nJudge decision skipped due to missing judge.")
+def _print_verdict(final_verdict: Any):
+    print("\n" + "="*40)
+    print("FINAL VERDICT")
+    print("="*40)
+    print(f"Winner: {final_verdict.winner}")
+    print(f"Winning Answer: {final_verdict.winning_answer}")
+    print(f"Confidence: {final_verdict.confidence}")
+    print(f"Reasoning: {final_verdict.reasoning}")
+    print("="*40)
 
+def _build_process_output(solver_answers: List[Dict[str, Any]], peer_feedbacks: List[Dict[str, Any]],
+                          refined_results: List[Dict[str, Any]], final_verdict: Any,
+                          early_exit: bool = False, cascade: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     # Prepare detailed output
-    return {
+    output = {
         "initial_solutions": [
             {
                 "solver_id": ans['solver_id'],
@@ -112,5 +572,11 @@ def run_collaborative_solving(question: str, judge: Optional[Judge], solvers: Li
                 "refined_response": res['refined_response'].model_dump()
             } for res in refined_results
         ],
-        "final_verdict": final_verdict.model_dump() if final_verdict else None
+        "final_verdict": final_verdict.model_dump() if final_verdict else None,
+        # True when the debate stopped after the initial solutions because the solvers agreed
+        "early_exit": early_exit
     }
+    if cascade is not None:
+        # Tier 1: the fast model's answer was accepted; tier 2: the full debate ran
+        output["cascade"] = cascade
+    return output
@@ -1,9 +1,19 @@
-from google import genai
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+"""
+Provider clients, kept for code that imports them from here. Each one is built
+by the lazy registry in providers.py on first access, so importing this module
+costs nothing and needs no API keys.
+"""
 
-load_dotenv()
+import providers
 
-openai_client = OpenAI()
-gemini_client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
\ No newline at end of file
+_CLIENTS = {
+    'openai_client': ('OpenAI', False),
+    'async_openai_client': ('OpenAI', True),
+    'gemini_client': ('Gemini', False),
+}
+
+
+def __getattr__(name):
+    if name in _CLIENTS:
+        return providers.get_client(*_CLIENTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
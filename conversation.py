@@ -1,69 +1,464 @@
-from typing import Literal, Optional, Any
+from typing import Literal, Optional, Any, Dict, List, Tuple
+import asyncio
+from contextlib import asynccontextmanager
+import random
 import time
-from constants import openai_client, gemini_client
-from google import genai
+import accounting
+import providers
+import tracing
+from history import HistoryPolicy, Turn
+from response_cache import get_cache, history_fingerprint
+from simulated_provider import SimulatedBackend
+from rate_limiter import get_limiter, retry_after_seconds, estimate_tokens, EXPECTED_OUTPUT_TOKENS
 
-class CustomConversation:
-    def __init__(self, api_provider: Literal['Gemini', 'OpenAI'], model: str):
+MAX_RETRIES = 15  # Increased from 5 to 15
+BASE_DELAY = 4    # Increased base delay
+MAX_DELAY = 60    # The rate limiter paces requests, so backoff only covers quota surprises
+OPENAI_ITEMS_PER_REQUEST = 20  # Conversations API limit when seeding items
+PROMPT_CACHE_KEY = 'www-debate'  # Prefix of the OpenAI prompt_cache_key, one per prompt template
+
+
+def _is_rate_limit_error(e: Exception) -> bool:
+    error_msg = str(e).lower()
+    return "rate limit" in error_msg or "429" in error_msg
+
+
+def _backoff_delay(retries: int) -> float:
+    # Exponential backoff with jitter
+    return min(BASE_DELAY * (2 ** retries), MAX_DELAY) + random.uniform(0, 1)
+
+
+def _gemini_config(structured_output: Any) -> Any:
+    return providers.genai_types().GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=structured_output
+    )
+
+
+def _gemini_history(turns: List[Turn]) -> List[Any]:
+    types = providers.genai_types()
+    history = []
+    for user_text, model_text in turns:
+        history.append(types.Content(role='user', parts=[types.Part(text=user_text)]))
+        history.append(types.Content(role='model', parts=[types.Part(text=model_text)]))
+    return history
+
+
+def _openai_items(turns: List[Turn]) -> List[Dict[str, Any]]:
+    items = []
+    for user_text, model_text in turns:
+        items.append({"type": "message", "role": "user", "content": user_text})
+        items.append({"type": "message", "role": "assistant", "content": model_text})
+    return items
+
+
+def _gemini_headers(response: Any) -> Any:
+    http_response = getattr(response, 'sdk_http_response', None)
+    return getattr(http_response, 'headers', None)
+
+
+def _response_text(response: Any) -> str:
+    text = getattr(response, 'output_text', None)
+    if text is None:
+        text = getattr(response, 'text', None)
+    return text or ""
+
+
+def _token_usage(response: Any) -> Optional[Tuple[int, int]]:
+    # (input tokens, output tokens) as reported by the provider, if any
+    usage = getattr(response, 'usage', None)
+    if usage is not None and getattr(usage, 'input_tokens', None) is not None:
+        return usage.input_tokens, usage.output_tokens or 0
+
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is not None and metadata.prompt_token_count is not None:
+        output_tokens = (metadata.candidates_token_count or 0) + (metadata.thoughts_token_count or 0)
+        return metadata.prompt_token_count, output_tokens
+    return None
+
+
+def _cached_tokens(response: Any) -> Optional[int]:
+    # Prompt tokens the provider served from its own prompt cache
+    details = getattr(getattr(response, 'usage', None), 'input_tokens_details', None)
+    if details is not None:
+        return getattr(details, 'cached_tokens', None)
+    metadata = getattr(response, 'usage_metadata', None)
+    return getattr(metadata, 'cached_content_token_count', None) if metadata is not None else None
+
+
+class _ConversationBase:
+    # Bookkeeping shared by the blocking and asyncio conversations: the local
+    # transcript and history policy, and the proactive rate limiter.
+    #
+    # The transcript (self.turns) is the source of truth for what the provider sees.
+    # Whenever the policy drops turns the provider session is marked stale and
+    # rebuilt from the transcript before the next call: Gemini chats are recreated
+    # locally with the kept history, and OpenAI requests carry the kept turns as
+    # input items instead of referencing an ever-growing server-side conversation.
+
+    def __init__(self, api_provider: Literal['Gemini', 'OpenAI', 'Simulated'], model: str,
+                 history_policy: Optional[HistoryPolicy] = None, turns: Optional[List[Turn]] = None):
         self.api_provider = api_provider
         self.model = model
+        self.history_policy = history_policy or HistoryPolicy.full()
+        self.turns: List[Turn] = list(turns or [])
+        self.question_turns: List[Turn] = []  # Turns added by this conversation itself, not inherited by a fork
         self.conversation: Any = None
-        self._start_conversation()
+        self._session_stale = True
+        self._pinned_turns: Optional[int] = None
+        self.limiter = get_limiter(self.api_provider, self.model)
+        self._context_tokens = self._transcript_tokens()
+
+    @property
+    def _server_side_history(self) -> bool:
+        # Only an unbounded OpenAI conversation keeps using the server-side thread
+        return self.api_provider == 'OpenAI' and self.history_policy.mode == HistoryPolicy.FULL
+
+    def begin_question(self):
+        # Turns made before the first question (role selection) are the pinned preamble
+        if self._pinned_turns is None:
+            self._pinned_turns = len(self.turns)
+        self._set_turns(self.history_policy.on_question_start(self.turns, self._pinned_turns))
+
+    def _fork_turns(self, history_policy: Optional[HistoryPolicy] = None) -> List[Turn]:
+        pinned = self._pinned_turns if self._pinned_turns is not None else len(self.turns)
+        return (history_policy or self.history_policy).on_fork(self.turns, pinned)
+
+    def branch(self):
+        # Continues from the whole current transcript without adding to it, for a side call such as a peer review
+        branch = type(self)(self.api_provider, self.model, self.history_policy, self.turns)
+        branch._pinned_turns = self._pinned_turns
+        return branch
+
+    def absorb(self, fork: '_ConversationBase'):
+        # Takes over a finished question's turns from a fork, for policies that keep history across questions
+        if self._pinned_turns is None:
+            self._pinned_turns = len(self.turns)
+        self._set_turns(self.history_policy.on_absorb(self.turns, fork.question_turns))
+
+    def restore_turns(self, turns: List[Turn]):
+        # Replaces the transcript, e.g. from a checkpoint; the provider session is rebuilt from it before the next call
+        turns = [tuple(turn) for turn in turns]
+        inherited = 0
+        while inherited < min(len(turns), len(self.turns)) and turns[inherited] == self.turns[inherited]:
+            inherited += 1
+        self.question_turns = turns[inherited:]
+        self.turns = turns
+        self._context_tokens = self._transcript_tokens()
+        self._session_stale = True
+
+    def _set_turns(self, turns: List[Turn]):
+        if turns == self.turns:
+            return
+        self.turns = list(turns)
+        if self._pinned_turns is not None:
+            self._pinned_turns = min(self._pinned_turns, len(self.turns))
+        self._context_tokens = self._transcript_tokens()
+        self._session_stale = True
+
+    def _transcript_tokens(self) -> int:
+        return sum(estimate_tokens(user_text) + estimate_tokens(model_text) for user_text, model_text in self.turns)
+
+    def _openai_request(self, message: str, structured_output: Optional[Any] = None) -> Dict[str, Any]:
+        # Requests built from the same template share a cache key, so OpenAI routes them to the
+        # same prompt cache and their static prefix is served as cached tokens
+        new_input = [{"role": "user", "content": message}]
+        request = {"model": self.model,
+                   "prompt_cache_key": f"{PROMPT_CACHE_KEY}:{structured_output.__name__ if structured_output else 'text'}"}
+        if self._server_side_history:
+            return {**request, "input": new_input, "conversation": self.conversation.id}
+        return {**request, "input": _openai_items(self.turns) + new_input}
+
+    def _reserve(self, message: str) -> Tuple[int, float]:
+        # The whole context is resent with every call, so reserve for it as well as the new message
+        estimated = self._context_tokens + estimate_tokens(message) + EXPECTED_OUTPUT_TOKENS
+        return estimated, self.limiter.reserve(estimated)
+
+    def _cache_lookup(self, message: str, structured_output: Optional[Any]) -> Tuple[Optional[str], Any]:
+        # Only validated structured payloads are cached; the key covers the history the model would see
+        cache = get_cache()
+        if cache is None or not structured_output:
+            return None, None
+        key = cache.make_key(self.api_provider, self.model, structured_output, message, history_fingerprint(self.turns))
+        return key, cache.get(key, structured_output)
+
+    def _record_cached(self, message: str, result: Any):
+        self.turns.append((message, result.model_dump_json()))
+        self.question_turns.append(self.turns[-1])
+        self._context_tokens = self._transcript_tokens()
+        # The provider never saw this turn, so rebuild its session from the transcript before the next live call
+        self._session_stale = True
+
+    def _cache_store(self, key: Optional[str], structured_output: Optional[Any], result: Any):
+        cache = get_cache()
+        if key is not None and cache is not None:
+            cache.put(key, structured_output, result)
+
+    def _record_response(self, span: tracing.Span, message: str, estimated: int, response: Any, headers: Any,
+                         structured_output: Optional[Any], result: Any):
+        # Structured turns are stored canonically so cached and live runs fingerprint the same history
+        self.turns.append((message, result.model_dump_json() if structured_output else _response_text(response)))
+        self.question_turns.append(self.turns[-1])
+        self.limiter.update_from_headers(headers)
+        usage = _token_usage(response)
+        cached_tokens = _cached_tokens(response)
+        if usage is None:
+            self.limiter.reconcile(estimated, None)
+            self._context_tokens += estimate_tokens(message) + EXPECTED_OUTPUT_TOKENS
+            # Without provider usage, account for what we sent and received
+            accounting.get_ledger().record(self.model, estimated - EXPECTED_OUTPUT_TOKENS,
+                                           estimate_tokens(self.turns[-1][1]))
+        else:
+            self.limiter.reconcile(estimated, sum(usage))
+            self._context_tokens = sum(usage)
+            accounting.get_ledger().record(self.model, usage[0], usage[1], cached_tokens)
+        span.record_response(len(self.turns[-1][1]), usage, cached_tokens)
+
+    def _on_rate_limit(self, span: tracing.Span, e: Exception, retries: int, estimated: int) -> float:
+        self.limiter.release(estimated)
+        self.limiter.penalize(retry_after_seconds(e))
+        wait_time = _backoff_delay(retries)
+        print(f"Rate limit hit for {self.model}. Retrying in {wait_time:.1f}s...")
+        span.retries += 1
+        span.backoff_seconds += wait_time
+        return wait_time
+
+
+class CustomConversation(_ConversationBase):
+    def fork(self, history_policy: Optional[HistoryPolicy] = None) -> 'CustomConversation':
+        # Same provider, model and (unless overridden) policy, starting from the shared pre-question context
+        return CustomConversation(self.api_provider, self.model, history_policy or self.history_policy,
+                                  self._fork_turns(history_policy))
 
     def _start_conversation(self):
+        if self.api_provider == 'Simulated':
+            # The simulated backend reads the transcript directly, so it survives history rebuilds
+            self.conversation = self.conversation or SimulatedBackend(self.model)
+        elif self.api_provider == 'Gemini':
+            self.conversation = providers.get_client('Gemini').chats.create(model=self.model, history=_gemini_history(self.turns))
+        elif self._server_side_history:
+            items = _openai_items(self.turns)
+            self.conversation = providers.get_client('OpenAI').conversations.create(items=items[:OPENAI_ITEMS_PER_REQUEST])
+            for start in range(OPENAI_ITEMS_PER_REQUEST, len(items), OPENAI_ITEMS_PER_REQUEST):
+                providers.get_client('OpenAI').conversations.items.create(
+                    self.conversation.id, items=items[start:start + OPENAI_ITEMS_PER_REQUEST]
+                )
+        self._session_stale = False
+
+    def send_message(self, message: str, structured_output: Optional[Any] = None) -> Any:
+        with tracing.get_tracer().span(self.api_provider, self.model, message) as span:
+            self._set_turns(self.history_policy.before_send(self.turns))
+            cache_key, cached = self._cache_lookup(message, structured_output)
+            if cached is not None:
+                span.cache_hit = True
+                self._record_cached(message, cached)
+                return cached
+
+            if self._session_stale:
+                self._start_conversation()
+
+            retries = 0
+
+            while retries < MAX_RETRIES:
+                accounting.get_ledger().check()
+                estimated, wait_time = self._reserve(message)
+                if wait_time > 0:
+                    span.rate_limit_wait += wait_time
+                    time.sleep(wait_time)
+
+                try:
+                    span.attempts += 1
+                    result, response, headers = self._send_once(message, structured_output)
+                except Exception as e:
+                    if _is_rate_limit_error(e):
+                        time.sleep(self._on_rate_limit(span, e, retries, estimated))
+                        retries += 1
+                        continue
+                    raise e
+
+                self._record_response(span, message, estimated, response, headers, structured_output, result)
+                self._cache_store(cache_key, structured_output, result)
+                return result
+
+            raise Exception(f"Max retries exceeded for {self.model} after {MAX_RETRIES} attempts.")
+
+    def _send_once(self, message: str, structured_output: Optional[Any]) -> Tuple[Any, Any, Any]:
+        # Returns (result, raw provider response, HTTP headers)
+        if self.api_provider == 'Simulated':
+            latency, error = self.conversation.plan_call(message, self.turns)
+            time.sleep(latency)
+            if error:
+                raise error
+            result, response = self.conversation.respond(message, structured_output, self.turns)
+            return result, response, None
+
         if self.api_provider == 'Gemini':
-            self.conversation = gemini_client.chats.create(model=self.model)
+            if structured_output:
+                response = self.conversation.send_message(
+                    message,
+                    config=_gemini_config(structured_output)
+                )
+                return structured_output.model_validate_json(response.text), response, _gemini_headers(response)
+            response = self.conversation.send_message(message)
+            return response, response, _gemini_headers(response)
+
+        if structured_output:
+            raw = providers.get_client('OpenAI').responses.with_raw_response.parse(
+                **self._openai_request(message, structured_output),
+                text_format=structured_output
+            )
+            response = raw.parse()
+            return response.output_parsed, response, raw.headers
+        raw = providers.get_client('OpenAI').responses.with_raw_response.create(**self._openai_request(message))
+        response = raw.parse()
+        return response, response, raw.headers
+
+
+class AsyncCustomConversation(_ConversationBase):
+    """
+    asyncio counterpart of CustomConversation built on the providers' async clients.
+    Calls on one conversation are serialized so the chat history stays ordered,
+    while the number of requests in flight is bounded by a shared global semaphore
+    and, optionally, by a per-model semaphore.
+    """
+
+    max_concurrency = 32
+    model_limits: Dict[str, int] = {}
+    _semaphores: Dict[Optional[str], asyncio.Semaphore] = {}
+    _semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __init__(self, api_provider: Literal['Gemini', 'OpenAI', 'Simulated'], model: str,
+                 history_policy: Optional[HistoryPolicy] = None, turns: Optional[List[Turn]] = None):
+        super().__init__(api_provider, model, history_policy, turns)
+        self._lock: Optional[asyncio.Lock] = None
+
+    def fork(self, history_policy: Optional[HistoryPolicy] = None) -> 'AsyncCustomConversation':
+        # Same provider, model and (unless overridden) policy, starting from the shared pre-question context
+        return AsyncCustomConversation(self.api_provider, self.model, history_policy or self.history_policy,
+                                       self._fork_turns(history_policy))
+
+    @classmethod
+    def set_concurrency_limit(cls, max_concurrency: int, model_limits: Optional[Dict[str, int]] = None):
+        cls.max_concurrency = max_concurrency
+        cls.model_limits = dict(model_limits or {})
+        cls._semaphores = {}
+
+    @classmethod
+    def _get_semaphore(cls, model: Optional[str] = None) -> Optional[asyncio.Semaphore]:
+        # A semaphore is bound to the loop it is first used on, so build new ones per asyncio.run()
+        loop = asyncio.get_running_loop()
+        if cls._semaphore_loop is not loop:
+            cls._semaphores = {}
+            cls._semaphore_loop = loop
+
+        if model is not None and model not in cls.model_limits:
+            return None
+        if model not in cls._semaphores:
+            limit = cls.max_concurrency if model is None else cls.model_limits[model]
+            cls._semaphores[model] = asyncio.Semaphore(limit)
+        return cls._semaphores[model]
+
+    @asynccontextmanager
+    async def _request_slot(self):
+        # Wait on the per-model limit first so a throttled model does not hold global slots
+        model_semaphore = self._get_semaphore(self.model)
+        if model_semaphore is None:
+            async with self._get_semaphore():
+                yield
         else:
-            self.conversation = openai_client.conversations.create()
+            async with model_semaphore, self._get_semaphore():
+                yield
 
-    def send_message(self, message: str, structured_output: Optional[Any] = None) -> Any:
-        import random
+    async def _start_conversation(self):
+        if self.api_provider == 'Simulated':
+            # The simulated backend reads the transcript directly, so it survives history rebuilds
+            self.conversation = self.conversation or SimulatedBackend(self.model)
+        elif self.api_provider == 'Gemini':
+            self.conversation = providers.get_client('Gemini', asynchronous=True).chats.create(model=self.model, history=_gemini_history(self.turns))
+        elif self._server_side_history:
+            items = _openai_items(self.turns)
+            self.conversation = await providers.get_client('OpenAI', asynchronous=True).conversations.create(items=items[:OPENAI_ITEMS_PER_REQUEST])
+            for start in range(OPENAI_ITEMS_PER_REQUEST, len(items), OPENAI_ITEMS_PER_REQUEST):
+                await providers.get_client('OpenAI', asynchronous=True).conversations.items.create(
+                    self.conversation.id, items=items[start:start + OPENAI_ITEMS_PER_REQUEST]
+                )
+        self._session_stale = False
+
+    async def send_message(self, message: str, structured_output: Optional[Any] = None) -> Any:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        with tracing.get_tracer().span(self.api_provider, self.model, message) as span:
+            async with self._lock:
+                self._set_turns(self.history_policy.before_send(self.turns))
+                cache_key, cached = self._cache_lookup(message, structured_output)
+                if cached is not None:
+                    span.cache_hit = True
+                    self._record_cached(message, cached)
+                    return cached
+
+                if self._session_stale:
+                    await self._start_conversation()
+                result = await self._send_with_retries(span, message, structured_output)
+                self._cache_store(cache_key, structured_output, result)
+                return result
+
+    async def _send_with_retries(self, span: tracing.Span, message: str, structured_output: Optional[Any]) -> Any:
         retries = 0
-        max_retries = 15  # Increased from 5 to 15
-        base_delay = 4    # Increased base delay
 
-        while retries < max_retries:
-            try:
-                if self.api_provider == 'Gemini':
-                    if structured_output:
-                        response = self.conversation.send_message(
-                            message,
-                            config=genai.types.GenerateContentConfig(
-                                response_mime_type="application/json",
-                                response_schema=structured_output
-                            )
-                        )
-                        return structured_output.model_validate_json(response.text)
-                    else:
-                        response = self.conversation.send_message(message)
-                    return response
-                else:
-                    if structured_output:
-                        response = openai_client.responses.parse(
-                            model=self.model,
-                            input=[{"role": "user", "content": message}],
-                            conversation=self.conversation.id,
-                            text_format=structured_output
-                        )
-                        return response.output_parsed
-                    else:
-                        response = openai_client.responses.create(
-                            model=self.model,
-                            input=[{"role": "user", "content": message}],
-                            conversation=self.conversation.id
-                        )
-                    return response
+        while retries < MAX_RETRIES:
+            accounting.get_ledger().check()
+            # Pace against the rate limiter before taking a concurrency slot
+            estimated, wait_time = self._reserve(message)
+            if wait_time > 0:
+                span.rate_limit_wait += wait_time
+                await asyncio.sleep(wait_time)
 
+            try:
+                slot_requested = time.perf_counter()
+                async with self._request_slot():
+                    span.slot_wait += time.perf_counter() - slot_requested
+                    span.attempts += 1
+                    result, response, headers = await self._send_once(message, structured_output)
             except Exception as e:
-                # Check for rate limit errors in message
-                error_msg = str(e).lower()
-                if "rate limit" in error_msg or "429" in error_msg:
-                    # Exponential backoff with jitter
-                    wait_time = (base_delay * (2 ** retries)) + random.uniform(0, 1)
-                    print(f"Rate limit hit for {self.model}. Retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
+                if _is_rate_limit_error(e):
+                    await asyncio.sleep(self._on_rate_limit(span, e, retries, estimated))
                     retries += 1
-                else:
-                    raise e
-        
-        raise Exception(f"Max retries exceeded for {self.model} after {max_retries} attempts.")
\ No newline at end of file
+                    continue
+                raise e
+
+            self._record_response(span, message, estimated, response, headers, structured_output, result)
+            return result
+
+        raise Exception(f"Max retries exceeded for {self.model} after {MAX_RETRIES} attempts.")
+
+    async def _send_once(self, message: str, structured_output: Optional[Any]) -> Tuple[Any, Any, Any]:
+        # Returns (result, raw provider response, HTTP headers)
+        if self.api_provider == 'Simulated':
+            latency, error = self.conversation.plan_call(message, self.turns)
+            await asyncio.sleep(latency)
+            if error:
+                raise error
+            result, response = self.conversation.respond(message, structured_output, self.turns)
+            return result, response, None
+
+        if self.api_provider == 'Gemini':
+            if structured_output:
+                response = await self.conversation.send_message(
+                    message,
+                    config=_gemini_config(structured_output)
+                )
+                return structured_output.model_validate_json(response.text), response, _gemini_headers(response)
+            response = await self.conversation.send_message(message)
+            return response, response, _gemini_headers(response)
+
+        if structured_output:
+            raw = await providers.get_client('OpenAI', asynchronous=True).responses.with_raw_response.parse(
+                **self._openai_request(message, structured_output),
+                text_format=structured_output
+            )
+            response = raw.parse()
+            return response.output_parsed, response, raw.headers
+        raw = await providers.get_client('OpenAI', asynchronous=True).responses.with_raw_response.create(**self._openai_request(message))
+        response = raw.parse()
+        return response, response, raw.headers
@@ -0,0 +1,60 @@
+"""
+Dependency-graph executor.
+Each node starts as soon as the nodes it depends on have finished. Nodes are
+added after their dependencies, and a node's function receives {dependency key: result}.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+
+class Graph:
+    def __init__(self):
+        self._nodes: Dict[Hashable, Tuple[Callable[[Dict[Hashable, Any]], Any], Tuple[Hashable, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, key: Hashable, fn: Callable[[Dict[Hashable, Any]], Any], deps: Iterable[Hashable] = ()) -> Hashable:
+        deps = tuple(deps)
+        if key in self._nodes:
+            raise ValueError(f"Duplicate node: {key!r}")
+        missing = [dep for dep in deps if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Node {key!r} depends on unknown nodes {missing}")
+        self._nodes[key] = (fn, deps)
+        return key
+
+    def run(self) -> Dict[Hashable, Any]:
+        # One thread per node, since a node blocks its thread while waiting for its dependencies;
+        # each runs in a copy of the caller's context, as in run_parallel_task
+        futures = {}
+        with ThreadPoolExecutor(max_workers=max(len(self._nodes), 1)) as executor:
+            for key, (fn, deps) in self._nodes.items():
+                futures[key] = executor.submit(contextvars.copy_context().run, _run_when_ready, fn,
+                                               [(dep, futures[dep]) for dep in deps])
+            return {key: future.result() for key, future in futures.items()}
+
+    async def run_async(self) -> Dict[Hashable, Any]:
+        tasks = {}
+        for key, (fn, deps) in self._nodes.items():
+            tasks[key] = asyncio.ensure_future(_run_when_ready_async(fn, [(dep, tasks[dep]) for dep in deps]))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            # Stop the rest of the graph and collect their outcomes so nothing is left unretrieved
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {key: task.result() for key, task in tasks.items()}
+
+
+def _run_when_ready(fn: Callable[[Dict[Hashable, Any]], Any], deps: List[Tuple[Hashable, Any]]) -> Any:
+    return fn({dep: future.result() for dep, future in deps})
+
+
+async def _run_when_ready_async(fn: Callable[[Dict[Hashable, Any]], Any], deps: List[Tuple[Hashable, Any]]) -> Any:
+    return await fn({dep: await task for dep, task in deps})
@@ -1,146 +1,80 @@
-import json
-from collections import Counter
+import argparse
+import analytics
+import rundb
 
 
-def analyze_performance(results_path="results.json", evaluation_path="final_evaluation.json"):
-    with open(results_path, "r") as f:
-        results = json.load(f)
-    
-    with open(evaluation_path, "r") as f:
-        evaluations = json.load(f)
-        
-    eval_map = {item['question_number']: item for item in evaluations}
-    
-    total_questions = len(results) or 1
-    system_correct_count = 0
-    
-    total_initial_solvers = 0
-    total_initial_correct = 0
-    total_refined_solvers = 0
-    total_refined_correct = 0
-    voting_correct = 0
-    consensus_count = 0
-    disagreement_cases = 0
-    judge_correct_disagreement = 0
-    
-    solvers_improved_count = 0 # Initial=False -> Refined=True
-    solvers_regressed_count = 0 # Initial=True -> Refined=False
-    total_solver_pairs = 0
-    
-    for item in results:
-        q_id = item.get('id', 0)
-        eval_entry = eval_map.get(q_id)
-        
-        if not eval_entry:
-            continue
-            
-        # 1. System Accuracy (Judge's Final Verdict)
-        if eval_entry.get('is_correct', False):
-            system_correct_count += 1
-            
-        # 2. Analyze Solver Details (Initial vs Refined)
-        solver_details = eval_entry.get('solver_details', [])
-        
-        initial_sols = {s['solver_id']: s for s in solver_details if s['type'] == 'initial'}
-        refined_sols = {s['solver_id']: s for s in solver_details if s['type'] == 'refined'}
-        
-        # Initial Stats
-        for s_id, s_data in initial_sols.items():
-            total_initial_solvers += 1
-            if s_data['is_correct']:
-                total_initial_correct += 1
-            
-            # Check Improvement for this solver
-            if s_id in refined_sols:
-                total_solver_pairs += 1
-                refined_data = refined_sols[s_id]
-                
-                initial_correct = s_data['is_correct']
-                refined_correct = refined_data['is_correct']
-                
-                if not initial_correct and refined_correct:
-                    solvers_improved_count += 1
-                elif initial_correct and not refined_correct:
-                    solvers_regressed_count += 1
-                
-        # Refined Stats
-        for s_data in refined_sols.values():
-            total_refined_solvers += 1
-            if s_data['is_correct']:
-                total_refined_correct += 1
-                
-        # 3. Voting Baseline (Majority of Initial Answers)
-        if initial_sols:
-            initial_answer_texts = [s['answer'].strip().lower() for s in initial_sols.values()]
-            # Find most common answer
-            vote_counts = Counter(initial_answer_texts)
-            if not vote_counts:
-                majority_ans = ""
-            else:
-                majority_ans = vote_counts.most_common(1)[0][0]
-            
-            # Check if majority answer is correct
-            is_majority_correct = False
-            for s in initial_sols.values():
-                if s['answer'].strip().lower() == majority_ans and s['is_correct']:
-                    is_majority_correct = True
-                    break
-            
-            if is_majority_correct:
-                voting_correct += 1
-                
-            # 4. Consensus (Based on Initial Answers)
-            if len(set(initial_answer_texts)) == 1:
-                consensus_count += 1
-            else:
-                disagreement_cases += 1
-                # If disagreement existed (in initial phase), but the Judge (System) got it right
-                if eval_entry.get('is_correct', False):
-                    judge_correct_disagreement += 1
+def analyze_performance(results_path="results.json", evaluation_path="final_evaluation.json", by=None):
+    run = analytics.load_run(results_path, evaluation_path)
+    confidence, correct = analytics.cascade_answers(run)
+    report(analytics.metrics(run), analytics.cascade_tiers(run),
+           analytics.threshold_table(confidence, correct) if len(confidence) else [], len(confidence),
+           analytics.breakdown(run, by) if by else None, by)
 
-    # Calculate Percentages
-    system_accuracy = (system_correct_count / total_questions) * 100
-    avg_initial_accuracy = (total_initial_correct / total_initial_solvers * 100) if total_initial_solvers else 0
-    avg_refined_accuracy = (total_refined_correct / total_refined_solvers * 100) if total_refined_solvers else 0
-    voting_accuracy = (voting_correct / total_questions) * 100
-    consensus_rate = (consensus_count / total_questions) * 100
-    judge_efficacy = (judge_correct_disagreement / disagreement_cases * 100) if disagreement_cases else 0
-    
-    # Improvement Rate: % of solvers that improved (Incorrect -> Correct)
-    improvement_rate = (solvers_improved_count / total_solver_pairs * 100) if total_solver_pairs else 0
+
+def analyze_run(db_path, name=None, by=None):
+    # The same report, computed with queries against an imported run (latest by default)
+    with rundb.RunDB(db_path) as db:
+        thresholds, answered = db.threshold_table(name)
+        report(db.metrics(name), db.cascade_tiers(name), thresholds, answered,
+               db.breakdown(name, by) if by else None, by)
+
+
+def report(metrics, tiers, thresholds, answered, breakdown=None, by=None):
+    total_questions = metrics['questions'] or 1
 
     print("\n" + "="*40)
     print("PHASE 3: EVALUATION AND ANALYSIS")
     print("="*40)
     
     print("\n[System-Level Performance]")
-    print(f"Overall Accuracy:   {system_correct_count}/{total_questions} ({system_accuracy:.1f}%)")
-    print(f"Improvement Rate:   {improvement_rate:.1f}% (Solvers Incorrect->Correct)")
-    print(f"Consensus Rate:     {consensus_count}/{total_questions} ({consensus_rate:.1f}%)")
-    print(f"Judge Efficacy:     {judge_correct_disagreement}/{disagreement_cases} ({judge_efficacy:.1f}%) [in disagreement]")
+    print(f"Overall Accuracy:   {metrics['system_correct']}/{total_questions} ({metrics['system_accuracy']:.1f}%)")
+    print(f"Improvement Rate:   {metrics['improvement_rate']:.1f}% (Solvers Incorrect->Correct)")
+    print(f"Regression Rate:    {metrics['regression_rate']:.1f}% (Solvers Correct->Incorrect)")
+    print(f"Consensus Rate:     {metrics['consensus']}/{total_questions} ({metrics['consensus_rate']:.1f}%)")
+    if metrics['early_exits']:
+        print(f"Early Exits:        {metrics['early_exits']}/{total_questions} (consensus, debate skipped)")
+    print(f"Judge Efficacy:     {metrics['judge_correct_disagreement']}/{metrics['disagreements']} "
+          f"({metrics['judge_efficacy']:.1f}%) [in disagreement]")
     
-    print("\n[Comparison to Baselines]")
-    print(f"System (Debate):    {system_accuracy:.1f}%")
-    print(f"Simple Voting:      {voting_accuracy:.1f}%")
-    print(f"Avg Initial (Solo): {avg_initial_accuracy:.1f}%")
-    print(f"Avg Refined (Solo): {avg_refined_accuracy:.1f}%")
+    if answered or any(tier[0] for tier in tiers.values()):
+        print_cascade(tiers, thresholds, answered)
     
-    visualize_metrics({
-        "System": system_accuracy,
-        "Voting": voting_accuracy,
-        "Initial": avg_initial_accuracy,
-        "Refined": avg_refined_accuracy,
-        "Improvement": improvement_rate
-    })
+    print("\n[Comparison to Baselines]")
+    print(f"System (Debate):    {metrics['system_accuracy']:.1f}%")
+    print(f"Simple Voting:      {metrics['voting_accuracy']:.1f}%")
+    print(f"Avg Initial (Solo): {metrics['initial_accuracy']:.1f}%")
+    print(f"Avg Refined (Solo): {metrics['refined_accuracy']:.1f}%")
+
+    if breakdown is not None:
+        print(f"\n[Accuracy by {by.title()} and Phase]")
+        print(analytics.format_breakdown(breakdown, by))
+
+    chart = {
+        "System": metrics['system_accuracy'],
+        "Voting": metrics['voting_accuracy'],
+        "Initial": metrics['initial_accuracy'],
+        "Refined": metrics['refined_accuracy'],
+        "Improvement": metrics['improvement_rate']
+    }
+    visualize_metrics(chart)
     
     # Save chart
-    plot_metrics({
-        "System": system_accuracy,
-        "Voting": voting_accuracy,
-        "Initial": avg_initial_accuracy,
-        "Refined": avg_refined_accuracy,
-        "Improvement": improvement_rate
-    })
+    plot_metrics(chart)
+
+def print_cascade(tiers, thresholds, answered):
+    print("\n[Cascade]")
+    for tier, (count, correct, cost) in tiers.items():
+        label = "Fast model only" if tier == 1 else "Full debate"
+        accuracy = (correct / count * 100) if count else 0
+        avg_cost = f"${cost / count:.4f}/question" if count else "-"
+        print(f"Tier {tier} ({label}): {count} questions, {correct}/{count} ({accuracy:.1f}%) correct, {avg_cost}")
+
+    # What each threshold would have accepted, judged by the fast answer alone
+    if thresholds:
+        print(f"{'threshold':>10}{'accepted':>10}{'accuracy':>10}")
+        for threshold, accepted, accuracy in thresholds:
+            accuracy = f"{accuracy:.1f}%" if accuracy is not None else "-"
+            print(f"{threshold:>10.2f}{accepted:>6}/{answered:<3}{accuracy:>10}")
 
 def plot_metrics(metrics):
     try:
@@ -188,4 +122,24 @@ def visualize_metrics(metrics):
     print("="*40)
 
 if __name__ == "__main__":
-    analyze_performance()
+    parser = argparse.ArgumentParser(description="Accuracy metrics for a debate run")
+    parser.add_argument("--results", default="results.json", help="results.json or results.jsonl")
+    parser.add_argument("--evaluation", default="final_evaluation.json")
+    parser.add_argument("--by", choices=["model", "solver"], default=None,
+                        help="Also break accuracy down per model or solver and phase")
+    parser.add_argument("--compare", nargs="+", metavar="[NAME=]RUN",
+                        help="Compare runs side by side instead; RUN is a directory holding the result and "
+                             "evaluation files, or RESULTS,EVALUATION (with --db: names of imported runs)")
+    parser.add_argument("--db", default=None, help="Query runs imported with rundb.py instead of reading the files")
+    parser.add_argument("--run", default=None, help="With --db, the run to analyze (default: the latest import)")
+    args = parser.parse_args()
+    if args.db and args.compare:
+        with rundb.RunDB(args.db) as db:
+            print(db.compare(args.compare))
+    elif args.db:
+        analyze_run(args.db, args.run, args.by)
+    elif args.compare:
+        print(analytics.compare([analytics.load_run(results, evaluation, name)
+                                 for name, results, evaluation in map(analytics.run_paths, args.compare)]))
+    else:
+        analyze_performance(args.results, args.evaluation, args.by)
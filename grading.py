@@ -0,0 +1,183 @@
+"""
+Parallel, deduplicated grading of debate results against the reference answers.
+Answers the local matcher decides never reach the LLM; the other distinct answers
+of a question are graded together in one structured call.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+import accounting
+import answer_matcher
+import tracing
+from conversation import AsyncCustomConversation
+from history import HistoryPolicy
+from message import get_evaluation_prompt, get_batch_evaluation_prompt
+from schemas import EvaluationResult, BatchEvaluationResult
+
+GRADER_PROVIDER = 'Gemini'
+GRADER_MODEL = 'gemini-2.5-flash'
+MAX_ATTEMPTS = 3
+LOCAL = 'local'
+LLM = 'llm'
+BUDGET = 'budget'  # Not graded because the budget ran out; counted as incorrect
+
+
+def _answers_to_grade(item: Dict[str, Any]) -> Tuple[str, List[Tuple[str, str, str]]]:
+    # Returns the winning answer and (solver_id, type, answer) for every solver answer, in report order
+    process_out = item.get('process_output') or {}
+    if process_out.get('final_verdict'):
+        winning_ans = process_out['final_verdict']['winning_answer']
+    else:
+        winning_ans = "NO ANSWER PROVIDED"
+
+    solver_answers = []
+    for sol in process_out.get('initial_solutions', []):
+        solver_answers.append((sol.get('solver_id', 'unknown'), "initial", sol.get('response', {}).get('answer', '')))
+    for sol in process_out.get('refined_solutions', []):
+        solver_answers.append((sol.get('solver_id', 'unknown'), "refined", sol.get('refined_response', {}).get('refined_answer', '')))
+    if process_out.get('cascade'):
+        # The fast model's own answer, graded even when the debate overruled it, so the threshold can be tuned
+        solver_answers.append((process_out['cascade']['model'], "cascade", process_out['cascade']['answer']))
+    return winning_ans, solver_answers
+
+
+class GradingEngine:
+    def __init__(self, max_concurrency: int = 16, batch: bool = True,
+                 api_provider: str = GRADER_PROVIDER, model: str = GRADER_MODEL):
+        self.max_concurrency = max_concurrency
+        self.batch = batch
+        self.api_provider = api_provider
+        self.model = model
+        self.calls = 0
+        self.requested = 0
+        self.decided_locally = 0
+        self.skipped = 0
+
+    async def grade_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pool = asyncio.Semaphore(self.max_concurrency)
+
+        plan = []
+        for item in results:
+            winning_ans, solver_answers = _answers_to_grade(item)
+            distinct = {}
+            for ans in [winning_ans] + [ans for _, _, ans in solver_answers]:
+                distinct.setdefault(answer_matcher.normalize(ans), ans)
+            self.requested += 1 + len(solver_answers)
+            plan.append((item, winning_ans, solver_answers, distinct))
+
+        with tracing.phase(tracing.GRADING):
+            verdict_maps = await asyncio.gather(*(
+                self._grade_question(pool, item, distinct) for item, _, _, distinct in plan
+            ))
+
+        evaluation_summary = []
+        for (item, winning_ans, solver_answers, _), verdicts in zip(plan, verdict_maps):
+            q_num = item.get('id', 'unknown')
+            is_correct, decided_by = verdicts[answer_matcher.normalize(winning_ans)]
+            entry = {
+                "question_number": q_num if isinstance(q_num, int) else 0,
+                "is_correct": is_correct,
+                "winning_answer": winning_ans,
+                "decided_by": decided_by,
+                "solver_details": []
+            }
+            print(f"Question {q_num} (Winner): {'CORRECT' if entry['is_correct'] else 'INCORRECT'}")
+
+            for s_id, kind, ans in solver_answers:
+                is_correct, decided_by = verdicts[answer_matcher.normalize(ans)]
+                entry['solver_details'].append({
+                    "solver_id": s_id,
+                    "type": kind,
+                    "answer": ans,
+                    "is_correct": is_correct,
+                    "decided_by": decided_by
+                })
+                print(f"  Solver {s_id} ({kind.capitalize()}): {'CORRECT' if is_correct else 'INCORRECT'}")
+
+            evaluation_summary.append(entry)
+        return evaluation_summary
+
+    async def _grade_question(self, pool: asyncio.Semaphore, item: Dict[str, Any],
+                              distinct: Dict[str, str]) -> Dict[str, Tuple[bool, str]]:
+        # Maps each normalized answer to (verdict, path that decided it)
+        with tracing.question(item.get('id', 'unknown')):
+            return await self._grade_question_answers(pool, item, distinct)
+
+    async def _grade_question_answers(self, pool: asyncio.Semaphore, item: Dict[str, Any],
+                                      distinct: Dict[str, str]) -> Dict[str, Tuple[bool, str]]:
+        verdicts = {}
+        pending = {}
+        for norm, ans in distinct.items():
+            local = answer_matcher.match(ans, item['correct_answer'])
+            if local == answer_matcher.UNCERTAIN:
+                pending[norm] = ans
+            else:
+                verdicts[norm] = (local == answer_matcher.CORRECT, LOCAL)
+                self.decided_locally += 1
+
+        try:
+            if self.batch and len(pending) > 1:
+                batch_verdicts = await self._grade_batch(pool, item, pending)
+                verdicts.update({norm: (is_correct, LLM) for norm, is_correct in batch_verdicts.items()})
+                pending = {norm: ans for norm, ans in pending.items() if norm not in verdicts}
+                if pending and accounting.get_ledger().state == accounting.SOFT:
+                    # Past the soft budget a failed batch is not retried answer by answer
+                    raise accounting.BudgetExceeded("soft budget reached")
+        except accounting.BudgetExceeded:
+            graded = [accounting.BudgetExceeded()] * len(pending)
+        else:
+            graded = await asyncio.gather(*(self._grade_single(pool, item, ans) for ans in pending.values()),
+                                          return_exceptions=True)
+
+        for norm, is_correct in zip(pending.keys(), graded):
+            if isinstance(is_correct, accounting.BudgetExceeded):
+                verdicts[norm] = (False, BUDGET)
+                self.skipped += 1
+            elif isinstance(is_correct, BaseException):
+                raise is_correct
+            else:
+                verdicts[norm] = (is_correct, LLM)
+        return verdicts
+
+    async def _grade_batch(self, pool: asyncio.Semaphore, item: Dict[str, Any], distinct: Dict[str, str]) -> Dict[str, bool]:
+        labels = {f"A{n}": norm for n, norm in enumerate(distinct, 1)}
+        prompt = get_batch_evaluation_prompt(
+            item.get('id', 'unknown'), item['question'], item['correct_answer'],
+            [(label, distinct[norm]) for label, norm in labels.items()]
+        )
+        result = await self._send(pool, item, prompt, BatchEvaluationResult, "Batch", attempts=1)
+        if result is None:
+            return {}
+
+        # Unknown or duplicated labels invalidate the batch; missing ones are graded individually
+        seen = [v.label.strip("[] ") for v in result.verdicts]
+        if len(seen) != len(set(seen)) or not set(seen) <= set(labels):
+            print(f"Batched grading for Q{item.get('id', 'unknown')} returned unexpected labels; grading individually")
+            return {}
+        return {labels[label]: v.is_correct for label, v in zip(seen, result.verdicts)}
+
+    async def _grade_single(self, pool: asyncio.Semaphore, item: Dict[str, Any], answer: str) -> bool:
+        q_num = item.get('id', 'unknown')
+        prompt = get_evaluation_prompt(q_num, item['question'], item['correct_answer'], answer)
+        result = await self._send(pool, item, prompt, EvaluationResult, f"answer '{answer}'")
+        return result.is_correct if result else False
+
+    async def _send(self, pool: asyncio.Semaphore, item: Dict[str, Any], prompt: str, schema: Any,
+                    label: str, attempts: int = MAX_ATTEMPTS) -> Optional[Any]:
+        # A fresh stateless conversation per call, so concurrent grades never share a chat
+        q_num = item.get('id', 'unknown')
+        async with pool:
+            for attempt in range(attempts):
+                try:
+                    accounting.get_ledger().check()
+                    self.calls += 1
+                    grader = AsyncCustomConversation(self.api_provider, self.model, HistoryPolicy.stateless())
+                    return await grader.send_message(prompt, schema)
+                except accounting.BudgetExceeded:
+                    raise
+                except Exception as e:
+                    if attempt == attempts - 1:
+                        print(f"Error evaluating {label} for Q{q_num}: {e}")
+                        return None
+                    await asyncio.sleep(2)
+        return None
@@ -0,0 +1,84 @@
+"""
+Conversation history policies: which turns of a conversation's transcript are
+kept at the start of each question, before each call and across questions.
+"""
+
+from typing import List, Optional, Tuple
+
+Turn = Tuple[str, str]
+
+
+class HistoryPolicy:
+    FULL = 'full'                          # Never drop anything (provider default)
+    PER_QUESTION = 'per_question'          # Start every question with an empty history
+    CURRENT_QUESTION = 'current_question'  # Keep the turns made before the first question (e.g. role selection) plus the current question's phases
+    LAST_K = 'last_k'                      # Keep only the last k turns
+
+    def __init__(self, mode: str = FULL, max_turns: Optional[int] = None):
+        if mode not in (self.FULL, self.PER_QUESTION, self.CURRENT_QUESTION, self.LAST_K):
+            raise ValueError(f"Unknown history policy: {mode}")
+        if mode == self.LAST_K and (max_turns is None or max_turns < 0):
+            raise ValueError("last_k history policy needs max_turns >= 0")
+        self.mode = mode
+        self.max_turns = max_turns
+
+    @classmethod
+    def full(cls) -> 'HistoryPolicy':
+        return cls(cls.FULL)
+
+    @classmethod
+    def per_question(cls) -> 'HistoryPolicy':
+        return cls(cls.PER_QUESTION)
+
+    @classmethod
+    def current_question(cls) -> 'HistoryPolicy':
+        return cls(cls.CURRENT_QUESTION)
+
+    @classmethod
+    def last_k(cls, k: int) -> 'HistoryPolicy':
+        return cls(cls.LAST_K, k)
+
+    @classmethod
+    def stateless(cls) -> 'HistoryPolicy':
+        # Every call is independent, e.g. for grading
+        return cls(cls.LAST_K, 0)
+
+    @classmethod
+    def parse(cls, value: str) -> 'HistoryPolicy':
+        # "full", "per_question", "current_question" or "last_k:N"
+        mode, _, k = value.partition(':')
+        if mode == cls.LAST_K:
+            return cls.last_k(int(k))
+        return cls(mode)
+
+    def on_question_start(self, turns: List[Turn], pinned: int) -> List[Turn]:
+        if self.mode == self.PER_QUESTION:
+            return []
+        if self.mode == self.CURRENT_QUESTION:
+            return turns[:pinned]
+        return self.before_send(turns)
+
+    def before_send(self, turns: List[Turn]) -> List[Turn]:
+        if self.mode == self.LAST_K and len(turns) > self.max_turns:
+            return turns[len(turns) - self.max_turns:]
+        return turns
+
+    def on_fork(self, turns: List[Turn], pinned: int) -> List[Turn]:
+        # A fork starts a new question line. full and last_k also carry the finished questions' turns
+        # the parent has absorbed; current_question only the pre-question context.
+        if self.mode == self.PER_QUESTION:
+            return []
+        if self.mode == self.CURRENT_QUESTION:
+            return turns[:pinned]
+        return self.before_send(turns)
+
+    def on_absorb(self, turns: List[Turn], question_turns: List[Turn]) -> List[Turn]:
+        # The parent's turns once a question debated on a fork has finished
+        if self.mode in (self.FULL, self.LAST_K):
+            return self.before_send(turns + question_turns)
+        return turns
+
+    def __repr__(self) -> str:
+        if self.mode == self.LAST_K:
+            return f"HistoryPolicy('{self.mode}', {self.max_turns})"
+        return f"HistoryPolicy('{self.mode}')"
@@ -1,55 +1,334 @@
+import argparse
+import asyncio
+import contextlib
 import json
-from conversation import CustomConversation
-from collaboration import run_collaborative_solving, assign_roles
+import os
+import tempfile
+import time
+import accounting
+import checkpoint
+import prompt_budget
+import rate_limiter
+import response_cache
+import rundb
+import sharding
+import simulated_provider
+import tracing
+import transport
+from conversation import AsyncCustomConversation
+from history import HistoryPolicy
+from result_store import ResultStore
+from collaboration import Cascade, assign_roles_async, load_roles, save_roles
+from scheduler import debate_question, run_questions
 from utils import run_final_evaluation
 
+RESULTS_STORE_PATH = "results.jsonl"
+RESULTS_PATH = "results.json"
+EVALUATION_PATH = "final_evaluation.json"
+ROLES_PATH = "roles.json"
+CHECKPOINTS_PATH = "checkpoints"
+USAGE_PATH = "usage.json"
+SIMULATED_PREFIX = "simulated_"  # Simulated runs never touch the real results
+
+def parse_model_limits(values):
+    limits = {}
+    for value in values or []:
+        model, _, limit = value.partition('=')
+        limits[model] = int(limit)
+    return limits
+
+def configure_rate_limits(values, free_tier=False):
+    # PROVIDER[:MODEL]=RPM,TPM, e.g. Gemini:gemini-2.5-flash=1000,1000000; applied on top of --free-tier
+    if free_tier:
+        rate_limiter.configure_free_tier()
+    for value in values or []:
+        target, _, limits = value.partition('=')
+        provider, _, model = target.partition(':')
+        rpm, tpm = (int(x) for x in limits.split(','))
+        rate_limiter.configure(provider, model or None, rpm, tpm)
+
+def configure_transport(args):
+    # --read-timeout [PHASE=]SECONDS, e.g. judge=900; without a phase it sets the default
+    phase_read_timeouts, read_timeout = {}, transport.TransportConfig().read_timeout
+    for value in args.read_timeout or []:
+        phase, _, seconds = value.rpartition('=')
+        if phase:
+            phase_read_timeouts[phase] = float(seconds)
+        else:
+            read_timeout = float(seconds)
+    transport.configure(transport.TransportConfig(
+        max_connections=args.pool_size or max(args.max_requests, args.grading_concurrency), http2=args.http2,
+        connect_timeout=args.connect_timeout, read_timeout=read_timeout, phase_read_timeouts=phase_read_timeouts
+    ))
+
+def output_paths(args, directory=""):
+    # (result store, exported results.json, final evaluation, role assignments, phase checkpoints)
+    prefix = SIMULATED_PREFIX if args.simulate else ""
+    return tuple(os.path.join(directory, prefix + name)
+                 for name in (RESULTS_STORE_PATH, RESULTS_PATH, EVALUATION_PATH, ROLES_PATH, CHECKPOINTS_PATH))
+
+def open_result_store(store_path, results_path):
+    store = ResultStore(store_path)
+    if not len(store) and os.path.exists(results_path):
+        # Migrate a results.json written by an older version
+        try:
+            print(f"Imported {store.import_json(results_path)} results from {results_path}")
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"{results_path} is corrupt ({e}); fix or move it before resuming") from e
+    return store
+
+def provider(api_provider, args):
+    # --simulate swaps every model for the offline backend while keeping the model names
+    return 'Simulated' if args.simulate else api_provider
+
+async def solve_all(questions_data, args, store_path, results_path, roles_path, checkpoints_path, queue=None,
+                    worker=None):
+    AsyncCustomConversation.set_concurrency_limit(args.max_requests, parse_model_limits(args.model_limit))
+
+    history_policy = HistoryPolicy.parse(args.history)
+    models = [
+        ('gpt-4o', AsyncCustomConversation(provider('OpenAI', args), 'gpt-4o', history_policy)),
+        ('gpt-5-mini-2025-08-07', AsyncCustomConversation(provider('OpenAI', args), 'gpt-5-mini-2025-08-07', history_policy)),
+        ('gemini-2.5-flash', AsyncCustomConversation(provider('Gemini', args), 'gemini-2.5-flash', history_policy)),
+        ('gemini-2.0-flash-lite-001', AsyncCustomConversation(provider('Gemini', args), 'gemini-2.0-flash-lite-001', history_policy))
+    ]
+
+    if queue is None:
+        store = open_result_store(store_path, results_path)
+        processed_ids = set(store.ids())
+        if processed_ids:
+            print(f"Resuming: Found {len(processed_ids)} completed questions.")
+        else:
+            print("Starting fresh (no existing results).")
+    else:
+        # A shard worker appends to its own store and takes questions from the shared queue
+        store = ResultStore(sharding.shard_path(queue.directory, worker))
+        for path in sharding.shard_paths(queue.directory):
+            queue.complete(worker, sharding.indexed_ids(path))
+        retried = queue.reset_exhausted()
+        status = queue.status()
+        print(f"Worker {worker}: {status['done']} of {len(questions_data)} questions done, "
+              f"{len(status['claimed'])} claimed by other workers" + (f", retrying {retried}" if retried else ""))
+        processed_ids = set()
+
+    if args.roles == "per_question":
+        # No role-selection round-trip: each question's initial solve also reports role confidence
+        judge, solvers = None, []
+        print("Roles are chosen per question from the initial solutions.")
+    else:
+        # A resumed run keeps the judge and solvers it started with; shard workers share the first worker's
+        with sharding.file_lock(roles_path + ".lock") if queue else contextlib.nullcontext():
+            roles = load_roles(roles_path, models) if processed_ids or queue else None
+            judge, solvers = roles or await assign_roles_async(models)
+            save_roles(roles_path, judge, solvers)
+
+    per_question_models = models if args.roles == "per_question" else None
+    checkpoints = None if args.no_checkpoints else checkpoint.Checkpoints(checkpoints_path)
+    if queue is None:
+        failed_ids = await run_questions(questions_data, judge, solvers, processed_ids, store.append,
+                                         max_in_flight=args.max_questions, early_exit_confidence=args.early_exit,
+                                         cascade=cascade(args), models=per_question_models, dataflow=args.dataflow,
+                                         checkpoints=checkpoints)
+    else:
+        def debate(i, item):
+            return debate_question(i, item, judge, solvers, store.append, args.early_exit, cascade(args),
+                                   per_question_models, args.dataflow, checkpoints)
+
+        failed_ids = await sharding.run_worker(queue, worker, questions_data, debate, args.max_questions)
+    if failed_ids:
+        print(f"\nQuestions failed and will be retried on the next run: {failed_ids}")
+
+def cascade(args):
+    if not args.cascade:
+        return None
+    verify = args.cascade_verifier != "none"
+    return Cascade(args.cascade, args.cascade_confidence, args.cascade_verifier if verify else None, verify)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-LLM collaborative debate")
+    parser.add_argument("--max-questions", type=int, default=4,
+                        help="Number of questions debated concurrently")
+    parser.add_argument("--max-requests", type=int, default=16,
+                        help="Global limit on LLM requests in flight")
+    parser.add_argument("--model-limit", action="append", metavar="MODEL=N",
+                        help="Per-model limit on requests in flight (repeatable)")
+    parser.add_argument("--rate-limit", action="append", metavar="PROVIDER[:MODEL]=RPM,TPM",
+                        help="Requests/min and tokens/min quota used for pacing (repeatable; default: no pacing "
+                             "until the provider reports its limits)")
+    parser.add_argument("--free-tier", action="store_true",
+                        help="Pace to the free API tiers' quotas (rate_limiter.FREE_TIER_LIMITS)")
+    parser.add_argument("--history", default="current_question",
+                        help="Conversation history policy: full, per_question, current_question or last_k:N")
+    parser.add_argument("--roles", choices=["startup", "per_question"], default="startup",
+                        help="startup: ask every model for its role preference once and keep the roles in roles.json "
+                             "for resumed runs; per_question: choose roles from confidences reported with each "
+                             "question's initial solve")
+    parser.add_argument("--dataflow", action="store_true",
+                        help="Run peer review, refinement and the judge as a dependency graph instead of "
+                             "barriered phases, so a slow model only delays what needs its result")
+    parser.add_argument("--early-exit", type=float, metavar="CONFIDENCE", default=None,
+                        help="Skip peer review, refinement and the judge when all solvers give the same "
+                             "answer with at least this confidence")
+    parser.add_argument("--cascade", metavar="MODEL", default=None,
+                        help="Let MODEL answer alone first and run the full debate only when it is unsure "
+                             "or the verifier disagrees")
+    parser.add_argument("--cascade-confidence", type=float, default=0.8,
+                        help="Minimum self-reported confidence for accepting the cascade answer")
+    parser.add_argument("--cascade-verifier", metavar="MODEL", default=None,
+                        help="Model that checks the cascade answer (default: the judge's model; 'none' to skip)")
+    parser.add_argument("--judge-prompt-tokens", type=int, default=prompt_budget.DEFAULT_BUDGETS[prompt_budget.JUDGE],
+                        help="Token budget for a judge prompt; explanations and critiques are shortened to fit (0: no limit)")
+    parser.add_argument("--feedback-prompt-tokens", type=int,
+                        default=prompt_budget.DEFAULT_BUDGETS[prompt_budget.FEEDBACK],
+                        help="Token budget for a peer-review prompt (0: no limit)")
+    parser.add_argument("--grading-concurrency", type=int, default=16,
+                        help="Number of grading calls in flight during the final evaluation")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Keep-alive HTTP connections per provider (default: the larger of --max-requests "
+                             "and --grading-concurrency)")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for the provider APIs (needs the h2 package)")
+    parser.add_argument("--connect-timeout", type=float, default=transport.TransportConfig().connect_timeout)
+    parser.add_argument("--read-timeout", action="append", metavar="[PHASE=]SECONDS",
+                        help="Read timeout for API calls, optionally for one phase only, e.g. judge=900 (repeatable)")
+    parser.add_argument("--cache", default=".llm_cache.sqlite",
+                        help="SQLite file used to cache structured LLM responses")
+    parser.add_argument("--cache-mode", default=response_cache.WRITE_THROUGH,
+                        choices=[response_cache.WRITE_THROUGH, response_cache.READ_ONLY, response_cache.BYPASS])
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help="Evict least recently used cache entries beyond this size")
+    parser.add_argument("--cache-max-age-days", type=float, default=None,
+                        help="Ignore and evict cache entries older than this")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Use the offline simulated provider instead of the real APIs (no keys needed)")
+    parser.add_argument("--simulate-replay", metavar="PATH", default=None,
+                        help="With --simulate, replay answers from an earlier results.json "
+                             "(default: questions.json, which only supplies the reference answers)")
+    parser.add_argument("--simulate-seed", type=int, default=0,
+                        help="With --simulate, seed for latencies, failures and answers")
+    parser.add_argument("--simulate-rate-limit", type=float, default=0.0,
+                        help="With --simulate, fraction of calls that fail with an injected 429")
+    parser.add_argument("--simulate-failure-rate", type=float, default=0.0,
+                        help="With --simulate, fraction of calls that fail with an injected server error")
+    parser.add_argument("--trace", metavar="PATH", default=None,
+                        help="Record a span per LLM call and write them as JSONL")
+    parser.add_argument("--chrome-trace", metavar="PATH", default=None,
+                        help="Also write the spans in Chrome trace format (chrome://tracing, Perfetto)")
+    parser.add_argument("--prices", metavar="PATH", default=None,
+                        help='JSON price table {"model": [input, cached_input, output]} in USD per million tokens')
+    parser.add_argument("--soft-budget-tokens", type=int, default=None,
+                        help="Past this many tokens, new questions drop role-selection history and grading stops retrying")
+    parser.add_argument("--hard-budget-tokens", type=int, default=None,
+                        help="Stop making LLM calls after this many tokens")
+    parser.add_argument("--soft-budget-usd", type=float, default=None)
+    parser.add_argument("--hard-budget-usd", type=float, default=None)
+    parser.add_argument("--usage-report", metavar="PATH", default=None,
+                        help="Where to save the token and cost breakdown (default: usage.json, "
+                             "simulated_usage.json with --simulate)")
+    parser.add_argument("--run-db", metavar="PATH", default=None,
+                        help="Also import the finished run into this run database (see rundb.py)")
+    parser.add_argument("--run-name", default=None,
+                        help="Name of the run in --run-db (default: the start time); an existing run of that name is replaced")
+    parser.add_argument("--no-checkpoints", action="store_true",
+                        help="Do not checkpoint questions after each debate phase (a failed question then restarts "
+                             "from the beginning)")
+    parser.add_argument("--shard-dir", metavar="DIR", default=None,
+                        help="Run as one of several workers sharing DIR (possibly over a network filesystem): "
+                             "questions come from a shared queue and the last worker merges the results there")
+    parser.add_argument("--worker", default=None, help="Worker name in --shard-dir (default: HOSTNAME-PID)")
+    parser.add_argument("--lease-seconds", type=float, default=sharding.DEFAULT_LEASE_SECONDS,
+                        help="How long a claimed question stays with a worker that stopped renewing it")
+    parser.add_argument("--shard-merge", action="store_true",
+                        help="With --shard-dir, skip debating and merge and evaluate the shards now")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Estimate the cost of the dataset with the simulated provider, replaying "
+                             "results.json for realistic sizes; no API calls and no result files")
+    args = parser.parse_args()
+    if args.shard_dir and args.estimate:
+        parser.error("--estimate runs in a scratch directory and cannot be sharded")
+    if args.shard_merge and not args.shard_dir:
+        parser.error("--shard-merge needs --shard-dir")
+    args.simulate = args.simulate or args.estimate
+    tracer = tracing.configure(enabled=bool(args.trace or args.chrome_trace))
+    ledger = accounting.configure(
+        accounting.load_prices(args.prices) if args.prices else None,
+        None if args.estimate else accounting.Budget(args.soft_budget_tokens, args.hard_budget_tokens,
+                                                     args.soft_budget_usd, args.hard_budget_usd)
+    )
+    if args.simulate:
+        replay = args.simulate_replay or (RESULTS_PATH if args.estimate and os.path.exists(RESULTS_PATH) else "questions.json")
+        simulated_provider.configure(simulated_provider.SimulationConfig(
+            seed=args.simulate_seed, replay_path=replay,
+            rate_limit_rate=args.simulate_rate_limit, failure_rate=args.simulate_failure_rate,
+            time_scale=0.0 if args.estimate else 1.0
+        ))
+    configure_rate_limits(args.rate_limit, args.free_tier)
+    configure_transport(args)
+    prompt_budget.configure({prompt_budget.JUDGE: args.judge_prompt_tokens,
+                             prompt_budget.FEEDBACK: args.feedback_prompt_tokens})
+    response_cache.configure(
+        args.cache, response_cache.BYPASS if args.estimate else args.cache_mode,
+        max_bytes=int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None,
+        max_age_days=args.cache_max_age_days
+    )
+
     with open("questions.json", "r") as f:
         questions_data = json.load(f)
+    run_name = args.run_name or time.strftime("%Y-%m-%d %H:%M:%S")
 
-    models = [
-        ('gpt-4o', CustomConversation('OpenAI', 'gpt-4o')),
-        ('gpt-5-mini-2025-08-07', CustomConversation('OpenAI', 'gpt-5-mini-2025-08-07')),
-        ('gemini-2.5-flash', CustomConversation('Gemini', 'gemini-2.5-flash')),
-        ('gemini-2.0-flash-lite-001', CustomConversation('Gemini', 'gemini-2.0-flash-lite-001'))
-    ]
+    queue, worker = None, None
+    if args.usage_report is None and not args.shard_dir:
+        args.usage_report = (SIMULATED_PREFIX if args.simulate else "") + USAGE_PATH
+    if args.shard_dir:
+        queue = sharding.WorkQueue(args.shard_dir, len(questions_data), args.lease_seconds)
+        worker = args.worker or sharding.default_worker_name()
+        if args.usage_report is None:
+            args.usage_report = os.path.join(args.shard_dir, f"{SIMULATED_PREFIX if args.simulate else ''}usage-{worker}.json")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store_path, results_path, evaluation_path, roles_path, checkpoints_path = output_paths(
+            args, scratch if args.estimate else args.shard_dir or "")
+        if not args.shard_merge:
+            asyncio.run(solve_all(questions_data, args, store_path, results_path, roles_path, checkpoints_path,
+                                  queue, worker))
+
+        if queue is None or queue.finish(worker, force=args.shard_merge):
+            if queue is not None:
+                merged = sharding.merge(args.shard_dir, ResultStore(store_path))
+                print(f"\nMerged {merged} results from {len(sharding.shard_paths(args.shard_dir))} shards into {store_path}")
+
+            # evaluate.py and the final evaluation read the legacy results.json
+            ResultStore(store_path).export_json(results_path)
+            print(f"\nAll processing complete. Results saved to {store_path} and exported to {results_path}")
+
+            # Final Evaluation Phase
+            grader = {'api_provider': 'Simulated'} if args.simulate else {}
+            run_final_evaluation(results_path, evaluation_path, max_concurrency=args.grading_concurrency, **grader)
+            if args.run_db and not args.estimate:
+                with rundb.RunDB(args.run_db) as db:
+                    count = db.import_run(run_name, store_path, evaluation_path)
+                print(f"Imported {count} questions into {args.run_db} as {run_name}")
+        else:
+            status = queue.status()
+            merger = status['finished_by'] or "the last worker"
+            print(f"\nWorker {worker} finished; {merger} merges and evaluates the shards "
+                  f"({status['done']} of {len(questions_data)} questions done)")
+
+    print("\n" + ledger.format_report())
+    if prompt_budget.summary():
+        print(prompt_budget.format_summary())
+    if transport.summary():
+        print(transport.format_summary())
+    if args.estimate:
+        print(f"Estimated cost for {len(questions_data)} questions (prices from the table above; "
+              f"sizes replayed from {simulated_provider.get_config().replay_path})")
+    else:
+        ledger.save(args.usage_report)
+        print(f"Usage saved to {args.usage_report}")
 
-    judge, solvers = assign_roles(models)
-
-    results = []
-    processed_ids = set()
-    try:
-        with open("results.json", "r") as f:
-            results = json.load(f)
-            processed_ids = {item['id'] for item in results}
-            print(f"Resuming: Found {len(results)} completed questions.")
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("Starting fresh (no existing results).")
-    
-    # Process Questions
-    for i, item in enumerate(questions_data, 1):
-        if i in processed_ids:
-            print(f"Skipping Question {i} (already processed)")
-            continue
-
-        question_text = item['question']
-        correct_answer = item['answer']
-        
-        print(f"\n\n>>> STARTING NEW QUESTION: {question_text[:50]}...")
-        process_output = run_collaborative_solving(question_text, judge, solvers)
-        
-        results.append({
-            "id": i,
-            "question": question_text,
-            "correct_answer": correct_answer,
-            "process_output": process_output
-        })
-        
-        # Save incrementally
-        with open("results.json", "w") as f:
-            json.dump(results, f, indent=2)
-            
-    print("\nAll processing complete. Results saved to results.json")
-
-    # Final Evaluation Phase
-    run_final_evaluation("results.json", "final_evaluation.json")
+    if tracer.enabled:
+        print("\n" + tracer.format_summary())
+        if args.trace:
+            tracer.export_jsonl(args.trace)
+        if args.chrome_trace:
+            tracer.export_chrome(args.chrome_trace)
+        print(f"Traced {len(tracer.spans)} LLM calls")
@@ -4,6 +4,9 @@ This prompt asks the model to choose between Solver and Judge roles
 for the intellectual game "What? Where? When?"
 """
 
+import prompt_budget
+from prompt_budget import PromptBuilder
+
 ROLE_SELECTION_PROMPT = """You are participating in a multi-agent system designed to solve questions from the intellectual game "What? Where? When?" - a game that requires knowledge, logical thinking, and the ability to connect logical dots to arrive at creative answers.
 
 There are two roles available:
@@ -20,10 +23,10 @@ Based on your capabilities and strengths, which role would you prefer to take? C
 
 Please respond with your role preferences in order, confidence scores for each role variant (0-1 scale), and detailed reasoning explaining why you chose these preferences based on the nature of "What? Where? When?" questions."""
 
-def get_solver_prompt(question):
-    return f"""{question}
+# Prompts put their static instructions first and the per-question text last, so the
+# instructions form a byte-identical prefix that the providers' prompt caches can reuse.
 
-You have been selected as a **Solver** for the intellectual game 'What? Where? When?'. Your task is to solve the following question using your broad knowledge, logical reasoning, and ability to make non-obvious connections.
+SOLVER_INSTRUCTIONS = """You have been selected as a **Solver** for the intellectual game 'What? Where? When?'. Your task is to solve the question given at the end using your broad knowledge, logical reasoning, and ability to make non-obvious connections.
 
 **Your Goal:**
 1. **Analyze the Question:** Break down the text, identify key keywords, metaphors, and hidden clues. Pay attention to specific phrasing.
@@ -37,26 +40,46 @@ You have been selected as a **Solver** for the intellectual game 'What? Where? W
 3. Provide a confidence score (0.0 - 1.0).
 """
 
+ROLE_CONFIDENCE_INSTRUCTIONS = """
+**Role Confidence:**
+Roles for this question are assigned from your answer, so also rate (0.0 - 1.0) how well suited you are to each role in `confidence_by_role`:
+- **Solver**: proposes an answer, reviews the other solvers' solutions and refines its own.
+- **Judge**: compares the solvers' reasoning and final answers and picks the best one.
+"""
+
+def _question_section(question):
+    return f"""
+**The Question:**
+{question}
+"""
+
+def get_solver_prompt(question):
+    return SOLVER_INSTRUCTIONS + _question_section(question)
+
+
+def get_solver_with_roles_prompt(question):
+    return SOLVER_INSTRUCTIONS + ROLE_CONFIDENCE_INSTRUCTIONS + _question_section(question)
 
 def get_feedback_prompt(others_solutions):
-    solutions_text = "\n\n".join([f"Solution ID: {sol['solver_id']}\nAnswer: {sol['response'].answer}\nExplanation: {sol['response'].explanation}" for sol in others_solutions])
-    
-    return f"""You are now acting as a peer reviewer. Review the following solutions provided by other solvers for the question you just solved.
-    
-{solutions_text}
+    prompt = PromptBuilder(prompt_budget.FEEDBACK, prompt_budget.budget(prompt_budget.FEEDBACK))
+    prompt.add("""You are now acting as a peer reviewer. Review the solutions below, provided by other solvers for the question you just solved.
 
-Provide detailed feedback for EACH solution using the structured format. 
+Provide detailed feedback for EACH solution using the structured format.
 - Identify logical errors, weak arguments, or missing steps.
 - Highlight strengths.
 - Offer constructive suggestions for improvement.
-- Be critical but fair."""
+- Be critical but fair.
+
+""")
+    for n, sol in enumerate(others_solutions):
+        prompt.add(("\n\n" if n else "") + f"Solution ID: {sol['solver_id']}\nAnswer: {sol['response'].answer}\nExplanation: ")
+        prompt.add(sol['response'].explanation, prompt_budget.ORIGINAL_EXPLANATION, f"explanation {sol['solver_id']}")
+    return prompt.build()
 
 def get_refinement_prompt(feedbacks):
     feedback_text = "\n\n".join([f"Feedback from Solver {fb['reviewer_id']}:\nAssessment: {fb['feedbacks'].overall_assessment}\nCritique: {fb['feedbacks'].evaluation.errors}\nSuggestions: {fb['feedbacks'].evaluation.suggested_changes}" for fb in feedbacks])
     
-    return f"""You have received feedback from other solvers on your initial solution:
-
-{feedback_text}
+    return f"""You have received feedback from other solvers on your initial solution. It is given below.
 
 Analyze this feedback carefully.
 1. Evaluate each critique point: Is it valid? Did you miss something?
@@ -64,64 +87,125 @@ Analyze this feedback carefully.
 3. If you disagree, explain why.
 4. Provide a final, refined solution and answer.
 
-Respond using the structured format."""
+Respond using the structured format.
 
-def get_judge_prompt(question, original_answers, peer_feedbacks, refined_solutions):
-    # Format inputs for the prompt
-    
-    # Original Answers
-    orig_text = "\n".join([f"Solver {ans['solver_id']} ({ans['model']}): {ans['response'].answer}\nExplanation: {ans['response'].explanation}\n" for ans in original_answers])
-    
-    # Peer Feedbacks
-    feedback_text = ""
-    for pf in peer_feedbacks:
-        feedback_text += f"\nReviewer {pf['reviewer_id']} feedback:\n"
-        for fb in pf['feedbacks'].feedbacks:
-            feedback_text += f"- To {fb.solution_id}: Assessment: {fb.overall_assessment}, Critique: {fb.evaluation.errors}\n"
-            
-    # Refined Answers
-    refined_text = "\n".join([f"Solver {res['solver_id']}:\nRefined Answer: {res['refined_response'].refined_answer}\nExplanation: {res['refined_response'].refined_solution}\nConfidence: {res['refined_response'].confidence}\nChanges: {[c.response for c in res['refined_response'].changes_made]}\n" for res in refined_solutions])
+{feedback_text}"""
 
-    return f"""You are the Judge in this intellectual competition.
-    
+JUDGE_INSTRUCTIONS = """You are the Judge in this intellectual competition.
+
+Below are the question, the solvers' original solutions, their peer feedback and their refined solutions.
+
+**Your Task:**
+1. Evaluate the final refined solutions.
+2. Consider how well they addressed valid critiques.
+3. Select the single best solution.
+4. Explain your reasoning and provide a confidence score.
+5. Provide the exact text of the winning answer.
+"""
+
+def get_judge_prompt(question, original_answers, peer_feedbacks, refined_solutions):
+    # Explanations and critiques are trimmed to the judge budget, lowest-value parts first
+    prompt = PromptBuilder(prompt_budget.JUDGE, prompt_budget.budget(prompt_budget.JUDGE))
+    prompt.add(JUDGE_INSTRUCTIONS)
+    prompt.add(f"""
 **The Question:**
 {question}
 
 ---
 **Phase 1: Original Solutions**
-{orig_text}
+""")
+
+    # Original Answers
+    for n, ans in enumerate(original_answers):
+        prompt.add(("\n" if n else "") + f"Solver {ans['solver_id']} ({ans['model']}): {ans['response'].answer}\nExplanation: ")
+        prompt.add(ans['response'].explanation, prompt_budget.ORIGINAL_EXPLANATION, f"original explanation {ans['solver_id']}")
+        prompt.add("\n")
+
+    # Peer Feedbacks
+    prompt.add("""
 
 ---
 **Phase 2: Peer Feedback**
 Solvers reviewed each other's work:
-{feedback_text}
+""")
+    for pf in peer_feedbacks:
+        prompt.add(f"\nReviewer {pf['reviewer_id']} feedback:\n")
+        for fb in pf['feedbacks'].feedbacks:
+            prompt.add(f"- To {fb.solution_id}: ")
+            prompt.add(f"Assessment: {fb.overall_assessment}, Critique: {fb.evaluation.errors}",
+                       prompt_budget.PEER_CRITIQUE, f"critique {pf['reviewer_id']}->{fb.solution_id}")
+            prompt.add("\n")
+
+    # Refined Answers
+    prompt.add("""
 
 ---
 **Phase 3: Refined Solutions**
 After considering feedback, solvers improved their answers:
-{refined_text}
-
+""")
+    for n, res in enumerate(refined_solutions):
+        refined = res['refined_response']
+        prompt.add(("\n" if n else "") + f"Solver {res['solver_id']}:\nRefined Answer: {refined.refined_answer}\nExplanation: ")
+        prompt.add(refined.refined_solution, prompt_budget.REFINED_EXPLANATION, f"refined explanation {res['solver_id']}")
+        prompt.add(f"\nConfidence: {refined.confidence}\nChanges: ")
+        prompt.add(str([c.response for c in refined.changes_made]), prompt_budget.CHANGE_RESPONSES,
+                   f"changes {res['solver_id']}")
+        prompt.add("\n")
+
+    prompt.add("""
 ---
-**Your Task:**
-1. Evaluate the final refined solutions.
-2. Consider how well they addressed valid critiques.
-3. Select the single best solution.
-4. Explain your reasoning and provide a confidence score.
-5. Provide the exact text of the winning answer.
+Choose the WINNER.""")
+    return prompt.build()
+
+VERIFICATION_INSTRUCTIONS = """You are a quick verifier for the intellectual game 'What? Where? When?'.
+
+Task: Check whether the proposed answer given below fits every clue and constraint of the question (number of words, wordplay, facts).
+Do not solve the question from scratch. If the answer fits, agree. If any clue contradicts it or a clearly better answer exists, disagree.
+Return agrees: true/false, a confidence score (0.0 - 1.0) and one or two sentences of reasoning.
+"""
+
+def get_verification_prompt(question, answer, explanation):
+    return VERIFICATION_INSTRUCTIONS + f"""
+**The Question:**
+{question}
+
+**Proposed Answer:** {answer}
+**Reasoning:** {explanation}"""
 
-Choose the WINNER."""
+EVALUATION_INSTRUCTIONS = """You are an objective evaluator for a QA system.
+
+Task: Determine if the System's Answer below is semantically correct based on the reference answer.
+Ignore minor phrasing differences, capitalization, or punctuation. Focus on the core meaning.
+Return your decision as a JSON object with:
+- question_number by integer: the number of the question below
+- is_correct: true/false
+"""
+
+BATCH_EVALUATION_INSTRUCTIONS = """You are an objective evaluator for a QA system.
+
+Task: For EACH candidate answer below, determine if it is semantically correct based on the reference answer.
+Judge every candidate independently.
+Ignore minor phrasing differences, capitalization, or punctuation. Focus on the core meaning.
+Return your decision as a JSON object with:
+- question_number by integer: the number of the question below
+- verdicts: one entry per candidate with its label exactly as shown in brackets (e.g. "A1") and is_correct: true/false
+"""
 
 def get_evaluation_prompt(q_num, question, correct, winning_ans):
-    return f"""You are an objective evaluator for a QA system.
-        
+    return EVALUATION_INSTRUCTIONS + f"""
 Question ({q_num}): {question}
 Correct Answer: {correct}
 
 System's Answer: {winning_ans}
+"""
 
-Task: Determine if the System's Answer is semantically correct based on the Correct Answer. 
-Ignore minor phrasing differences, capitalization, or punctuation. Focus on the core meaning.
-Return your decision as a JSON object with:
-- question_number by integer: {q_num}
-- is_correct: true/false
+def get_batch_evaluation_prompt(q_num, question, correct, candidates):
+    candidates_text = "\n".join([f"[{label}] {answer}" for label, answer in candidates])
+
+    return BATCH_EVALUATION_INSTRUCTIONS + f"""
+Question ({q_num}): {question}
+Correct Answer: {correct}
+
+Candidate Answers:
+{candidates_text}
 """
@@ -0,0 +1,160 @@
+"""
+Token-budgeted prompt assembly.
+When a prompt is over its budget, its lowest-priority parts are shortened or
+dropped first.
+"""
+
+import functools
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from rate_limiter import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+JUDGE = 'judge'
+FEEDBACK = 'feedback'
+
+DEFAULT_BUDGETS: Dict[str, Optional[int]] = {JUDGE: 8000, FEEDBACK: 4000}
+
+# Judge prompt parts, cut in this order: original explanations go first, refined explanations last
+ORIGINAL_EXPLANATION = 1
+PEER_CRITIQUE = 2
+CHANGE_RESPONSES = 3
+REFINED_EXPLANATION = 4
+
+MIN_EXCERPT_TOKENS = 32  # Below this a shortened part is dropped instead
+TRUNCATED = " [... shortened to fit the prompt budget]"
+OMITTED = "[omitted to fit the prompt budget]"
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Any:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The encoding file is downloaded on first use; offline we fall back to the estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PromptBuilder:
+    def __init__(self, kind: str, budget: Optional[int] = None):
+        self.kind = kind
+        self.budget = budget
+        self._parts: List[Tuple[str, Optional[int], Optional[str]]] = []  # (text, priority or None if fixed, label)
+
+    def add(self, text: str, priority: Optional[int] = None, label: Optional[str] = None) -> 'PromptBuilder':
+        self._parts.append((text, priority, label))
+        return self
+
+    def build(self) -> str:
+        texts = [text for text, _, _ in self._parts]
+        if not self.budget:
+            return "".join(texts)
+
+        tokens = [count_tokens(text) for text in texts]
+        before = sum(tokens)
+        excess = before - self.budget
+        cuts = []
+        for priority in sorted({p for _, p, _ in self._parts if p is not None}):
+            if excess <= 0:
+                break
+            indices = [i for i, (_, p, _) in enumerate(self._parts) if p == priority]
+            cap = _cap([tokens[i] for i in indices], excess)
+            for i in sorted(indices, key=lambda i: tokens[i], reverse=True):
+                if excess <= 0 or tokens[i] <= cap:
+                    break
+                texts[i] = _shorten(texts[i], tokens[i], cap)
+                shortened = count_tokens(texts[i])
+                excess -= tokens[i] - shortened
+                cuts.append((self._parts[i][2] or f"part {i}", texts[i] == OMITTED))
+                tokens[i] = shortened
+
+        if cuts:
+            _record(self.kind, before, sum(tokens), cuts)
+        return "".join(texts)
+
+
+def _cap(sizes: List[int], excess: int) -> int:
+    # Largest per-part cap that removes at least `excess` tokens, so the longest parts are cut first
+    low, high = 0, max(sizes)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if sum(max(0, size - mid) for size in sizes) >= excess:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _shorten(text: str, tokens: int, cap: int) -> str:
+    keep_tokens = cap - count_tokens(TRUNCATED)
+    if keep_tokens < MIN_EXCERPT_TOKENS:
+        return OMITTED
+    keep = int(len(text) * keep_tokens / tokens)
+    cut = text.rfind(" ", 0, keep)
+    return text[:cut if cut > keep // 2 else keep].rstrip() + TRUNCATED
+
+
+class _Stats:
+    def __init__(self):
+        self.prompts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.shortened = 0
+        self.dropped = 0
+
+
+_budgets: Dict[str, Optional[int]] = dict(DEFAULT_BUDGETS)
+_stats: Dict[str, _Stats] = defaultdict(_Stats)
+_lock = threading.Lock()
+
+
+def configure(budgets: Dict[str, Optional[int]]):
+    # 0 or None disables the budget for that kind of prompt
+    _budgets.update(budgets)
+
+
+def budget(kind: str) -> Optional[int]:
+    return _budgets.get(kind) or None
+
+
+def _record(kind: str, before: int, after: int, cuts: List[Tuple[str, bool]]):
+    dropped = [label for label, omitted in cuts if omitted]
+    shortened = [label for label, omitted in cuts if not omitted]
+    with _lock:
+        stats = _stats[kind]
+        stats.prompts += 1
+        stats.tokens_before += before
+        stats.tokens_after += after
+        stats.shortened += len(shortened)
+        stats.dropped += len(dropped)
+    print(f"Prompt budget: {kind} prompt {before} -> {after} tokens"
+          + (f"; shortened {', '.join(shortened)}" if shortened else "")
+          + (f"; dropped {', '.join(dropped)}" if dropped else ""))
+
+
+def summary() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        return {kind: dict(vars(stats)) for kind, stats in _stats.items()}
+
+
+def format_summary() -> str:
+    lines = []
+    for kind, stats in summary().items():
+        lines.append(f"Prompt budget ({kind}, {budget(kind)} tokens): {stats['prompts']} prompts cut from "
+                     f"{stats['tokens_before']} to {stats['tokens_after']} tokens, {stats['shortened']} parts "
+                     f"shortened, {stats['dropped']} dropped")
+    return "\n".join(lines)
@@ -0,0 +1,76 @@
+"""
+Lazy provider registry.
+Each provider's SDK is imported and its client built the first time a
+conversation calls that provider.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+import transport
+
+_factories: Dict[Tuple[str, bool], Callable[[], Any]] = {}
+_clients: Dict[Tuple[str, bool], Any] = {}
+_lock = threading.RLock()  # The async Gemini client is built from the sync one
+_env_loaded = False
+
+
+def register(provider: str, factory: Callable[[], Any], asynchronous: bool = False):
+    with _lock:
+        _factories[(provider, asynchronous)] = factory
+        _clients.pop((provider, asynchronous), None)
+
+
+def get_client(provider: str, asynchronous: bool = False) -> Any:
+    key = (provider, asynchronous)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        if key not in _clients:
+            if key not in _factories:
+                raise ValueError(f"No {'async ' if asynchronous else ''}client registered for provider {provider}")
+            _load_env()
+            _clients[key] = _factories[key]()
+        return _clients[key]
+
+
+def genai_types() -> Any:
+    # google.genai.types, for building Gemini request configs and history
+    from google.genai import types
+    return types
+
+
+def _load_env():
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def _openai() -> Any:
+    from openai import DefaultHttpxClient, OpenAI
+    return OpenAI(http_client=transport.http_client('OpenAI', DefaultHttpxClient))
+
+
+def _async_openai() -> Any:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(http_client=transport.http_client('OpenAI', DefaultAsyncHttpxClient, asynchronous=True))
+
+
+def _gemini() -> Any:
+    # One client serves both APIs: the async one is client.aio
+    import httpx
+    from google import genai
+    http_options = genai_types().HttpOptions(
+        httpx_client=transport.http_client('Gemini', httpx.Client, follow_redirects=True),
+        httpx_async_client=transport.http_client('Gemini', httpx.AsyncClient, asynchronous=True, follow_redirects=True)
+    )
+    return genai.Client(api_key=os.environ["GEMINI_API_KEY"], http_options=http_options)
+
+
+register('OpenAI', _openai)
+register('OpenAI', _async_openai, asynchronous=True)
+register('Gemini', _gemini)
+register('Gemini', lambda: get_client('Gemini').aio, asynchronous=True)
@@ -0,0 +1,193 @@
+"""
+Proactive per-provider, per-model rate limiting: every conversation reserves
+request and token capacity from a shared token bucket before calling the API.
+"""
+
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple, Any
+
+# Fraction of the published quota we actually use, to leave room for estimation error
+HEADROOM = 0.9
+
+# Without a configured quota there is no pacing until the provider reports its limits in x-ratelimit-* headers
+UNLIMITED = (1_000_000, 1_000_000_000)
+
+# (provider, model) -> (requests per minute, tokens per minute) of the free API tiers; applied with --free-tier
+FREE_TIER_LIMITS: Dict[Tuple[str, Optional[str]], Tuple[int, int]] = {
+    ('OpenAI', None): (500, 30_000),
+    ('OpenAI', 'gpt-4o'): (500, 30_000),
+    ('OpenAI', 'gpt-5-mini-2025-08-07'): (500, 200_000),
+    ('Gemini', None): (10, 250_000),
+    ('Gemini', 'gemini-2.5-flash'): (10, 250_000),
+    ('Gemini', 'gemini-2.0-flash-lite-001'): (30, 1_000_000),
+}
+
+# Rough output size reserved up front; corrected once the real usage is known
+EXPECTED_OUTPUT_TOKENS = 800
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose
+    return len(text) // 4 + 1
+
+
+def _parse_reset(value: str) -> Optional[float]:
+    # OpenAI reset headers look like "1s", "6m0s", "20ms" or "1h2m3.5s"
+    units = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        # Take the capacity immediately (the level may go negative) and return how long to wait for it
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain_until(self, seconds: float, now: float):
+        self._refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+    def observe(self, limit: Optional[float], remaining: Optional[float], reset_seconds: Optional[float], now: float):
+        self._refill(now)
+        if limit:
+            self.capacity = limit * HEADROOM
+            self.rate = self.capacity / 60.0
+        if remaining is not None:
+            # Trust the server when it reports less headroom than we think we have
+            available = remaining - (1.0 - HEADROOM) * (limit or self.capacity)
+            if available < self.level:
+                self.level = available
+                if available < 0 and reset_seconds:
+                    self.level = -reset_seconds * self.rate
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute * HEADROOM)
+        self.tokens = TokenBucket(tokens_per_minute * HEADROOM)
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens: int) -> float:
+        # Returns the number of seconds the caller must wait before sending
+        with self._lock:
+            now = time.monotonic()
+            return max(self.requests.reserve(1, now), self.tokens.reserve(estimated_tokens, now))
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if actual_tokens is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if actual_tokens > estimated_tokens:
+                self.tokens.reserve(actual_tokens - estimated_tokens, now)
+            else:
+                self.tokens.refund(estimated_tokens - actual_tokens, now)
+
+    def release(self, estimated_tokens: int):
+        # Returns a reservation whose request was rejected with a 429, so the retry does not pay for it twice
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refund(1, now)
+            self.tokens.refund(estimated_tokens, now)
+
+    def penalize(self, retry_after: Optional[float] = None):
+        # A 429 means our view of the quota is too optimistic: stop everyone sharing this limiter
+        with self._lock:
+            now = time.monotonic()
+            seconds = retry_after if retry_after is not None else 1.0
+            self.requests.drain_until(seconds, now)
+            self.tokens.drain_until(seconds, now)
+
+    def update_from_headers(self, headers: Any):
+        if not headers:
+            return
+
+        def header(name):
+            value = headers.get(name)
+            return value if value not in (None, '') else None
+
+        def number(name):
+            value = header(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        def reset(name):
+            value = header(name)
+            return _parse_reset(value) if value is not None else None
+
+        with self._lock:
+            now = time.monotonic()
+            self.requests.observe(number('x-ratelimit-limit-requests'),
+                                  number('x-ratelimit-remaining-requests'),
+                                  reset('x-ratelimit-reset-requests'), now)
+            self.tokens.observe(number('x-ratelimit-limit-tokens'),
+                                number('x-ratelimit-remaining-tokens'),
+                                reset('x-ratelimit-reset-tokens'), now)
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_configured: Dict[Tuple[str, Optional[str]], Tuple[int, int]] = {}
+_registry_lock = threading.Lock()
+
+
+def configure(api_provider: str, model: Optional[str], requests_per_minute: int, tokens_per_minute: int):
+    # model=None sets the default for every model of the provider
+    with _registry_lock:
+        _configured[(api_provider, model)] = (requests_per_minute, tokens_per_minute)
+        for key in list(_limiters):
+            if key[0] == api_provider and (model is None or key[1] == model):
+                del _limiters[key]
+
+
+def configure_free_tier():
+    for (api_provider, model), (rpm, tpm) in FREE_TIER_LIMITS.items():
+        configure(api_provider, model, rpm, tpm)
+
+
+def get_limiter(api_provider: str, model: str) -> RateLimiter:
+    key = (api_provider, model)
+    with _registry_lock:
+        if key not in _limiters:
+            limits = _configured.get(key) or _configured.get((api_provider, None)) or UNLIMITED
+            _limiters[key] = RateLimiter(*limits)
+        return _limiters[key]
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    return _parse_reset(value) if value is not None else None
@@ -0,0 +1,152 @@
+"""
+Persistent, content-addressed cache for structured LLM responses, keyed by
+provider, model, schema, prompt and a fingerprint of the conversation history.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+BYPASS = 'bypass'                # Neither read nor write
+READ_ONLY = 'read_only'          # Serve hits, never store new responses
+WRITE_THROUGH = 'write_through'  # Serve hits and store every new response
+
+
+def history_fingerprint(turns: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha256()
+    for user_text, model_text in turns:
+        digest.update(user_text.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(model_text.encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def schema_fingerprint(schema: Any) -> str:
+    # Name plus JSON schema, so changing a field invalidates the old entries
+    schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+    return f"{schema.__name__}:{hashlib.sha256(schema_json.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ResponseCache:
+    def __init__(self, path: str = ".llm_cache.sqlite", mode: str = WRITE_THROUGH,
+                 max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        if mode not in (BYPASS, READ_ONLY, WRITE_THROUGH):
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                schema TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        # Sets the running total of payload sizes that every write checks against max_bytes
+        self._evict()
+
+    @staticmethod
+    def make_key(api_provider: str, model: str, schema: Any, prompt: str, history: str) -> str:
+        digest = hashlib.sha256()
+        for part in (api_provider, model, schema_fingerprint(schema), prompt, history):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str, schema: Any) -> Optional[Any]:
+        if self.mode == BYPASS:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT payload, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1]):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return schema.model_validate_json(row[0])
+
+    def put(self, key: str, schema: Any, value: Any):
+        if self.mode != WRITE_THROUGH:
+            return
+        payload = value.model_dump_json()
+        now = time.time()
+        with self._lock:
+            replaced = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, schema, payload, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, schema.__name__, payload, len(payload), now, now)
+            )
+            self._size += len(payload) - (replaced[0] if replaced else 0)
+            if self.max_bytes is not None and self._size > self.max_bytes:
+                self._evict()
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._db.close()
+
+    def _expired(self, created: float) -> bool:
+        return self.max_age_days is not None and created < time.time() - self.max_age_days * 86400
+
+    def _evict(self):
+        if self.max_age_days is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_days * 86400,))
+        self._size = self._total_size()
+        if self.max_bytes is None:
+            return
+
+        excess = self._size - self.max_bytes
+        if excess <= 0:
+            return
+        # Least recently used first
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._size = self._total_size()
+
+    def _total_size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def configure(path: str = ".llm_cache.sqlite", mode: str = WRITE_THROUGH,
+              max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> Optional[ResponseCache]:
+    # Installs the process-wide cache used by every conversation; BYPASS disables it
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None if mode == BYPASS else ResponseCache(path, mode, max_bytes, max_age_days)
+    return _cache
+
+
+def get_cache() -> Optional[ResponseCache]:
+    return _cache
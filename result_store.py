@@ -0,0 +1,156 @@
+"""
+Append-only JSONL result store with an "id<TAB>offset" index.
+Records are appended in completion order; ids() and export_json() are sorted by
+id. A partial last line left by a crash is truncated on the next open.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ResultStore:
+    def __init__(self, path: str = "results.jsonl", index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self._offsets: Dict[int, int] = {}
+        self._open()
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def ids(self) -> List[int]:
+        return sorted(self._offsets)
+
+    def append(self, record: Dict[str, Any]):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_index([(record['id'], offset)])
+        self._offsets[record['id']] = offset
+
+    def get(self, question_id: int) -> Optional[Dict[str, Any]]:
+        offset = self._offsets.get(question_id)
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        # File order; a re-appended id only yields its latest record
+        live = set(self._offsets.values())
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if offset in live:
+                    yield json.loads(line)
+                offset += len(line)
+
+    def export_json(self, output_path: str):
+        # Legacy results.json (a list sorted by id, indent=2) for evaluate.py and older tools
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("[")
+            for n, question_id in enumerate(self.ids()):
+                body = json.dumps(self.get(question_id), indent=2)
+                f.write(("," if n else "") + "\n  " + body.replace("\n", "\n  "))
+            f.write("\n]" if self._offsets else "]")
+        os.replace(tmp_path, output_path)
+
+    def import_json(self, legacy_path: str) -> int:
+        # One-off migration from a legacy results.json
+        with open(legacy_path, "r") as f:
+            records = json.load(f)
+        for record in records:
+            if record['id'] not in self:
+                self.append(record)
+        return len(records)
+
+    def _open(self):
+        if not os.path.exists(self.path):
+            open(self.path, "ab").close()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+
+        scan_from = 0
+        if os.path.exists(self.index_path):
+            self._offsets = self._read_index()
+            if self._offsets:
+                last_offset = max(self._offsets.values())
+                if self._valid_record_at(last_offset):
+                    scan_from = last_offset
+                else:
+                    # Index and data disagree: rebuild from scratch
+                    self._offsets = {}
+                    os.remove(self.index_path)
+
+        self._recover_tail(scan_from)
+
+    def _read_index(self) -> Dict[int, int]:
+        offsets = {}
+        torn = False
+        with open(self.index_path, "r") as f:
+            for line in f:
+                parts = line.split("\t")
+                if len(parts) != 2 or not line.endswith("\n"):
+                    torn = True  # Torn write at the end of the index
+                    break
+                offsets[int(parts[0])] = int(parts[1])
+
+        if torn:
+            # Rewrite the good prefix so later appends do not glue onto the torn line
+            os.remove(self.index_path)
+            self._write_index(offsets.items())
+        return offsets
+
+    def _valid_record_at(self, offset: int) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            line = f.readline()
+        if not line.endswith(b"\n"):
+            return False
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return False
+        return self._offsets.get(record.get('id')) == offset
+
+    def _recover_tail(self, scan_from: int):
+        # Index any complete records written after the last indexed one and cut off a torn last line
+        recovered = []
+        with open(self.path, "rb") as f:
+            f.seek(scan_from)
+            offset = scan_from
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except json.JSONDecodeError:
+                    record = None
+                if record is None:
+                    break
+                if self._offsets.get(record['id']) != offset:
+                    recovered.append((record['id'], offset))
+                offset += len(line)
+
+        if offset < os.path.getsize(self.path):
+            print(f"Truncating incomplete record at byte {offset} of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+        if recovered:
+            self._write_index(recovered)
+            self._offsets.update(recovered)
+
+    def _write_index(self, entries):
+        with open(self.index_path, "a") as f:
+            f.write("".join(f"{question_id}\t{offset}\n" for question_id, offset in entries))
+            f.flush()
+            os.fsync(f.fileno())
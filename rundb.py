@@ -0,0 +1,417 @@
+"""
+Indexed SQLite database of debate runs, imported from result and evaluation files.
+
+    python rundb.py import baseline=. cascade=runs/cascade
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import analytics
+from answer_matcher import normalize
+
+DEFAULT_PATH = "runs.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    results_path TEXT,
+    evaluation_path TEXT,
+    imported_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    question TEXT,
+    correct_answer TEXT,             -- JSON list when several answers are accepted
+    is_correct INTEGER,              -- Final answer graded correct; NULL when not evaluated
+    early_exit INTEGER NOT NULL,
+    judge_model TEXT,
+    cascade_tier INTEGER,            -- NULL when the cascade was off
+    cascade_model TEXT,
+    cascade_answer TEXT,
+    cascade_confidence REAL,
+    cascade_escalation TEXT,
+    calls INTEGER,
+    input_tokens INTEGER,
+    cached_tokens INTEGER,
+    output_tokens INTEGER,
+    cost_usd REAL,
+    PRIMARY KEY (run_id, question_id)
+);
+CREATE TABLE IF NOT EXISTS solutions (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    solver_id TEXT NOT NULL,
+    model TEXT,
+    answer TEXT,
+    explanation TEXT,
+    confidence REAL,
+    PRIMARY KEY (run_id, question_id, solver_id)
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    reviewer_id TEXT NOT NULL,
+    solver_id TEXT NOT NULL,         -- The reviewed solution
+    overall_assessment TEXT,
+    strengths TEXT,                  -- JSON lists
+    weaknesses TEXT,
+    errors TEXT,
+    suggested_changes TEXT,
+    error_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS refinements (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    solver_id TEXT NOT NULL,
+    model TEXT,
+    answer TEXT,
+    explanation TEXT,
+    confidence REAL,
+    changes TEXT,                    -- JSON list of {critique, response, accepted}
+    accepted_changes INTEGER,
+    rejected_changes INTEGER,
+    PRIMARY KEY (run_id, question_id, solver_id)
+);
+CREATE TABLE IF NOT EXISTS verdicts (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    winner TEXT,
+    winner_model TEXT,
+    winning_answer TEXT,
+    normalized_answer TEXT,
+    confidence REAL,
+    reasoning TEXT,
+    PRIMARY KEY (run_id, question_id)
+);
+CREATE TABLE IF NOT EXISTS grades (
+    run_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    solver_id TEXT NOT NULL,
+    model TEXT,
+    phase TEXT NOT NULL,             -- initial, refined or cascade
+    answer TEXT,
+    normalized_answer TEXT,
+    is_correct INTEGER NOT NULL,
+    decided_by TEXT
+);
+CREATE INDEX IF NOT EXISTS questions_correct ON questions(run_id, is_correct);
+CREATE INDEX IF NOT EXISTS solutions_model ON solutions(model, solver_id);
+CREATE INDEX IF NOT EXISTS feedback_question ON feedback(run_id, question_id, solver_id);
+CREATE INDEX IF NOT EXISTS refinements_model ON refinements(model, solver_id);
+CREATE INDEX IF NOT EXISTS grades_question ON grades(run_id, question_id, phase, solver_id);
+CREATE INDEX IF NOT EXISTS grades_model ON grades(model, phase, solver_id, is_correct);
+CREATE INDEX IF NOT EXISTS grades_solver ON grades(solver_id, phase, is_correct);
+CREATE INDEX IF NOT EXISTS grades_correct ON grades(run_id, phase, is_correct);
+CREATE INDEX IF NOT EXISTS grades_votes ON grades(run_id, phase, question_id, normalized_answer, is_correct);
+
+-- One row per distinct initial answer to a question, in the order they were first given
+CREATE VIEW IF NOT EXISTS initial_votes AS
+SELECT run_id, question_id, normalized_answer, COUNT(*) AS votes, MIN(rowid) AS first_vote,
+       MAX(is_correct) AS is_correct
+FROM grades WHERE phase = 'initial'
+GROUP BY run_id, question_id, normalized_answer;
+
+-- The majority initial answer per question; ties go to the answer given first
+CREATE VIEW IF NOT EXISTS majority_answers AS
+SELECT run_id, question_id, normalized_answer, votes, is_correct FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY run_id, question_id ORDER BY votes DESC, first_vote) AS position
+    FROM initial_votes
+) WHERE position = 1;
+
+CREATE VIEW IF NOT EXISTS initial_agreement AS
+SELECT run_id, question_id, COUNT(*) AS answers, COUNT(DISTINCT normalized_answer) AS distinct_answers
+FROM grades WHERE phase = 'initial'
+GROUP BY run_id, question_id;
+"""
+
+# Fill in each graded answer's model from the solver that gave it
+_GRADE_MODELS = """
+UPDATE grades SET model = COALESCE(
+    (SELECT model FROM solutions s
+     WHERE s.run_id = grades.run_id AND s.question_id = grades.question_id AND s.solver_id = grades.solver_id),
+    (SELECT cascade_model FROM questions q
+     WHERE q.run_id = grades.run_id AND q.question_id = grades.question_id AND grades.phase = 'cascade'))
+WHERE run_id = :run
+"""
+_REFINEMENT_MODELS = """
+UPDATE refinements SET model = (SELECT model FROM solutions s WHERE s.run_id = refinements.run_id
+                                AND s.question_id = refinements.question_id AND s.solver_id = refinements.solver_id)
+WHERE run_id = :run
+"""
+_VERDICT_MODELS = """
+UPDATE verdicts SET winner_model = (SELECT model FROM solutions s WHERE s.run_id = verdicts.run_id
+                                    AND s.question_id = verdicts.question_id AND s.solver_id = verdicts.winner)
+WHERE run_id = :run
+"""
+
+_QUESTION_TABLES = ('questions', 'solutions', 'feedback', 'refinements', 'verdicts')
+
+
+class RunDB:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self) -> 'RunDB':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def query(self, sql: str, params: Any = ()) -> sqlite3.Cursor:
+        return self._db.execute(sql, params)
+
+    def runs(self) -> List[Tuple[str, int, float]]:
+        # (name, questions, imported_at), oldest first
+        return self._db.execute("""
+            SELECT name, (SELECT COUNT(*) FROM questions q WHERE q.run_id = runs.run_id), imported_at
+            FROM runs ORDER BY imported_at
+        """).fetchall()
+
+    def run_id(self, name: Optional[str] = None) -> int:
+        # The latest run when no name is given
+        if name is None:
+            row = self._db.execute("SELECT run_id FROM runs ORDER BY imported_at DESC LIMIT 1").fetchone()
+        else:
+            row = self._db.execute("SELECT run_id FROM runs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"No run named {name} in {self.path}" if name else f"{self.path} holds no runs")
+        return row[0]
+
+    def import_run(self, name: str, results_path: str, evaluation_path: str) -> int:
+        # Replaces an earlier import under the same name; returns the number of questions
+        self._db.execute("BEGIN")
+        try:
+            existing = self._db.execute("SELECT run_id FROM runs WHERE name = ?", (name,)).fetchone()
+            if existing:
+                for table in _QUESTION_TABLES + ('grades', 'runs'):
+                    self._db.execute(f"DELETE FROM {table} WHERE run_id = ?", existing)
+            run_id = self._db.execute(
+                "INSERT INTO runs (name, results_path, evaluation_path, imported_at) VALUES (?, ?, ?, ?)",
+                (name, results_path, evaluation_path, time.time())
+            ).lastrowid
+
+            seen = set()
+            for record in analytics.iter_records(results_path):
+                if record['id'] in seen:
+                    # A re-appended question (results.jsonl) replaces the earlier record
+                    for table in _QUESTION_TABLES:
+                        self._db.execute(f"DELETE FROM {table} WHERE run_id = ? AND question_id = ?",
+                                         (run_id, record['id']))
+                seen.add(record['id'])
+                self._insert_result(run_id, record)
+
+            for entry in analytics.iter_records(evaluation_path):
+                self._insert_evaluation(run_id, entry)
+            # Evaluations of questions missing from the results are not part of the run
+            self._db.execute("DELETE FROM grades WHERE run_id = :run AND question_id NOT IN "
+                             "(SELECT question_id FROM questions WHERE run_id = :run)", {"run": run_id})
+            for statement in (_GRADE_MODELS, _REFINEMENT_MODELS, _VERDICT_MODELS):
+                self._db.execute(statement, {"run": run_id})
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return len(seen)
+
+    def _insert_result(self, run_id: int, record: Dict[str, Any]):
+        question_id = record['id']
+        output = record.get('process_output') or {}
+        cascade = output.get('cascade') or {}
+        usage = record.get('usage') or {}
+        self._db.execute("""
+            INSERT INTO questions (run_id, question_id, question, correct_answer, early_exit, judge_model,
+                                   cascade_tier, cascade_model, cascade_answer, cascade_confidence, cascade_escalation,
+                                   calls, input_tokens, cached_tokens, output_tokens, cost_usd)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (run_id, question_id, record.get('question'), _text(record.get('correct_answer')),
+              bool(output.get('early_exit')), (record.get('roles') or {}).get('judge'),
+              cascade.get('tier'), cascade.get('model'), cascade.get('answer'), cascade.get('confidence'),
+              cascade.get('escalation'), usage.get('calls'), usage.get('input_tokens'), usage.get('cached_tokens'),
+              usage.get('output_tokens'), usage.get('cost_usd')))
+
+        self._db.executemany("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (run_id, question_id, solution['solver_id'], solution['model'], solution['response'].get('answer'),
+             solution['response'].get('explanation'), solution['response'].get('confidence'))
+            for solution in output.get('initial_solutions') or []
+        ])
+        self._db.executemany("INSERT INTO feedback VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             list(_feedback_rows(run_id, question_id, output.get('peer_feedbacks') or [])))
+        self._db.executemany("INSERT OR REPLACE INTO refinements VALUES (?, ?, ?, NULL, ?, ?, ?, ?, ?, ?)", [
+            (run_id, question_id, refined['solver_id'], response.get('refined_answer'),
+             response.get('refined_solution'), response.get('confidence'), json.dumps(response.get('changes_made', [])),
+             sum(bool(change.get('accepted')) for change in response.get('changes_made', [])),
+             sum(not change.get('accepted') for change in response.get('changes_made', [])))
+            for refined in output.get('refined_solutions') or []
+            for response in [refined['refined_response']]
+        ])
+        verdict = output.get('final_verdict')
+        if verdict:
+            self._db.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, NULL, ?, ?, ?, ?)", (
+                run_id, question_id, verdict.get('winner'), verdict.get('winning_answer'),
+                normalize(verdict.get('winning_answer') or ""), verdict.get('confidence'), verdict.get('reasoning')
+            ))
+
+    def _insert_evaluation(self, run_id: int, entry: Dict[str, Any]):
+        question_id = entry['question_number']
+        self._db.execute("UPDATE questions SET is_correct = ? WHERE run_id = ? AND question_id = ?",
+                         (bool(entry.get('is_correct', False)), run_id, question_id))
+        self._db.execute("DELETE FROM grades WHERE run_id = ? AND question_id = ?", (run_id, question_id))
+        self._db.executemany("INSERT INTO grades VALUES (?, ?, ?, NULL, ?, ?, ?, ?, ?)", [
+            (run_id, question_id, detail['solver_id'], detail['type'], detail['answer'], normalize(detail['answer']),
+             bool(detail['is_correct']), detail.get('decided_by'))
+            for detail in entry.get('solver_details', []) if detail['type'] in analytics.PHASES
+        ])
+
+    def metrics(self, name: Optional[str] = None) -> Dict[str, Any]:
+        # The same metrics as analytics.metrics, as queries
+        run = {"run": self.run_id(name)}
+        questions, system_correct, early_exits, cost = self._db.execute("""
+            SELECT COUNT(*), COALESCE(SUM(is_correct = 1), 0), COALESCE(SUM(early_exit AND is_correct IS NOT NULL), 0),
+                   COALESCE(SUM(cost_usd), 0.0)
+            FROM questions WHERE run_id = :run
+        """, run).fetchone()
+        phases = {phase: (correct, count) for phase, correct, count in self._db.execute(
+            "SELECT phase, SUM(is_correct), COUNT(*) FROM grades WHERE run_id = :run GROUP BY phase", run)}
+        pairs, improved, regressed = self._db.execute("""
+            SELECT COUNT(*), COALESCE(SUM(NOT i.is_correct AND r.is_correct), 0),
+                   COALESCE(SUM(i.is_correct AND NOT r.is_correct), 0)
+            FROM grades i JOIN grades r
+              ON r.run_id = i.run_id AND r.question_id = i.question_id AND r.solver_id = i.solver_id
+             AND r.phase = 'refined'
+            WHERE i.run_id = :run AND i.phase = 'initial'
+        """, run).fetchone()
+        voting_correct, = self._db.execute(
+            "SELECT COALESCE(SUM(is_correct), 0) FROM majority_answers WHERE run_id = :run", run).fetchone()
+        consensus, disagreements, judge_correct = self._db.execute("""
+            SELECT COALESCE(SUM(a.answers >= 2 AND a.distinct_answers = 1), 0),
+                   COALESCE(SUM(a.answers >= 2 AND a.distinct_answers > 1), 0),
+                   COALESCE(SUM(a.answers >= 2 AND a.distinct_answers > 1 AND q.is_correct = 1), 0)
+            FROM initial_agreement a JOIN questions q ON q.run_id = a.run_id AND q.question_id = a.question_id
+            WHERE a.run_id = :run
+        """, run).fetchone()
+
+        total = questions or 1
+        initial, refined = phases.get('initial', (0, 0)), phases.get('refined', (0, 0))
+        return {
+            "questions": questions,
+            "system_correct": system_correct,
+            "system_accuracy": analytics.percent(system_correct, total),
+            "initial_accuracy": analytics.percent(*initial),
+            "refined_accuracy": analytics.percent(*refined),
+            "voting_correct": voting_correct,
+            "voting_accuracy": analytics.percent(voting_correct, total),
+            "consensus": consensus,
+            "consensus_rate": analytics.percent(consensus, total),
+            "early_exits": early_exits,
+            "disagreements": disagreements,
+            "judge_correct_disagreement": judge_correct,
+            "judge_efficacy": analytics.percent(judge_correct, disagreements),
+            "solver_pairs": pairs,
+            "improved": improved,
+            "regressed": regressed,
+            "improvement_rate": analytics.percent(improved, pairs),
+            "regression_rate": analytics.percent(regressed, pairs),
+            "cost_usd": cost,
+        }
+
+    def cascade_tiers(self, name: Optional[str] = None) -> Dict[int, List[Any]]:
+        tiers = {1: [0, 0, 0.0], 2: [0, 0, 0.0]}
+        for tier, count, correct, cost in self._db.execute("""
+            SELECT cascade_tier, COUNT(*), SUM(is_correct), COALESCE(SUM(cost_usd), 0.0) FROM questions
+            WHERE run_id = ? AND cascade_tier IS NOT NULL AND is_correct IS NOT NULL GROUP BY cascade_tier
+        """, (self.run_id(name),)):
+            tiers[tier] = [count, correct, cost]
+        return tiers
+
+    def threshold_table(self, name: Optional[str] = None,
+                        thresholds: Tuple[float, ...] = analytics.CASCADE_THRESHOLDS) -> Tuple[List[Any], int]:
+        # (analytics.threshold_table rows, graded cascade answers)
+        run_id = self.run_id(name)
+        answered, = self._db.execute("SELECT COUNT(*) FROM grades WHERE run_id = ? AND phase = 'cascade'",
+                                     (run_id,)).fetchone()
+        rows = []
+        for threshold in thresholds if answered else ():
+            accepted, correct = self._db.execute("""
+                SELECT COUNT(*), SUM(g.is_correct) FROM grades g
+                JOIN questions q ON q.run_id = g.run_id AND q.question_id = g.question_id
+                WHERE g.run_id = ? AND g.phase = 'cascade' AND q.cascade_confidence >= ?
+            """, (run_id, threshold)).fetchone()
+            rows.append((threshold, accepted, analytics.percent(correct, accepted) if accepted else None))
+        return rows, answered
+
+    def breakdown(self, name: Optional[str] = None, by: str = 'model') -> Dict[str, Dict[str, Tuple[int, int]]]:
+        column = {'model': 'model', 'solver': 'solver_id'}[by]
+        rows: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for key, phase, correct, count in self._db.execute(f"""
+            SELECT {column}, phase, SUM(is_correct), COUNT(*) FROM grades
+            WHERE run_id = ? AND {column} IS NOT NULL GROUP BY {column}, phase ORDER BY MIN(rowid)
+        """, (self.run_id(name),)):
+            rows.setdefault(key, {})[phase] = (correct, count)
+        return rows
+
+    def flips(self, baseline: str, name: str) -> Dict[str, int]:
+        common, fixed, broken = self._db.execute("""
+            SELECT COUNT(*), COALESCE(SUM(NOT a.is_correct AND b.is_correct), 0),
+                   COALESCE(SUM(a.is_correct AND NOT b.is_correct), 0)
+            FROM questions a JOIN questions b ON b.question_id = a.question_id
+            WHERE a.run_id = ? AND b.run_id = ? AND a.is_correct IS NOT NULL AND b.is_correct IS NOT NULL
+        """, (self.run_id(baseline), self.run_id(name))).fetchone()
+        return {"common": common, "fixed": fixed, "broken": broken}
+
+    def compare(self, names: List[str]) -> str:
+        return analytics.format_comparison(names, [self.metrics(name) for name in names],
+                                           [self.flips(names[0], name) for name in names[1:]])
+
+
+def _text(value: Any) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _feedback_rows(run_id: int, question_id: Any, peer_feedbacks: List[Dict[str, Any]]) -> Iterator[Tuple]:
+    for review in peer_feedbacks:
+        for item in (review.get('feedbacks') or {}).get('feedbacks', []):
+            evaluation = item.get('evaluation') or {}
+            yield (run_id, question_id, review['reviewer_id'], item.get('solution_id'), item.get('overall_assessment'),
+                   json.dumps(evaluation.get('strengths', [])), json.dumps(evaluation.get('weaknesses', [])),
+                   json.dumps(evaluation.get('errors', [])), json.dumps(evaluation.get('suggested_changes', [])),
+                   len(evaluation.get('errors', [])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed SQLite database of debate runs")
+    parser.add_argument("--db", default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import runs, replacing earlier imports with the same name")
+    import_parser.add_argument("runs", nargs="+", metavar="[NAME=]RUN",
+                               help="A directory holding the result and evaluation files, or RESULTS,EVALUATION")
+    commands.add_parser("runs", help="List the imported runs")
+    sql_parser = commands.add_parser("sql", help="Run a query and print the rows")
+    sql_parser.add_argument("query")
+    args = parser.parse_args()
+
+    with RunDB(args.db) as db:
+        if args.command == "import":
+            for spec in args.runs:
+                name, results_path, evaluation_path = analytics.run_paths(spec)
+                start = time.perf_counter()
+                count = db.import_run(name, results_path, evaluation_path)
+                print(f"Imported {count} questions as {name} in {time.perf_counter() - start:.2f} s")
+        elif args.command == "runs":
+            for name, count, imported_at in db.runs():
+                print(f"{name:<24}{count:>8} questions  imported {time.strftime('%Y-%m-%d %H:%M', time.localtime(imported_at))}")
+        else:
+            cursor = db.query(args.query)
+            print("\t".join(column[0] for column in cursor.description or []))
+            for row in cursor:
+                print("\t".join("" if value is None else str(value) for value in row))
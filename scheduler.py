@@ -0,0 +1,105 @@
+"""
+Cross-question scheduler: runs the debates for many questions concurrently.
+Each question gets its own forked conversations, so concurrent debates never
+interleave turns in a shared chat history.
+"""
+
+import asyncio
+from typing import List, Dict, Any, Optional, Set, Callable, Tuple
+from agents import Solver, Judge
+from checkpoint import Checkpoints
+from collaboration import Cascade, bind_roles, describe_roles, run_collaborative_solving_async, select_roles_async
+from history import HistoryPolicy
+import accounting
+import tracing
+
+
+def fork_roles(judge: Optional[Judge], solvers: List[Solver], history_policy: Optional[HistoryPolicy] = None):
+    q_judge = Judge(judge.model_name, judge.conversation.fork(history_policy)) if judge else None
+    q_solvers = [Solver(s.model_name, s.conversation.fork(history_policy), s.solver_id) for s in solvers]
+    return q_judge, q_solvers
+
+
+def agent_conversations(judge: Optional[Judge], solvers: List[Solver]) -> List[Any]:
+    return [a.conversation for a in ([judge] if judge else []) + solvers]
+
+
+async def debate_question(i: int, item: Dict[str, Any], judge: Optional[Judge], solvers: List[Solver],
+                          on_result: Callable[[Dict[str, Any]], None], early_exit_confidence: Optional[float] = None,
+                          cascade: Optional[Cascade] = None, models: Optional[List[Tuple[str, Any]]] = None,
+                          dataflow: bool = False, checkpoints: Optional[Checkpoints] = None) -> bool:
+    # Debates one question and records it; False when it failed or the hard budget stopped it.
+    # With checkpoints, a failed question resumes from its last completed phase on the next attempt.
+    ledger = accounting.get_ledger()
+    if ledger.state == accounting.HARD:
+        print(f"Skipping Question {i}: hard budget reached")
+        return False
+
+    question_text = item['question']
+    print(f"\n\n>>> STARTING QUESTION {i}: {question_text[:50]}...")
+    # Past the soft budget, new questions carry no history from role selection
+    history_policy = HistoryPolicy.per_question() if ledger.state == accounting.SOFT else None
+    checkpoint = checkpoints.question(i, question_text) if checkpoints else None
+    try:
+        with tracing.question(i):
+            initial_answers = None
+            if models is None:
+                q_judge, q_solvers = fork_roles(judge, solvers, history_policy)
+                lines = list(zip(agent_conversations(judge, solvers), agent_conversations(q_judge, q_solvers)))
+            else:
+                forks = [(name, conv.fork(history_policy)) for name, conv in models]
+                lines = [(conv, fork) for (_, conv), (_, fork) in zip(models, forks)]
+                # A checkpoint's initial answers were given under its own per-question roles
+                resumed_roles = bind_roles(checkpoint.roles, forks) if checkpoint and checkpoint.roles else None
+                if resumed_roles:
+                    q_judge, q_solvers = resumed_roles
+                else:
+                    q_judge, q_solvers, initial_answers = await select_roles_async(question_text, forks)
+            process_output = await run_collaborative_solving_async(question_text, q_judge, q_solvers,
+                                                                    early_exit_confidence, cascade,
+                                                                    initial_answers, dataflow, checkpoint)
+    except Exception as e:
+        print(f"Question {i} failed: {e}")
+        return False
+
+    on_result({
+        "id": i,
+        "question": question_text,
+        "correct_answer": item['answer'],
+        "process_output": process_output,
+        "roles": describe_roles(q_judge, q_solvers),
+        "usage": ledger.question_usage(i)
+    })
+    # Later questions' forks carry this one's turns under the full and last_k policies
+    for parent, fork in lines:
+        parent.absorb(fork)
+    if checkpoint:
+        checkpoint.discard()
+    return True
+
+
+async def run_questions(questions_data: List[Dict[str, Any]], judge: Optional[Judge], solvers: List[Solver],
+                        processed_ids: Set[int], on_result: Callable[[Dict[str, Any]], None],
+                        max_in_flight: int = 4, early_exit_confidence: Optional[float] = None,
+                        cascade: Optional[Cascade] = None, models: Optional[List[Tuple[str, Any]]] = None,
+                        dataflow: bool = False, checkpoints: Optional[Checkpoints] = None) -> List[int]:
+    # Returns the ids of questions that failed; they are not recorded and will be retried on resume.
+    # With models, roles are chosen per question and judge/solvers are ignored.
+    in_flight = asyncio.Semaphore(max_in_flight)
+    failed_ids = []
+
+    async def process(i: int, item: Dict[str, Any]):
+        async with in_flight:
+            if not await debate_question(i, item, judge, solvers, on_result, early_exit_confidence,
+                                         cascade, models, dataflow, checkpoints):
+                failed_ids.append(i)
+
+    tasks = []
+    for i, item in enumerate(questions_data, 1):
+        if i in processed_ids:
+            print(f"Skipping Question {i} (already processed)")
+            continue
+        tasks.append(process(i, item))
+
+    await asyncio.gather(*tasks)
+    return sorted(failed_ids)
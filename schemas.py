@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List
 
 class RoleConfidenceEntry(BaseModel):
@@ -13,6 +13,20 @@ class RolePreference(BaseModel):
 class SolverResponse(BaseModel):
     answer: str
     explanation: str
+    confidence: float = Field(description="Confidence score between 0.0 and 1.0")
+
+    @model_validator(mode='before')
+    @classmethod
+    def _legacy_confidence(cls, data):
+        # Records written before confidence was added still load, as 0.0 so no confidence gate passes on them.
+        # A validator rather than a default, so the schema sent to the models keeps the field required.
+        if isinstance(data, dict) and 'confidence' not in data:
+            data = {**data, 'confidence': 0.0}
+        return data
+
+class SolverResponseWithRoles(SolverResponse):
+    # Initial solve that also reports role confidence, for per-question role selection
+    confidence_by_role: List[RoleConfidenceEntry]
 
 class ErrorDetail(BaseModel):
     location: str
@@ -51,6 +65,19 @@ class FinalDecision(BaseModel):
     confidence: float
     reasoning: str
 
+class VerificationResult(BaseModel):
+    agrees: bool
+    confidence: float = Field(description="Confidence score between 0.0 and 1.0")
+    reasoning: str
+
 class EvaluationResult(BaseModel):
     question_number: int
-    is_correct: bool
\ No newline at end of file
+    is_correct: bool
+
+class CandidateVerdict(BaseModel):
+    label: str
+    is_correct: bool
+
+class BatchEvaluationResult(BaseModel):
+    question_number: int
+    verdicts: List[CandidateVerdict]
@@ -0,0 +1,244 @@
+"""
+Sharded runs over a shared directory.
+Workers claim question ids from a locked work queue with leases and append to
+their own result shards, which are merged once the queue is drained.
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+import accounting
+from result_store import ResultStore
+
+QUEUE_FILE = "queue.json"
+SHARD_PREFIX = "results-"
+SHARD_SUFFIX = ".jsonl"
+
+DEFAULT_LEASE_SECONDS = 300.0  # Keep well above the clock skew between machines
+MAX_ATTEMPTS = 3               # Claims per question before it is left for the next run
+POLL_SECONDS = 5.0             # How often an idle worker checks for expired leases
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    with open(path, "a+") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_path(directory: str, worker: str) -> str:
+    return os.path.join(directory, f"{SHARD_PREFIX}{worker}{SHARD_SUFFIX}")
+
+
+def shard_paths(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, f"{SHARD_PREFIX}*{SHARD_SUFFIX}")))
+
+
+def indexed_ids(store_path: str) -> List[int]:
+    # Ids in a shard's index, read without opening the store (which could repair a file another worker is appending to)
+    ids = []
+    if os.path.exists(store_path + ".idx"):
+        with open(store_path + ".idx", "r") as f:
+            for line in f:
+                if line.endswith("\n") and "\t" in line:
+                    ids.append(int(line.split("\t")[0]))
+    return ids
+
+
+class WorkQueue:
+    def __init__(self, directory: str, question_count: int, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, QUEUE_FILE)
+        self.lock_path = self.path + ".lock"
+        self.question_count = question_count
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._thread_lock = threading.Lock()  # fcntl locks are per process, so threads of one process queue here
+        with self._state() as state:
+            if state["questions"] != question_count:
+                raise ValueError(f"{self.path} was created for {state['questions']} questions, not {question_count}")
+
+    @contextlib.contextmanager
+    def _state(self) -> Iterator[Dict[str, Any]]:
+        # Read, modify and atomically replace the queue file under the lock
+        with self._thread_lock, file_lock(self.lock_path):
+            before = None
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    state = json.load(f)
+                before = json.dumps(state, sort_keys=True)
+            else:
+                state = {"questions": self.question_count, "done": [], "claims": {}, "attempts": {},
+                         "finished_by": None}
+            yield state
+            if json.dumps(state, sort_keys=True) != before:
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+
+    def _available(self, state: Dict[str, Any], now: float) -> Iterator[int]:
+        done = set(state["done"])
+        for i in range(1, state["questions"] + 1):
+            claim = state["claims"].get(str(i))
+            if i in done or (claim and claim["expires"] > now):
+                continue
+            if state["attempts"].get(str(i), 0) < self.max_attempts:
+                yield i
+
+    def claim(self, worker: str) -> Optional[int]:
+        # The next unfinished question that is unclaimed or whose lease expired
+        now = time.time()
+        with self._state() as state:
+            i = next(self._available(state, now), None)
+            if i is None:
+                return None
+            previous = state["claims"].get(str(i))
+            if previous:
+                print(f"Question {i}: lease of {previous['worker']} expired, retrying")
+            state["claims"][str(i)] = {"worker": worker, "expires": now + self.lease_seconds}
+            state["attempts"][str(i)] = state["attempts"].get(str(i), 0) + 1
+            # A question handed out after the merge needs another one
+            state["finished_by"] = None
+            return i
+
+    def renew(self, worker: str, ids: List[int]):
+        expires = time.time() + self.lease_seconds
+        with self._state() as state:
+            for i in ids:
+                claim = state["claims"].get(str(i))
+                if claim and claim["worker"] == worker:
+                    claim["expires"] = expires
+
+    def complete(self, worker: str, ids: List[int]):
+        # Also accepted from a worker whose lease expired: the shards are merged without duplicates
+        with self._state() as state:
+            state["done"] = sorted(set(state["done"]) | set(ids))
+            for i in ids:
+                state["claims"].pop(str(i), None)
+
+    def release(self, worker: str, i: int):
+        # A failed question goes back to the queue; its attempts still count
+        with self._state() as state:
+            claim = state["claims"].get(str(i))
+            if claim and claim["worker"] == worker:
+                del state["claims"][str(i)]
+
+    def reset_exhausted(self) -> List[int]:
+        # A new worker gives the questions that failed MAX_ATTEMPTS times another round, like a resumed run
+        with self._state() as state:
+            done = set(state["done"])
+            exhausted = [int(i) for i, attempts in state["attempts"].items()
+                         if attempts >= self.max_attempts and int(i) not in done and i not in state["claims"]]
+            for i in exhausted:
+                del state["attempts"][str(i)]
+            return exhausted
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._state() as state:
+            done = set(state["done"])
+            live = [int(i) for i, claim in state["claims"].items() if claim["expires"] > now]
+            available = list(self._available(state, now))
+            failed = [i for i in range(1, state["questions"] + 1)
+                      if i not in done and i not in live and i not in available]
+            return {"done": len(done), "claimed": sorted(live), "available": len(available),
+                    "failed": failed, "finished_by": state["finished_by"]}
+
+    def drained(self) -> bool:
+        # Nothing left to hand out and nobody holding a live claim
+        status = self.status()
+        return not status["available"] and not status["claimed"]
+
+    def finish(self, worker: str, force: bool = False) -> bool:
+        # True for the one worker that gets to merge and evaluate
+        now = time.time()
+        with self._state() as state:
+            live = any(claim["expires"] > now for claim in state["claims"].values())
+            if not force and (state["finished_by"] or live or next(self._available(state, now), None)):
+                return False
+            state["finished_by"] = worker
+            return True
+
+
+async def _heartbeat(queue: WorkQueue, worker: str, held: Set[int]):
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if held:
+            await asyncio.to_thread(queue.renew, worker, sorted(held))
+
+
+async def run_worker(queue: WorkQueue, worker: str, questions_data: List[Dict[str, Any]],
+                     debate: Callable[[int, Dict[str, Any]], Awaitable[bool]], max_in_flight: int = 4) -> List[int]:
+    # Claims questions one at a time while a slot is free, so a slow question never holds back the next claim.
+    # debate(i, item) records the result and returns False on failure; returns the ids that failed here.
+    held: Set[int] = set()
+    tasks: Set[asyncio.Task] = set()
+    failed_ids = []
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def process(i: int):
+        try:
+            ok = await debate(i, questions_data[i - 1])
+        finally:
+            held.discard(i)
+            slots.release()
+        if ok:
+            await asyncio.to_thread(queue.complete, worker, [i])
+        else:
+            failed_ids.append(i)
+            await asyncio.to_thread(queue.release, worker, i)
+
+    heartbeat = asyncio.create_task(_heartbeat(queue, worker, held))
+    try:
+        while accounting.get_ledger().state != accounting.HARD:
+            await slots.acquire()
+            i = await asyncio.to_thread(queue.claim, worker)
+            if i is not None:
+                held.add(i)
+                task = asyncio.create_task(process(i))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                continue
+
+            slots.release()
+            if tasks:
+                await asyncio.wait(tasks, timeout=POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            elif await asyncio.to_thread(queue.drained):
+                break
+            else:
+                # Other workers hold the rest; their leases may still expire
+                await asyncio.sleep(POLL_SECONDS)
+        await asyncio.gather(*tasks)
+    finally:
+        heartbeat.cancel()
+    return sorted(failed_ids)
+
+
+def merge(directory: str, store: ResultStore) -> int:
+    # Appends every shard's records to the combined store; a question finished twice keeps its first record
+    merged = 0
+    for path in shard_paths(directory):
+        for record in ResultStore(path).iter_records():
+            if record['id'] not in store:
+                store.append(record)
+                merged += 1
+    return merged
@@ -0,0 +1,400 @@
+"""
+Offline 'Simulated' provider backend for CustomConversation / AsyncCustomConversation.
+Returns schema-valid responses with seeded latency, injected 429s and failures,
+and can replay the answers recorded in an existing results.json.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import typing
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+import answer_matcher
+from history import Turn
+from rate_limiter import estimate_tokens
+from schemas import (
+    RolePreference,
+    RoleConfidenceEntry,
+    SolverResponse,
+    SolverResponseWithRoles,
+    PeerFeedbackList,
+    PeerFeedback,
+    FeedbackEvaluation,
+    ErrorDetail,
+    RefinedSolution,
+    ChangeResponse,
+    FinalDecision,
+    VerificationResult,
+    EvaluationResult,
+    BatchEvaluationResult,
+    CandidateVerdict
+)
+
+# (distribution, *params) in seconds:
+# ('constant', value), ('uniform', low, high), ('normal', mean, std),
+# ('lognormal', median, sigma), ('exponential', mean)
+LatencySpec = Tuple[Any, ...]
+
+ANSWER_POOL = ["Vampire", "Casino", "Pandora", "Matchmaker", "Running", "Mirror", "Shadow", "Compass", "Lighthouse", "Echo"]
+
+
+class SimulatedRateLimitError(Exception):
+    def __init__(self, model: str):
+        super().__init__(f"Error code: 429 - rate limit exceeded for {model} (simulated)")
+
+
+class SimulatedProviderError(Exception):
+    def __init__(self, model: str):
+        super().__init__(f"Error code: 500 - internal error from {model} (simulated)")
+
+
+class SimulationConfig:
+    def __init__(self, latency: LatencySpec = ('lognormal', 1.5, 0.4),
+                 model_latency: Optional[Dict[str, LatencySpec]] = None,
+                 rate_limit_rate: float = 0.0, failure_rate: float = 0.0,
+                 correct_rate: float = 0.5, seed: int = 0,
+                 replay_path: Optional[str] = None, time_scale: float = 1.0):
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.correct_rate = correct_rate  # Chance a synthetic solver answer is the reference answer, when known
+        self.seed = seed
+        self.replay_path = replay_path    # results.json for full replay, or questions.json for reference answers only
+        self.time_scale = time_scale      # Multiplies every latency, e.g. 0.01 for fast load tests
+        self._replay: Optional[List[Dict[str, Any]]] = None
+
+    def replay_records(self) -> List[Dict[str, Any]]:
+        if self._replay is None:
+            self._replay = []
+            if self.replay_path:
+                with open(self.replay_path, "r") as f:
+                    self._replay = json.load(f)
+        return self._replay
+
+
+_config = SimulationConfig()
+
+
+def configure(config: SimulationConfig):
+    global _config
+    _config = config
+
+
+def get_config() -> SimulationConfig:
+    return _config
+
+
+def sample_latency(spec: LatencySpec, rng: random.Random) -> float:
+    kind, *params = spec
+    if kind == 'constant':
+        value = params[0]
+    elif kind == 'uniform':
+        value = rng.uniform(params[0], params[1])
+    elif kind == 'normal':
+        value = rng.gauss(params[0], params[1])
+    elif kind == 'lognormal':
+        value = params[0] * math.exp(rng.gauss(0.0, params[1]))
+    elif kind == 'exponential':
+        value = rng.expovariate(1.0 / params[0])
+    else:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    return max(0.0, value)
+
+
+class SimulatedResponse:
+    # Mimics the parts of a provider response the conversation layer reads
+    def __init__(self, text: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        self.text = text
+        self.output_text = text
+        self.usage = _Usage(input_tokens, output_tokens, cached_tokens)
+
+
+class _Usage:
+    def __init__(self, input_tokens: int, output_tokens: int, cached_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = input_tokens + output_tokens
+        self.input_tokens_details = _InputTokensDetails(cached_tokens)
+
+
+class _InputTokensDetails:
+    def __init__(self, cached_tokens: int):
+        self.cached_tokens = cached_tokens
+
+
+class PrefixCache:
+    # Automatic prompt caching as the providers do it: the longest prefix shared with a recent
+    # prompt of the same model counts as cached, in 128-token blocks once it reaches 1024 tokens
+    MIN_TOKENS = 1024
+    BLOCK_TOKENS = 128
+    RECENT_PROMPTS = 64
+
+    def __init__(self):
+        self._recent: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.RECENT_PROMPTS))
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, model: str, prompt: str) -> int:
+        with self._lock:
+            recent = self._recent[model]
+            shared = max((len(os.path.commonprefix([prompt, previous])) for previous in recent), default=0)
+            recent.append(prompt)
+        tokens = estimate_tokens(prompt[:shared]) if shared else 0
+        if tokens < self.MIN_TOKENS:
+            return 0
+        return tokens // self.BLOCK_TOKENS * self.BLOCK_TOKENS
+
+
+_prefix_cache = PrefixCache()
+
+
+class SimulatedBackend:
+    def __init__(self, model: str, config: Optional[SimulationConfig] = None):
+        self.model = model
+        self.config = config or _config
+        self._attempts: Dict[str, int] = {}
+
+    def _rng(self, *parts: Any) -> random.Random:
+        digest = hashlib.sha256("\x00".join(str(p) for p in (self.config.seed, self.model) + parts).encode("utf-8"))
+        return random.Random(int.from_bytes(digest.digest()[:8], "big"))
+
+    def plan_call(self, message: str, turns: List[Turn]) -> Tuple[float, Optional[Exception]]:
+        # Latency to wait and the error to raise afterwards, if any, for this attempt
+        call_key = hashlib.sha256(f"{len(turns)}\x00{message}".encode("utf-8")).hexdigest()
+        attempt = self._attempts.get(call_key, 0)
+        self._attempts[call_key] = attempt + 1
+
+        rng = self._rng(call_key, attempt)
+        spec = self.config.model_latency.get(self.model, self.config.latency)
+        latency = sample_latency(spec, rng) * self.config.time_scale
+
+        roll = rng.random()
+        if roll < self.config.rate_limit_rate:
+            return latency * 0.1, SimulatedRateLimitError(self.model)
+        if roll < self.config.rate_limit_rate + self.config.failure_rate:
+            return latency, SimulatedProviderError(self.model)
+        return latency, None
+
+    def respond(self, message: str, structured_output: Optional[Any], turns: List[Turn]) -> Tuple[Any, SimulatedResponse]:
+        rng = self._rng(len(turns), message)
+        if structured_output:
+            result = self._structured(message, structured_output, turns, rng)
+            text = result.model_dump_json()
+        else:
+            result = None
+            text = f"Simulated response from {self.model}."
+
+        input_tokens = sum(estimate_tokens(u) + estimate_tokens(m) for u, m in turns) + estimate_tokens(message)
+        prompt = "".join(u + m for u, m in turns) + message
+        cached_tokens = min(_prefix_cache.cached_tokens(self.model, prompt), input_tokens)
+        response = SimulatedResponse(text, input_tokens, estimate_tokens(text), cached_tokens)
+        return (result if structured_output else response), response
+
+    # ---- schema-specific generation -------------------------------------------------
+
+    def _structured(self, message: str, schema: Any, turns: List[Turn], rng: random.Random) -> Any:
+        replayed = self._replayed(message, schema, turns)
+        if replayed is not None:
+            return replayed
+
+        builders = {
+            RolePreference: self._role_preference,
+            SolverResponse: self._solver_response,
+            SolverResponseWithRoles: self._solver_response_with_roles,
+            PeerFeedbackList: self._peer_feedback,
+            RefinedSolution: self._refined_solution,
+            FinalDecision: self._final_decision,
+            VerificationResult: self._verification,
+            EvaluationResult: self._evaluation,
+            BatchEvaluationResult: self._batch_evaluation,
+        }
+        builder = builders.get(schema)
+        if builder is not None:
+            return builder(message, turns, rng)
+        return schema.model_validate(generic_instance(schema, rng))
+
+    def _role_preference(self, message, turns, rng):
+        scores = {"Solver": round(rng.uniform(0.4, 1.0), 2), "Judge": round(rng.uniform(0.4, 1.0), 2)}
+        order = sorted(scores, key=scores.get, reverse=True)
+        return RolePreference(
+            role_preferences=order,
+            confidence_by_role=[RoleConfidenceEntry(role=role, score=score) for role, score in scores.items()],
+            reasoning=f"{self.model} (simulated) prefers {order[0]}."
+        )
+
+    def _solver_response(self, message, turns, rng):
+        record = self._find_record(message, turns)
+        reference = _first_reference(record.get('correct_answer', record.get('answer'))) if record else None
+        if reference and rng.random() < self.config.correct_rate:
+            answer, confidence = reference, rng.uniform(0.6, 1.0)
+        else:
+            answer, confidence = rng.choice(ANSWER_POOL), rng.uniform(0.3, 0.9)
+        return SolverResponse(answer=answer, explanation=f"Simulated reasoning by {self.model} leading to '{answer}'.",
+                              confidence=round(confidence, 2))
+
+    def _solver_response_with_roles(self, message, turns, rng):
+        roles = self._role_preference(message, turns, rng)
+        return SolverResponseWithRoles(**self._solver_response(message, turns, rng).model_dump(),
+                                       confidence_by_role=roles.confidence_by_role)
+
+    def _peer_feedback(self, message, turns, rng):
+        solution_ids = re.findall(r"Solution ID: (\S+)", message) or ["solver_1"]
+        feedbacks = []
+        for solution_id in solution_ids:
+            weak = rng.random() < 0.5
+            feedbacks.append(PeerFeedback(
+                solution_id=solution_id,
+                evaluation=FeedbackEvaluation(
+                    strengths=["Clear structure."],
+                    weaknesses=["Misses a clue."] if weak else [],
+                    errors=[ErrorDetail(location="answer", error_type="logic", description="Clue not used.", severity="medium")] if weak else [],
+                    suggested_changes=["Revisit the wordplay."] if weak else []
+                ),
+                overall_assessment="Needs work." if weak else "Convincing."
+            ))
+        return PeerFeedbackList(feedbacks=feedbacks)
+
+    def _refined_solution(self, message, turns, rng):
+        previous = _last_answer(turns) or rng.choice(ANSWER_POOL)
+        critiques = re.findall(r"Assessment: (.*)", message)
+        answer = previous if rng.random() < 0.7 else rng.choice(ANSWER_POOL)
+        return RefinedSolution(
+            changes_made=[ChangeResponse(critique=c, response="Considered.", accepted=rng.random() < 0.5) for c in critiques],
+            refined_solution=f"Simulated refinement by {self.model}.",
+            refined_answer=answer,
+            confidence=round(rng.uniform(0.3, 1.0), 2)
+        )
+
+    def _final_decision(self, message, turns, rng):
+        candidates = re.findall(r"Solver (\S+?):\s*\nRefined Answer: (.*)", message)
+        if not candidates:
+            candidates = [("solver_1", rng.choice(ANSWER_POOL))]
+        winner, answer = rng.choice(candidates)
+        return FinalDecision(winner=winner, winning_answer=answer, confidence=round(rng.uniform(0.5, 1.0), 2),
+                             reasoning=f"Simulated verdict by {self.model}.")
+
+    def _verification(self, message, turns, rng):
+        # A fallible verifier: usually agrees with right answers and usually rejects wrong ones
+        record = self._find_record(message, turns)
+        proposed = re.search(r"\*\*Proposed Answer:\*\* (.*)", message)
+        right = bool(record and proposed) and answer_matcher.match(
+            proposed.group(1), record.get('correct_answer', record.get('answer', ''))) == answer_matcher.CORRECT
+        agrees = rng.random() < (0.9 if right else 0.25)
+        return VerificationResult(agrees=agrees, confidence=round(rng.uniform(0.5, 1.0), 2),
+                                  reasoning=f"Simulated check by {self.model}.")
+
+    def _grade(self, answer: str, reference: str, rng: random.Random) -> bool:
+        verdict = answer_matcher.match(answer, reference)
+        if verdict == answer_matcher.UNCERTAIN:
+            return rng.random() < 0.2
+        return verdict == answer_matcher.CORRECT
+
+    def _evaluation(self, message, turns, rng):
+        q_num = re.search(r"Question \((\d+)\)", message)
+        reference = re.search(r"Correct Answer: (.*)", message)
+        answer = re.search(r"System's Answer: (.*)", message)
+        return EvaluationResult(
+            question_number=int(q_num.group(1)) if q_num else 0,
+            is_correct=self._grade(answer.group(1) if answer else "", reference.group(1) if reference else "", rng)
+        )
+
+    def _batch_evaluation(self, message, turns, rng):
+        q_num = re.search(r"Question \((\d+)\)", message)
+        reference = re.search(r"Correct Answer: (.*)", message)
+        candidates = re.findall(r"^\[(\w+)\] (.*)$", message, re.M)
+        return BatchEvaluationResult(
+            question_number=int(q_num.group(1)) if q_num else 0,
+            verdicts=[CandidateVerdict(label=label, is_correct=self._grade(ans, reference.group(1) if reference else "", rng))
+                      for label, ans in candidates]
+        )
+
+    # ---- replay -------------------------------------------------------------------------
+
+    def _find_record(self, message: str, turns: List[Turn]) -> Optional[Dict[str, Any]]:
+        # The question text appears in the solver prompt of the current question
+        texts = [message] + [user_text for user_text, _ in reversed(turns)]
+        for text in texts:
+            for record in self.config.replay_records():
+                if record.get('question') and record['question'] in text:
+                    return record
+        return None
+
+    def _replayed(self, message: str, schema: Any, turns: List[Turn]) -> Optional[Any]:
+        record = self._find_record(message, turns) if self.config.replay_path else None
+        process_output = (record or {}).get('process_output') or {}
+        if not process_output:
+            return None
+
+        solver = next((s for s in process_output.get('initial_solutions', []) if s.get('model') == self.model), None)
+        payload = None
+        if schema is SolverResponse and solver:
+            payload = solver['response']
+        elif schema is SolverResponseWithRoles and solver:
+            roles = self._role_preference(message, turns, self._rng("replay", message))
+            payload = {**solver['response'], 'confidence_by_role': roles.model_dump()['confidence_by_role']}
+        elif schema is PeerFeedbackList and solver:
+            payload = next((pf['feedbacks'] for pf in process_output.get('peer_feedbacks', [])
+                            if pf['reviewer_id'] == solver['solver_id']), None)
+        elif schema is RefinedSolution and solver:
+            payload = next((r['refined_response'] for r in process_output.get('refined_solutions', [])
+                            if r['solver_id'] == solver['solver_id']), None)
+        elif schema is FinalDecision:
+            payload = process_output.get('final_verdict')
+        if payload is None:
+            return None
+
+        # Fields added to a schema after the run was recorded are filled synthetically
+        base = generic_instance(schema, self._rng("replay", message))
+        try:
+            return schema.model_validate({**base, **payload})
+        except Exception:
+            return None
+
+
+def _first_reference(reference: Any) -> str:
+    return reference if isinstance(reference, str) else (reference[0] if reference else "")
+
+
+def _last_answer(turns: List[Turn]) -> Optional[str]:
+    for _, model_text in reversed(turns):
+        try:
+            payload = json.loads(model_text)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if isinstance(payload, dict):
+            for key in ('refined_answer', 'answer'):
+                if key in payload:
+                    return payload[key]
+    return None
+
+
+def generic_instance(schema: Any, rng: random.Random) -> Dict[str, Any]:
+    # Schema-valid payload for any pydantic model, used for schemas without a dedicated builder
+    return {name: _generic_value(field.annotation, name, rng) for name, field in schema.model_fields.items()}
+
+
+def _generic_value(annotation: Any, name: str, rng: random.Random) -> Any:
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        non_null = [a for a in args if a is not type(None)]
+        return _generic_value(non_null[0], name, rng) if non_null else None
+    if origin is typing.Literal:
+        return rng.choice(args)
+    if origin in (list, List):
+        return [_generic_value(args[0] if args else str, name, rng) for _ in range(rng.randint(1, 2))]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return generic_instance(annotation, rng)
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation is int:
+        return rng.randint(0, 10)
+    if annotation is float:
+        return round(rng.random(), 2)
+    return f"simulated {name}"
@@ -0,0 +1,48 @@
+import pytest
+from answer_matcher import CORRECT, INCORRECT, UNCERTAIN, match, normalize
+
+
+@pytest.mark.parametrize("answer, reference", [
+    ("The Beatles", "beatles"),
+    ("Café", "cafe"),
+    ("Match makers", "Matchmakers"),
+    ("Paris, France", "France Paris"),
+    ("Massachussetts", "Massachusetts"),
+    ("volga", ["Don", "Volga"]),
+])
+def test_correct(answer, reference):
+    assert match(answer, reference) == CORRECT
+
+
+@pytest.mark.parametrize("answer, reference", [
+    ("12345679", "12345678"),
+    ("1999", "1998"),
+])
+def test_different_numbers_are_incorrect(answer, reference):
+    assert match(answer, reference) == INCORRECT
+
+
+@pytest.mark.parametrize("answer, reference", [
+    ("Russia", "Prussia"),
+    ("News", "New"),
+    ("Mars", "Mar"),
+    ("Apples", "Apple"),
+    ("Route 66", "Route 68"),
+    ("Leningrad", "Saint Petersburg"),
+    ("Shakespere", "Shakespeare"),
+    ("Columbia", "Colombia"),
+    ("Austrian", "Australian"),
+])
+def test_near_misses_go_to_the_llm(answer, reference):
+    assert match(answer, reference) == UNCERTAIN
+
+
+def test_no_answer_is_incorrect():
+    assert match("No answer provided", "Paris") == INCORRECT
+
+
+def test_normalize_keeps_distinct_answers_apart():
+    assert normalize("The News") == normalize("news")
+    assert normalize("News") != normalize("New")
+    assert normalize("Mars") != normalize("Mar")
+
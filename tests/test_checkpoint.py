@@ -0,0 +1,75 @@
+import pytest
+from agents import Solver
+from checkpoint import INITIAL, PEER_FEEDBACK, REFINED, Checkpoints, QuestionCheckpoint
+from collaboration import _GraphProgress, _build_process_output, _node
+from conversation import CustomConversation
+from history import HistoryPolicy
+from schemas import PeerFeedbackList, SolverResponse
+import tracing
+
+QUESTION = "What is the capital of France?"
+ROLES = {"judge": None, "solvers": []}
+
+
+def _answers():
+    return [{"solver_id": sid, "model": "model", "response": SolverResponse(answer="Paris", explanation="", confidence=0.9)}
+            for sid in ("s1", "s2")]
+
+
+def _review(reviewer_id):
+    return {"reviewer_id": reviewer_id, "feedbacks": PeerFeedbackList(feedbacks=[])}
+
+
+def _save(checkpoint, phase, peer_feedbacks=()):
+    output = _build_process_output(_answers(), list(peer_feedbacks), [], None)
+    checkpoint.save(phase, ROLES, output, {"s1": [["q", "a"]]})
+
+
+def test_resume_restores_completed_phases(tmp_path):
+    checkpoint = Checkpoints(str(tmp_path)).question(3, QUESTION)
+    assert checkpoint.phase is None and checkpoint.results() == {}
+    _save(checkpoint, PEER_FEEDBACK, [_review("s1"), _review("s2")])
+
+    resumed = Checkpoints(str(tmp_path)).question(3, QUESTION)
+    assert resumed.phase == PEER_FEEDBACK
+    assert resumed.transcripts() == {"s1": [["q", "a"]]}
+    results = resumed.results()
+    assert [ans["response"].answer for ans in results[INITIAL]] == ["Paris", "Paris"]
+    assert [pf["reviewer_id"] for pf in results[PEER_FEEDBACK]] == ["s1", "s2"]
+    assert REFINED not in results
+
+    resumed.discard()
+    assert not (tmp_path / "question-3.json").exists()
+
+
+def test_unfinished_phase_keeps_its_saved_reviews(tmp_path):
+    checkpoint = Checkpoints(str(tmp_path)).question(1, QUESTION)
+    _save(checkpoint, INITIAL, [_review("s2")])
+    results = Checkpoints(str(tmp_path)).question(1, QUESTION).results()
+    assert PEER_FEEDBACK not in results
+    assert list(results["reviews"]) == ["s2"]
+
+
+@pytest.mark.parametrize("content", ["{\"question\": \"Another question\"}", "{\"question\": "])
+def test_ignores_foreign_or_corrupt_checkpoint(tmp_path, content):
+    path = tmp_path / "question-1.json"
+    path.write_text(content)
+    assert QuestionCheckpoint(str(path), QUESTION).phase is None
+
+
+def test_dataflow_resume_only_runs_unfinished_nodes(tmp_path):
+    checkpoint = Checkpoints(str(tmp_path)).question(1, QUESTION)
+    _save(checkpoint, INITIAL, [_review("s1")])
+    solvers = [Solver("model", CustomConversation("Simulated", "model", HistoryPolicy.full()), sid) for sid in ("s1", "s2")]
+    progress = _GraphProgress(checkpoint, None, solvers, _answers(), None, checkpoint.results())
+    assert progress.finished() == 1
+
+    def call(inputs):
+        raise AssertionError("a checkpointed node ran again")
+    assert _node(tracing.PEER_REVIEW, call, False, (tracing.PEER_REVIEW, "s1"), progress)({}) == progress.get(
+        (tracing.PEER_REVIEW, "s1"))
+    _node(tracing.PEER_REVIEW, lambda inputs: _review("s2"), False, (tracing.PEER_REVIEW, "s2"), progress)({})
+
+    resumed = Checkpoints(str(tmp_path)).question(1, QUESTION)
+    assert resumed.phase == PEER_FEEDBACK
+    assert [pf["reviewer_id"] for pf in resumed.results()[PEER_FEEDBACK]] == ["s1", "s2"]
@@ -0,0 +1,49 @@
+from conversation import CustomConversation
+from history import HistoryPolicy
+
+PREAMBLE = [("roles?", "solver")]
+QUESTION_1 = [("q1 solve", "a1"), ("q1 refine", "a1'")]
+QUESTION_2 = [("q2 solve", "a2")]
+
+
+def test_on_fork():
+    turns = PREAMBLE + QUESTION_1
+    assert HistoryPolicy.per_question().on_fork(turns, 1) == []
+    assert HistoryPolicy.current_question().on_fork(turns, 1) == PREAMBLE
+    assert HistoryPolicy.full().on_fork(turns, 1) == turns
+    assert HistoryPolicy.last_k(2).on_fork(turns, 1) == QUESTION_1
+
+
+def test_on_absorb():
+    assert HistoryPolicy.full().on_absorb(PREAMBLE, QUESTION_1) == PREAMBLE + QUESTION_1
+    assert HistoryPolicy.last_k(2).on_absorb(PREAMBLE + QUESTION_1, QUESTION_2) == QUESTION_1[1:] + QUESTION_2
+    assert HistoryPolicy.current_question().on_absorb(PREAMBLE, QUESTION_1) == PREAMBLE
+
+
+def _question(parent, question_turns):
+    fork = parent.fork()
+    fork.begin_question()
+    for turn in question_turns:
+        fork.turns.append(turn)
+        fork.question_turns.append(turn)
+    parent.absorb(fork)
+    return fork
+
+
+def test_full_history_carries_finished_questions():
+    parent = CustomConversation('Simulated', 'model', HistoryPolicy.full(), PREAMBLE)
+    _question(parent, QUESTION_1)
+    assert parent.fork().turns == PREAMBLE + QUESTION_1
+
+
+def test_current_question_forks_only_the_preamble():
+    parent = CustomConversation('Simulated', 'model', HistoryPolicy.current_question(), PREAMBLE)
+    _question(parent, QUESTION_1)
+    assert parent.fork().turns == PREAMBLE
+
+
+def test_restored_transcript_keeps_only_new_turns_as_the_question():
+    parent = CustomConversation('Simulated', 'model', HistoryPolicy.full(), PREAMBLE)
+    fork = parent.fork()
+    fork.restore_turns([list(turn) for turn in PREAMBLE + QUESTION_1])
+    assert fork.question_turns == QUESTION_1
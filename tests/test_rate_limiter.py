@@ -0,0 +1,22 @@
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+def test_unconfigured_models_are_not_paced():
+    limiter = rate_limiter.get_limiter('OpenAI', 'unconfigured-model')
+    assert all(limiter.reserve(10_000) == 0.0 for _ in range(100))
+
+
+def test_released_reservation_is_not_paid_twice():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600_000)
+    capacity = limiter.requests.capacity
+    assert limiter.reserve(1000) == 0.0
+    limiter.release(1000)
+    assert limiter.requests.level >= capacity - 0.01
+    assert limiter.tokens.level >= limiter.tokens.capacity - 1
+
+
+def test_configured_quota_paces_requests():
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1_000_000)
+    assert limiter.reserve(10) == 0.0
+    assert limiter.reserve(10) > 0.0
@@ -0,0 +1,34 @@
+import sqlite3
+from pydantic import BaseModel
+from response_cache import ResponseCache
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def _keys(path):
+    with sqlite3.connect(path) as db:
+        return [row[0] for row in db.execute("SELECT key FROM responses ORDER BY key")]
+
+
+def test_every_write_enforces_the_size_cap(tmp_path):
+    payload = len(Answer(text="x" * 10).model_dump_json())
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * payload)
+    for key in ("a", "b", "c"):
+        cache.put(key, Answer, Answer(text="x" * 10))
+    assert cache.stats()["bytes"] <= 2 * payload
+    assert cache.get("a", Answer) is None
+    assert cache.get("c", Answer) == Answer(text="x" * 10)
+
+
+def test_opening_with_a_smaller_cap_evicts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    for key in ("a", "b", "c"):
+        cache.put(key, Answer, Answer(text=key * 10))
+    cache.close()
+
+    payload = len(Answer(text="a" * 10).model_dump_json())
+    ResponseCache(path, max_bytes=payload).close()
+    assert _keys(path) == ["c"]
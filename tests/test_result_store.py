@@ -0,0 +1,69 @@
+import os
+from result_store import ResultStore
+
+
+def _store(tmp_path, count=3):
+    store = ResultStore(str(tmp_path / "results.jsonl"))
+    for i in range(1, count + 1):
+        store.append({"id": i, "answer": f"answer {i}"})
+    return store
+
+
+def test_torn_data_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    _store(tmp_path)
+    size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b'{"id": 4, "ans')
+
+    store = ResultStore(path)
+    assert store.ids() == [1, 2, 3]
+    assert os.path.getsize(path) == size
+    store.append({"id": 4, "answer": "answer 4"})
+    assert ResultStore(path).get(4) == {"id": 4, "answer": "answer 4"}
+
+
+def test_records_missing_from_index_are_recovered(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    _store(tmp_path)
+    # A crash between the data fsync and the index write
+    with open(path + ".idx", "r") as f:
+        lines = f.readlines()
+    with open(path + ".idx", "w") as f:
+        f.writelines(lines[:1])
+
+    store = ResultStore(path)
+    assert store.ids() == [1, 2, 3]
+    assert store.get(3) == {"id": 3, "answer": "answer 3"}
+
+
+def test_torn_index_tail_is_rewritten(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    _store(tmp_path)
+    with open(path + ".idx", "a") as f:
+        f.write("4\t99")
+
+    store = ResultStore(path)
+    assert store.ids() == [1, 2, 3]
+    store.append({"id": 4, "answer": "answer 4"})
+    assert ResultStore(path).get(4) == {"id": 4, "answer": "answer 4"}
+
+
+def test_index_that_disagrees_with_data_is_rebuilt(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    _store(tmp_path)
+    # The data file was replaced by an older copy, so the last indexed record is gone
+    with open(path + ".idx", "a") as f:
+        f.write(f"7\t{os.path.getsize(path) + 100}\n")
+
+    store = ResultStore(path)
+    assert store.ids() == [1, 2, 3]
+    assert [record["id"] for record in store.iter_records()] == [1, 2, 3]
+
+
+def test_reappended_id_keeps_latest_record(tmp_path):
+    store = _store(tmp_path)
+    store.append({"id": 2, "answer": "retried"})
+    reopened = ResultStore(store.path)
+    assert reopened.get(2) == {"id": 2, "answer": "retried"}
+    assert [record["id"] for record in reopened.iter_records()] == [1, 3, 2]
@@ -0,0 +1,12 @@
+from schemas import SolverResponse, SolverResponseWithRoles
+
+
+def test_results_without_confidence_still_load():
+    legacy = {"answer": "Paris", "explanation": "capital"}
+    assert SolverResponse.model_validate(legacy).confidence == 0.0
+    assert SolverResponseWithRoles.model_validate({**legacy, "confidence_by_role": []}).confidence == 0.0
+    assert SolverResponse.model_validate({**legacy, "confidence": 0.9}).confidence == 0.9
+
+
+def test_confidence_stays_required_in_the_model_schema():
+    assert "confidence" in SolverResponse.model_json_schema()["required"]
@@ -0,0 +1,94 @@
+import pytest
+import sharding
+from result_store import ResultStore
+from sharding import WorkQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sharding.time, "time", lambda: now[0])
+    return now
+
+
+def test_claims_hand_out_each_question_once(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path), 2, lease_seconds=10)
+    assert queue.claim("a") == 1
+    assert queue.claim("b") == 2
+    assert queue.claim("b") is None
+    assert queue.status()["claimed"] == [1, 2]
+
+
+def test_expired_lease_is_handed_out_again(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path), 1, lease_seconds=10)
+    assert queue.claim("a") == 1
+    clock[0] += 5
+    queue.renew("a", [1])
+    queue.renew("b", [1])  # Only the holder renews
+    clock[0] += 9
+    assert queue.claim("b") is None
+
+    clock[0] += 2
+    assert queue.claim("b") == 1
+    queue.renew("a", [1])
+    clock[0] += 9
+    assert queue.claim("a") is None
+    # The crashed worker's late result still counts
+    queue.complete("a", [1])
+    assert queue.drained()
+    assert queue.finish("b") and not queue.finish("a")
+
+
+def test_question_is_dropped_after_max_attempts(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path), 1, lease_seconds=10, max_attempts=2)
+    for _ in range(2):
+        assert queue.claim("a") == 1
+        queue.release("a", 1)
+    assert queue.claim("a") is None
+    assert queue.status()["failed"] == [1]
+    assert queue.drained()
+
+    assert queue.reset_exhausted() == [1]
+    assert queue.claim("b") == 1
+
+
+def test_retried_questions_are_merged_again(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path), 2, lease_seconds=10, max_attempts=1)
+    assert queue.claim("a") == 1
+    queue.release("a", 1)
+    assert queue.claim("a") == 2
+    queue.complete("a", [2])
+    assert queue.finish("a")
+
+    assert queue.reset_exhausted() == [1]
+    assert queue.claim("b") == 1
+    assert not queue.finish("b")
+    queue.complete("b", [1])
+    assert queue.finish("b")
+    assert queue.status()["finished_by"] == "b"
+
+
+def test_expired_leases_count_as_attempts(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path), 1, lease_seconds=10, max_attempts=sharding.MAX_ATTEMPTS)
+    for _ in range(sharding.MAX_ATTEMPTS):
+        assert queue.claim("a") == 1
+        clock[0] += 11
+    assert queue.claim("b") is None
+    assert queue.status()["failed"] == [1]
+
+
+def test_queue_rejects_another_dataset(tmp_path):
+    WorkQueue(str(tmp_path), 3)
+    with pytest.raises(ValueError):
+        WorkQueue(str(tmp_path), 4)
+
+
+def test_merge_keeps_first_record_of_a_question_finished_twice(tmp_path):
+    ResultStore(sharding.shard_path(str(tmp_path), "a")).append({"id": 1, "worker": "a"})
+    b = ResultStore(sharding.shard_path(str(tmp_path), "b"))
+    b.append({"id": 1, "worker": "b"})
+    b.append({"id": 2, "worker": "b"})
+
+    store = ResultStore(str(tmp_path / "merged.jsonl"))
+    assert sharding.merge(str(tmp_path), store) == 2
+    assert store.get(1) == {"id": 1, "worker": "a"}
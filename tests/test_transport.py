@@ -0,0 +1,55 @@
+import asyncio
+import http.server
+import threading
+import httpx
+import pytest
+import transport
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+def _sockets(inner):
+    return [c._connection._network_stream.get_extra_info("socket") for c in inner._pool.connections]
+
+
+def test_pool_of_a_finished_loop_is_closed_on_swap(url):
+    metered = transport._AsyncMeteredTransport(transport._Meter("test"), httpx.AsyncHTTPTransport)
+
+    async def get():
+        response = await metered.handle_async_request(httpx.Request("GET", url))
+        await response.aread()
+        await response.aclose()
+
+    asyncio.run(get())
+    first = metered._inner
+    [sock] = _sockets(first)
+    sock.getpeername()
+
+    asyncio.run(get())
+    assert metered._inner is not first and not metered._retired
+    with pytest.raises(OSError):
+        sock.getpeername()
+
+    [sock] = _sockets(metered._inner)
+    asyncio.run(metered.aclose())
+    with pytest.raises(OSError):
+        sock.getpeername()
@@ -0,0 +1,194 @@
+"""
+Per-call tracing.
+Each send_message call produces one span. The question id and phase are carried
+in contextvars, so they follow asyncio tasks and worker threads.
+"""
+
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROLE_SELECTION = 'role_selection'
+CASCADE = 'cascade'
+INITIAL_SOLVE = 'initial_solve'
+PEER_REVIEW = 'peer_review'
+REFINEMENT = 'refinement'
+JUDGE = 'judge'
+GRADING = 'grading'
+
+_question: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar('trace_question', default=None)
+_phase: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('trace_phase', default=None)
+
+
+def current_question() -> Optional[Any]:
+    return _question.get()
+
+
+def current_phase() -> Optional[str]:
+    return _phase.get()
+
+
+@contextlib.contextmanager
+def question(question_id: Any) -> Iterator[None]:
+    token = _question.set(question_id)
+    try:
+        yield
+    finally:
+        _question.reset(token)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    token = _phase.set(name)
+    try:
+        yield
+    finally:
+        _phase.reset(token)
+
+
+class Span:
+    def __init__(self, provider: str, model: str, prompt_chars: int, epoch: float):
+        self.question_id = _question.get()
+        self.phase = _phase.get() or 'other'
+        self.provider = provider
+        self.model = model
+        self.thread = threading.get_ident()
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.start = self._start - epoch   # Seconds since the tracer started
+        self.duration = 0.0
+        self.attempts = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0         # Sleeping after 429s
+        self.rate_limit_wait = 0.0         # Sleeping for the proactive rate limiter
+        self.slot_wait = 0.0               # Waiting for a concurrency slot
+        self.prompt_chars = prompt_chars
+        self.response_chars: Optional[int] = None
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.cached_tokens: Optional[int] = None
+        self.cache_hit = False             # Served from the local response cache
+        self.error: Optional[str] = None
+
+    def record_response(self, response_chars: int, usage: Optional[Tuple[int, int]], cached_tokens: Optional[int]):
+        self.response_chars = response_chars
+        if usage is not None:
+            self.input_tokens, self.output_tokens = usage
+        self.cached_tokens = cached_tokens
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in vars(self).items() if not key.startswith('_')}
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.epoch = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, provider: str, model: str, message: str) -> Iterator[Span]:
+        current = Span(provider, model, len(message), self.epoch)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current.finish()
+            if self.enabled:
+                with self._lock:
+                    self.spans.append(current)
+
+    def export_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+
+    def export_chrome(self, path: str):
+        # One lane per question, so a question's phases read left to right
+        events = []
+        for span in self.spans:
+            lane = span.question_id if isinstance(span.question_id, int) else 0
+            events.append({
+                "name": f"{span.phase} {span.model}",
+                "cat": span.phase,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": 1,
+                "tid": lane,
+                "args": span.to_dict(),
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        # {"phase": {name: stats}, "model": {name: stats}}
+        groups: Dict[str, Dict[str, List[Span]]] = {"phase": defaultdict(list), "model": defaultdict(list)}
+        for span in self.spans:
+            groups["phase"][span.phase].append(span)
+            groups["model"][span.model].append(span)
+        return {kind: {name: _stats(spans) for name, spans in sorted(by_name.items())}
+                for kind, by_name in groups.items()}
+
+    def format_summary(self) -> str:
+        lines = []
+        for kind, by_name in self.summary().items():
+            lines.append(f"{kind:<26}{'calls':>6}{'hits':>6}{'p50 s':>8}{'p95 s':>8}{'total s':>9}"
+                         f"{'retries':>8}{'backoff s':>10}{'paced s':>8}{'in tok':>9}{'out tok':>9}{'cached':>8}")
+            for name, s in by_name.items():
+                lines.append(f"{name:<26}{s['calls']:>6}{s['cache_hits']:>6}{s['p50']:>8.2f}{s['p95']:>8.2f}"
+                             f"{s['total_seconds']:>9.1f}{s['retries']:>8}{s['backoff_seconds']:>10.1f}"
+                             f"{s['rate_limit_wait']:>8.1f}{s['input_tokens']:>9}{s['output_tokens']:>9}"
+                             f"{s['cached_tokens']:>8}")
+            lines.append("")
+        return "\n".join(lines).rstrip()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _stats(spans: List[Span]) -> Dict[str, Any]:
+    durations = [span.duration for span in spans]
+    return {
+        "calls": len(spans),
+        "cache_hits": sum(span.cache_hit for span in spans),
+        "errors": sum(span.error is not None for span in spans),
+        "p50": _percentile(durations, 50),
+        "p95": _percentile(durations, 95),
+        "total_seconds": sum(durations),
+        "retries": sum(span.retries for span in spans),
+        "backoff_seconds": sum(span.backoff_seconds for span in spans),
+        "rate_limit_wait": sum(span.rate_limit_wait for span in spans),
+        "slot_wait": sum(span.slot_wait for span in spans),
+        "input_tokens": sum(span.input_tokens or 0 for span in spans),
+        "output_tokens": sum(span.output_tokens or 0 for span in spans),
+        "cached_tokens": sum(span.cached_tokens or 0 for span in spans),
+    }
+
+
+_tracer = Tracer()
+
+
+def configure(enabled: bool = True) -> Tracer:
+    global _tracer
+    _tracer = Tracer(enabled)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
@@ -0,0 +1,265 @@
+"""
+Shared, metered HTTP transport for the provider SDKs.
+The pool is sized to the configured concurrency and keeps idle connections
+alive between debate phases.
+"""
+
+import asyncio
+import contextlib
+import importlib.util
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import tracing
+
+DEFAULT_MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60.0  # Idle seconds before a pooled connection is closed; phases leave gaps between calls
+
+# Trace events marking that a request holds a connection: a new one is being opened or a pooled one is used
+_NEW_CONNECTION = "connection.connect_tcp.started"
+_TLS_HANDSHAKE = "connection.start_tls.started"
+_ACQUIRED = {_NEW_CONNECTION, "http11.send_request_headers.started", "http2.send_request_headers.started"}
+_RELEASED = {f"{protocol}.response_closed.{outcome}" for protocol in ("http11", "http2")
+             for outcome in ("complete", "failed")}
+
+
+class TransportConfig:
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS, http2: bool = False,
+                 connect_timeout: float = 5.0, read_timeout: float = 600.0, write_timeout: float = 60.0,
+                 pool_timeout: float = 60.0, phase_read_timeouts: Optional[Dict[str, float]] = None,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY):
+        self.max_connections = max_connections  # Per provider; every connection is kept alive when idle
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout        # Waiting for a free connection
+        self.phase_read_timeouts = dict(phase_read_timeouts or {})
+        self.keepalive_expiry = keepalive_expiry
+
+    def timeouts(self, phase: Optional[str]) -> Dict[str, float]:
+        # In the form httpcore reads from request.extensions["timeout"]
+        return {"connect": self.connect_timeout, "read": self.phase_read_timeouts.get(phase, self.read_timeout),
+                "write": self.write_timeout, "pool": self.pool_timeout}
+
+
+class PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.tls_handshakes = 0
+        self.waited = 0                # Requests that found every connection in the pool busy
+        self.pool_wait_seconds = 0.0   # Time from sending a request until it had a connection
+        self.peak_in_flight = 0
+
+
+_config = TransportConfig()
+_stats: Dict[str, PoolStats] = {}
+_lock = threading.Lock()
+
+
+def configure(config: TransportConfig):
+    # Applies to clients built afterwards; providers.py builds them on first use
+    global _config
+    if config.http2 and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1")
+        config.http2 = False
+    _config = config
+
+
+def get_config() -> TransportConfig:
+    return _config
+
+
+class _Meter:
+    # Per-request bookkeeping for one provider's pool, shared by the sync and async transports
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.in_flight = 0
+        with _lock:
+            self.stats = _stats.setdefault(provider, PoolStats())
+
+    def begin(self, request: Any) -> Dict[str, Any]:
+        request.extensions["timeout"] = _config.timeouts(tracing.current_phase())
+        with _lock:
+            waited = self.in_flight >= _config.max_connections
+            self.in_flight += 1
+            self.stats.requests += 1
+            self.stats.waited += waited
+            self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.in_flight)
+        return {"start": time.perf_counter(), "acquired": False, "opened": False, "released": False,
+                "previous": request.extensions.get("trace")}
+
+    def event(self, state: Dict[str, Any], name: str):
+        if name in _ACQUIRED and not state["acquired"]:
+            state["acquired"] = True
+            with _lock:
+                self.stats.pool_wait_seconds += time.perf_counter() - state["start"]
+        if name == _NEW_CONNECTION:
+            state["opened"] = True
+        elif name == _TLS_HANDSHAKE:
+            with _lock:
+                self.stats.tls_handshakes += 1
+        elif name in _RELEASED:
+            self.release(state)
+
+    def failed(self, state: Dict[str, Any]):
+        with _lock:
+            self.stats.errors += 1
+        self.release(state)
+
+    def release(self, state: Dict[str, Any]):
+        # A connection is held until the response is closed, not just until its headers arrive
+        if state["released"]:
+            return
+        state["released"] = True
+        with _lock:
+            self.in_flight -= 1
+            if state["acquired"]:
+                if state["opened"]:
+                    self.stats.connections_opened += 1
+                else:
+                    self.stats.connections_reused += 1
+
+
+class _MeteredTransport:
+    def __init__(self, meter: _Meter, inner: Any):
+        self._meter = meter
+        self._inner = inner
+
+    def handle_request(self, request: Any) -> Any:
+        state = self._meter.begin(request)
+
+        def trace(name, info):
+            self._meter.event(state, name)
+            if state["previous"] is not None:
+                state["previous"](name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            return self._inner.handle_request(request)
+        except BaseException:
+            self._meter.failed(state)
+            raise
+
+    def close(self):
+        self._inner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _AsyncMeteredTransport:
+    def __init__(self, meter: _Meter, factory: Any):
+        self._meter = meter
+        self._factory = factory
+        self._inner: Optional[Any] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._retired: List[Tuple[Any, asyncio.AbstractEventLoop]] = []
+
+    async def handle_async_request(self, request: Any) -> Any:
+        # Pooled connections belong to the loop that opened them, so build a new pool per asyncio.run()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._inner is not None:
+                self._retired.append((self._inner, self._loop))
+            self._inner, self._loop = self._factory(), loop
+            self._drop_retired()
+
+        state = self._meter.begin(request)
+
+        async def trace(name, info):
+            self._meter.event(state, name)
+            if state["previous"] is not None:
+                await state["previous"](name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            return await self._inner.handle_async_request(request)
+        except BaseException:
+            self._meter.failed(state)
+            raise
+
+    async def aclose(self):
+        if self._inner is not None and self._loop is asyncio.get_running_loop():
+            await self._inner.aclose()
+        elif self._inner is not None:
+            self._retired.append((self._inner, self._loop))
+        self._inner, self._loop = None, None
+        self._drop_retired()
+
+    def _drop_retired(self):
+        # The usual case: asyncio.run() has closed the loop that opened a previous pool, so that pool can no
+        # longer be awaited; its connections are shut down here rather than left open until garbage collection.
+        # A pool whose loop is still open (running in another thread) is kept until that loop closes.
+        still_open = []
+        for inner, loop in self._retired:
+            if loop.is_closed():
+                _drop_connections(inner)
+            else:
+                still_open.append((inner, loop))
+        self._retired = still_open
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def _drop_connections(transport: Any):
+    # Synchronous close for an httpx async transport whose event loop has ended
+    pool = getattr(transport, "_pool", None)
+    for connection in list(getattr(pool, "connections", [])):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is not None:
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
+
+def _httpx_module(client_class: type) -> Any:
+    # The SDKs pin different httpx packages; use the one the client class is built on
+    for base in client_class.__mro__:
+        module = sys.modules.get(base.__module__.split('.')[0])
+        if hasattr(module, 'HTTPTransport') and hasattr(module, 'Limits'):
+            return module
+    raise TypeError(f"{client_class.__name__} is not an httpx client")
+
+
+def http_client(provider: str, client_class: type, asynchronous: bool = False, **kwargs: Any) -> Any:
+    # An instance of the SDK's own client class, sending through a metered, pooled transport
+    httpx = _httpx_module(client_class)
+    limits = httpx.Limits(max_connections=_config.max_connections,
+                          max_keepalive_connections=_config.max_connections,
+                          keepalive_expiry=_config.keepalive_expiry)
+    timeout = httpx.Timeout(_config.read_timeout, connect=_config.connect_timeout,
+                            write=_config.write_timeout, pool=_config.pool_timeout)
+    meter = _Meter(provider)
+    if asynchronous:
+        transport = _AsyncMeteredTransport(meter, lambda: httpx.AsyncHTTPTransport(limits=limits, http2=_config.http2))
+    else:
+        transport = _MeteredTransport(meter, httpx.HTTPTransport(limits=limits, http2=_config.http2))
+    return client_class(transport=transport, timeout=timeout, **kwargs)
+
+
+def summary() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {provider: dict(vars(stats)) for provider, stats in _stats.items() if stats.requests}
+
+
+def format_summary() -> str:
+    lines = [f"{'HTTP pool':<12}{'requests':>9}{'opened':>8}{'reused':>8}{'TLS':>6}{'waited':>8}"
+             f"{'wait s':>8}{'peak':>6}{'errors':>8}"]
+    for provider, s in summary().items():
+        lines.append(f"{provider:<12}{s['requests']:>9}{s['connections_opened']:>8}{s['connections_reused']:>8}"
+                     f"{s['tls_handshakes']:>6}{s['waited']:>8}{s['pool_wait_seconds']:>8.1f}"
+                     f"{s['peak_in_flight']:>6}{s['errors']:>8}")
+    return "\n".join(lines)